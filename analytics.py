@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生管理系统 - 成绩分析
+Student Management System - Score Analytics
+将成绩整理为 学生×课程 的稀疏矩阵，按课程或班级批量计算统计量；
+安装了NumPy时使用向量化计算，否则退回纯Python实现
+"""
+
+import math
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖
+    np = None
+
+HAS_NUMPY = np is not None
+
+# 统计的分组方式
+GROUP_BY = ('course', 'class')
+
+
+def _percentile(sorted_values: Sequence[float], q: float) -> float:
+    """已排序数据的百分位数，相邻值之间线性插值（与NumPy默认方式一致）"""
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+class ScoreMatrix:
+    """
+    学生×课程的成绩矩阵，以 (行, 列, 成绩) 三元组稀疏存储，没有成绩的位置即为缺失；
+    to_dense() 可得到稠密矩阵及缺失值掩码
+    """
+    
+    def __init__(self, student_ids: List[str], course_ids: List[str], classes: List[Tuple[str, str]],
+                 student_classes: array, rows: array, cols: array, values: array,
+                 use_numpy: Optional[bool] = None):
+        if use_numpy is None:
+            use_numpy = HAS_NUMPY
+        elif use_numpy and not HAS_NUMPY:
+            raise ValueError("未安装NumPy，无法使用向量化计算")
+        self.student_ids = student_ids
+        self.course_ids = course_ids
+        # 所有出现过的 (年级, 班级)，student_classes[行] 为该学生所在班级的编号
+        self.classes = classes
+        self.use_numpy = use_numpy
+        if use_numpy:
+            student_classes, rows, cols, values = (np.asarray(data) for data in (student_classes, rows, cols, values))
+        self.student_classes = student_classes
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+    
+    @classmethod
+    def from_system(cls, system, grade: Optional[str] = None, class_name: Optional[str] = None,
+                    use_numpy: Optional[bool] = None) -> 'ScoreMatrix':
+        """从学生管理系统中取出成绩，可限定年级或班级；use_numpy为None时自动选择"""
+        if class_name is not None and grade is not None:
+            system.load_partition(grade, class_name)
+        
+        course_ids = list(system.courses)
+        col_of = {course_id: col for col, course_id in enumerate(course_ids)}
+        student_ids: List[str] = []
+        class_of: Dict[Tuple[str, str], int] = {}
+        student_classes, rows, cols, values = array('l'), array('l'), array('l'), array('d')
+        for student in list(system.students.values()):
+            if grade is not None and student.grade != grade:
+                continue
+            if class_name is not None and student.class_name != class_name:
+                continue
+            row = len(student_ids)
+            student_ids.append(student.student_id)
+            student_classes.append(class_of.setdefault((student.grade, student.class_name), len(class_of)))
+            for course_id, score in student.scores.items():
+                col = col_of.get(course_id)
+                if col is None or score is None:
+                    continue
+                rows.append(row)
+                cols.append(col)
+                values.append(score)
+        return cls(student_ids, course_ids, list(class_of), student_classes, rows, cols, values, use_numpy)
+    
+    def __len__(self) -> int:
+        """成绩条目数"""
+        return len(self.values)
+    
+    def to_dense(self):
+        """稠密矩阵及掩码 (values, mask)，缺失位置的值为0、掩码为False"""
+        shape = (len(self.student_ids), len(self.course_ids))
+        if self.use_numpy:
+            dense = np.zeros(shape)
+            mask = np.zeros(shape, dtype=bool)
+            dense[self.rows, self.cols] = self.values
+            mask[self.rows, self.cols] = True
+            return dense, mask
+        dense = [[0.0] * shape[1] for _ in range(shape[0])]
+        mask = [[False] * shape[1] for _ in range(shape[0])]
+        for row, col, value in zip(self.rows, self.cols, self.values):
+            dense[row][col] = value
+            mask[row][col] = True
+        return dense, mask
+    
+    def _groups(self, by: str):
+        """分组键列表及每个成绩条目所属分组的编号"""
+        if by == 'course':
+            return self.course_ids, self.cols
+        if by == 'class':
+            if self.use_numpy:
+                return self.classes, self.student_classes[self.rows]
+            return self.classes, array('l', (self.student_classes[row] for row in self.rows))
+        raise ValueError(f"分组方式只能是 {'、'.join(GROUP_BY)}")
+    
+    def describe(self, by: str = 'course', percentiles: Sequence[float] = (25, 50, 75)) -> Dict:
+        """
+        按课程或班级（键为课程ID或 (年级, 班级)）计算成绩的计数、平均分、中位数、
+        标准差、最值和百分位数，只包含有成绩的分组
+        """
+        for q in percentiles:
+            if not 0 <= q <= 100:
+                raise ValueError("百分位数必须在0到100之间")
+        keys, codes = self._groups(by)
+        quantiles = [50, *percentiles]
+        if self.use_numpy:
+            rows = self._describe_numpy(len(keys), codes, quantiles)
+        else:
+            rows = self._describe_python(len(keys), codes, quantiles)
+        
+        results = {}
+        for code, (count, average, std, minimum, maximum, values) in rows:
+            results[keys[code]] = {
+                'count': count,
+                'average': average,
+                'median': values[0],
+                'std': std,
+                'min': minimum,
+                'max': maximum,
+                'percentiles': dict(zip(percentiles, values[1:]))
+            }
+        return results
+    
+    def _describe_numpy(self, group_count: int, codes, quantiles: List[float]):
+        # 按 (分组, 成绩) 排序后，每个分组的成绩是排好序的一段连续区间
+        sorted_values = self.values[np.lexsort((self.values, codes))]
+        counts = np.bincount(codes, minlength=group_count)
+        starts = np.cumsum(counts) - counts
+        present = np.flatnonzero(counts)
+        
+        averages = np.bincount(codes, weights=self.values, minlength=group_count)[present] / counts[present]
+        full_averages = np.zeros(group_count)
+        full_averages[present] = averages
+        deviations = self.values - full_averages[codes]
+        stds = np.sqrt(np.bincount(codes, weights=deviations * deviations, minlength=group_count)[present]
+                       / counts[present])
+        
+        counts, starts = counts[present], starts[present]
+        columns = []
+        for q in quantiles:
+            position = (counts - 1) * (q / 100)
+            low = np.floor(position).astype(np.int64)
+            high = np.minimum(low + 1, counts - 1)
+            low_values = sorted_values[starts + low]
+            columns.append(low_values + (sorted_values[starts + high] - low_values) * (position - low))
+        minimums = sorted_values[starts]
+        maximums = sorted_values[starts + counts - 1]
+        
+        # 先整体转换为Python数值，避免逐个元素转换
+        columns = list(zip(*(column.tolist() for column in columns)))
+        yield from zip(present.tolist(), zip(counts.tolist(), averages.tolist(), stds.tolist(),
+                                             minimums.tolist(), maximums.tolist(), columns))
+    
+    def _describe_python(self, group_count: int, codes, quantiles: List[float]):
+        grouped: List[List[float]] = [[] for _ in range(group_count)]
+        for code, value in zip(codes, self.values):
+            grouped[code].append(value)
+        for code, values in enumerate(grouped):
+            if not values:
+                continue
+            values.sort()
+            average = math.fsum(values) / len(values)
+            std = math.sqrt(math.fsum((value - average) ** 2 for value in values) / len(values))
+            yield code, (len(values), average, std, values[0], values[-1],
+                         [_percentile(values, q) for q in quantiles])
+    
+    def histogram(self, by: str = 'course', bins: int = 10,
+                  value_range: Tuple[float, float] = (0, 100)) -> Dict:
+        """
+        按课程或班级统计成绩分布：将value_range等分为bins段，最后一段包含右端点，
+        范围外的成绩不计入；返回 分组键 -> 各段人数列表，只包含有成绩的分组
+        """
+        if bins < 1:
+            raise ValueError("分段数必须大于0")
+        low, high = value_range
+        if high <= low:
+            raise ValueError("成绩范围无效")
+        keys, codes = self._groups(by)
+        width = (high - low) / bins
+        
+        if self.use_numpy:
+            inside = (self.values >= low) & (self.values <= high)
+            positions = np.minimum(((self.values[inside] - low) / width).astype(np.int64), bins - 1)
+            table = np.bincount(codes[inside] * bins + positions, minlength=len(keys) * bins).reshape(len(keys), bins)
+            present = np.flatnonzero(np.bincount(codes, minlength=len(keys)))
+            return {keys[code]: table[code].tolist() for code in present.tolist()}
+        
+        table: Dict[int, List[int]] = {}
+        for code, value in zip(codes, self.values):
+            counts = table.get(code)
+            if counts is None:
+                counts = table[code] = [0] * bins
+            if low <= value <= high:
+                counts[min(int((value - low) / width), bins - 1)] += 1
+        return {keys[code]: table[code] for code in sorted(table)}
+    
+    def z_scores(self, by: str = 'course') -> Dict[Tuple[str, str], float]:
+        """
+        每个成绩相对于所在课程或班级的标准分 (成绩-平均分)/标准差，
+        键为 (学生ID, 课程ID)；标准差为0时标准分为0
+        """
+        keys, codes = self._groups(by)
+        if self.use_numpy:
+            counts = np.maximum(np.bincount(codes, minlength=len(keys)), 1)
+            averages = np.bincount(codes, weights=self.values, minlength=len(keys)) / counts
+            deviations = self.values - averages[codes]
+            stds = np.sqrt(np.bincount(codes, weights=deviations * deviations, minlength=len(keys)) / counts)
+            entry_stds = stds[codes]
+            scores = np.divide(deviations, entry_stds, out=np.zeros_like(deviations), where=entry_stds > 0)
+            scores = scores.tolist()
+        else:
+            sums = [0.0] * len(keys)
+            counts = [0] * len(keys)
+            for code, value in zip(codes, self.values):
+                sums[code] += value
+                counts[code] += 1
+            averages = [total / count if count else 0.0 for total, count in zip(sums, counts)]
+            squares = [0.0] * len(keys)
+            for code, value in zip(codes, self.values):
+                squares[code] += (value - averages[code]) ** 2
+            stds = [math.sqrt(total / count) if count else 0.0 for total, count in zip(squares, counts)]
+            scores = [(value - averages[code]) / stds[code] if stds[code] > 0 else 0.0
+                      for code, value in zip(codes, self.values)]
+        
+        student_ids, course_ids = self.student_ids, self.course_ids
+        return {(student_ids[row], course_ids[col]): score
+                for row, col, score in zip(self.rows.tolist(), self.cols.tolist(), scores)}
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生管理系统 - 性能测试
+Student Management System - Benchmarks
+用法: python benchmark.py <测试项目> [参数...]
+"""
+
+import datetime
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from typing import Dict, List, Optional
+
+from storage import COMPRESSIONS, BinaryStorage, Storage, WriteJob, load_records, open_storage
+from columnar import ColumnarStudentStore
+from ids import IdGenerator
+from student_management_system import Course, Student, StudentManagementSystem
+
+
+class MemoryStorage(Storage):
+    """不做任何写入的存储后端，只测量内存中的操作"""
+    
+    def exists(self) -> bool:
+        return False
+    
+    def prepare_save(self, students: Dict, courses: Dict) -> WriteJob:
+        return lambda: None
+    
+    def prepare_changes(self, students: Dict, courses: Dict, student_ids, course_ids) -> WriteJob:
+        return lambda: None
+
+
+def build_school(student_count: int, course_size: int = 40, courses_per_student: int = 5) -> StudentManagementSystem:
+    """
+    直接构造指定规模的学校：每门课程固定course_size名学生，每名学生选courses_per_student门课，
+    课程数随学生数增长
+    """
+    system = StudentManagementSystem(storage=MemoryStorage())
+    course_count = max(1, student_count * courses_per_student // course_size)
+    for i in range(course_count):
+        course_id = f"C{i:08d}"
+        system.courses[course_id] = Course(course_id, f"课程{i}", "张老师", 2.0)
+    for i in range(student_count):
+        student_id = f"S{i:08d}"
+        student = system.students[student_id] = Student(student_id, f"学生{i}", 16, "高一", f"{i % 20}班")
+        for j in range(courses_per_student):
+            course_id = f"C{(i * courses_per_student + j) % course_count:08d}"
+            student.courses[course_id] = None
+            student.scores[course_id] = 80.0
+            system.courses[course_id].students[student_id] = None
+    return system
+
+
+def benchmark_compression(data_file: str, level: Optional[int] = None) -> List[Dict]:
+    """
+    用数据文件中的记录分别写出未压缩及各压缩格式的快照，
+    返回每种格式的文件大小、保存耗时和加载耗时
+    """
+    students, courses = load_records(data_file)
+    # 沿用源文件的快照格式（JSON或二进制）
+    extension = '.sms' if isinstance(open_storage(data_file), BinaryStorage) else '.json'
+    
+    results = []
+    temp_dir = tempfile.mkdtemp(prefix='sms-bench-')
+    try:
+        for compression in [None] + list(COMPRESSIONS):
+            path = os.path.join(temp_dir, 'snapshot' + extension)
+            if compression:
+                path += COMPRESSIONS[compression][0]
+            storage = open_storage(path, journal=False, compression_level=level)
+            
+            start = time.perf_counter()
+            storage.write_snapshot(students.values(), courses.values())
+            save_time = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            count = sum(1 for _ in storage.load())
+            load_time = time.perf_counter() - start
+            
+            results.append({
+                'compression': compression or 'none',
+                'size': os.path.getsize(path),
+                'save_time': save_time,
+                'load_time': load_time,
+                'records': count
+            })
+    finally:
+        shutil.rmtree(temp_dir)
+    return results
+
+
+def print_compression(results: List[Dict]):
+    """以表格形式打印压缩测试结果"""
+    print(f"{'压缩格式':<10}{'大小(KB)':>12}{'压缩率':>8}{'保存(秒)':>10}{'加载(秒)':>10}")
+    base = results[0]['size'] or 1
+    for result in results:
+        print(f"{result['compression']:<12}{result['size'] / 1024:>12.1f}{result['size'] / base:>10.1%}"
+              f"{result['save_time']:>12.3f}{result['load_time']:>12.3f}")
+
+
+def benchmark_deletion(sizes: List[int], deletions: int = 100) -> List[Dict]:
+    """在不同规模的学校中删除学生和课程，返回每次删除的平均耗时"""
+    results = []
+    for size in sizes:
+        system = build_school(size)
+        student_ids = list(system.students)[:deletions]
+        course_ids = list(system.courses)[-deletions:]
+        
+        start = time.perf_counter()
+        for student_id in student_ids:
+            system.remove_student(student_id)
+        student_time = (time.perf_counter() - start) / len(student_ids)
+        
+        start = time.perf_counter()
+        for course_id in course_ids:
+            system.remove_course(course_id)
+        course_time = (time.perf_counter() - start) / len(course_ids)
+        
+        results.append({
+            'students': size,
+            'courses': len(system.courses) + len(course_ids),
+            'remove_student': student_time,
+            'remove_course': course_time
+        })
+    return results
+
+
+def print_deletion(results: List[Dict]):
+    """以表格形式打印删除测试结果"""
+    print(f"{'学生数':>10}{'课程数':>10}{'删除学生(毫秒)':>16}{'删除课程(毫秒)':>16}")
+    for result in results:
+        print(f"{result['students']:>13}{result['courses']:>13}"
+              f"{result['remove_student'] * 1000:>20.3f}{result['remove_course'] * 1000:>20.3f}")
+
+
+class DictRecord:
+    """对照用的记录：字段保存在实例__dict__中，字符串不驻留（即改用__slots__之前的表示）"""
+    
+    def __init__(self, data: Dict):
+        self.__dict__.update(data)
+        self.courses = dict.fromkeys(data.get('courses', []))
+
+
+def benchmark_memory(student_count: int, courses_per_student: int = 5) -> List[Dict]:
+    """
+    按加载时的方式（逐条解码JSON再创建对象）分别以__dict__记录、__slots__加驻留的Student
+    和列式存储保存学生，返回每种表示下平均每名学生占用的字节数
+    """
+    lines = [json.dumps(student.to_dict(), ensure_ascii=False)
+             for student in build_school(student_count, courses_per_student=courses_per_student).students.values()]
+    
+    results = []
+    for layout in ('__dict__', '__slots__+intern', 'columnar'):
+        tracemalloc.start()
+        if layout == 'columnar':
+            records = ColumnarStudentStore(Student.from_dict)
+            for line in lines:
+                student = Student.from_dict(json.loads(line))
+                records[student.student_id] = student
+        else:
+            factory = DictRecord if layout == '__dict__' else Student.from_dict
+            records = [factory(json.loads(line)) for line in lines]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results.append({'layout': layout, 'students': len(records), 'bytes_per_student': size / len(records)})
+        del records
+    return results
+
+
+def print_memory(results: List[Dict]):
+    """以表格形式打印内存测试结果"""
+    print(f"{'记录表示':<20}{'学生数':>10}{'每名学生(字节)':>16}")
+    base = results[0]['bytes_per_student']
+    for result in results:
+        print(f"{result['layout']:<24}{result['students']:>13}{result['bytes_per_student']:>20.0f}"
+              f"  ({result['bytes_per_student'] / base:.0%})")
+
+
+def legacy_id(prefix: str) -> str:
+    """改用IdGenerator之前的ID生成方式：时间戳加uuid4的前4个字符"""
+    return f"{prefix}{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:4]}"
+
+
+def benchmark_ids(count: int) -> List[Dict]:
+    """分别用旧方式、IdGenerator逐个生成和整块预留生成count个ID，返回耗时和重复数"""
+    generator = IdGenerator('S')
+    methods = [
+        ('uuid4', lambda: [legacy_id('S') for _ in range(count)]),
+        ('next_id', lambda: [generator.next_id() for _ in range(count)]),
+        ('reserve', lambda: generator.reserve(count)),
+    ]
+    
+    results = []
+    for method, generate in methods:
+        start = time.perf_counter()
+        ids = generate()
+        elapsed = time.perf_counter() - start
+        results.append({
+            'method': method,
+            'count': len(ids),
+            'time_per_id': elapsed / len(ids),
+            'duplicates': len(ids) - len(set(ids)),
+            'sorted': ids == sorted(ids)
+        })
+    return results
+
+
+def print_ids(results: List[Dict]):
+    """以表格形式打印ID生成测试结果"""
+    print(f"{'生成方式':<10}{'数量':>10}{'每个(微秒)':>12}{'重复数':>8}{'有序':>6}")
+    for result in results:
+        print(f"{result['method']:<14}{result['count']:>12}{result['time_per_id'] * 1e6:>16.3f}"
+              f"{result['duplicates']:>11}{'是' if result['sorted'] else '否':>7}")
+
+
+BENCHMARKS = {
+    'compression': "compression <数据文件> [压缩级别]  比较各压缩格式的快照大小、保存和加载耗时",
+    'deletion': "deletion [学生数...]  在不同规模的学校中测量删除学生和课程的耗时",
+    'memory': "memory [学生数] [每名学生选课数]  比较__dict__记录、__slots__加字符串驻留和列式存储时每名学生占用的内存",
+    'ids': "ids [数量]  比较旧的时间戳加uuid4方式与IdGenerator生成ID的速度、重复数和顺序",
+}
+
+
+def main(argv: List[str]):
+    if not argv or argv[0] not in BENCHMARKS:
+        print("用法: python benchmark.py <测试项目> [参数...]")
+        for usage in BENCHMARKS.values():
+            print(f"  {usage}")
+        sys.exit(1)
+    
+    if argv[0] == 'compression':
+        if len(argv) < 2:
+            print(f"用法: python benchmark.py {BENCHMARKS['compression']}")
+            sys.exit(1)
+        level = int(argv[2]) if len(argv) > 2 else None
+        print_compression(benchmark_compression(argv[1], level))
+    elif argv[0] == 'deletion':
+        sizes = [int(size) for size in argv[1:]] or [1000, 10000, 100000]
+        print_deletion(benchmark_deletion(sizes))
+    elif argv[0] == 'memory':
+        count = int(argv[1]) if len(argv) > 1 else 100000
+        courses_per_student = int(argv[2]) if len(argv) > 2 else 5
+        print_memory(benchmark_memory(count, courses_per_student))
+    elif argv[0] == 'ids':
+        count = int(argv[1]) if len(argv) > 1 else 100000
+        print_ids(benchmark_ids(count))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
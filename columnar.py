@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生管理系统 - 列式学生存储
+Student Management System - Columnar Student Store
+按字段分列保存学生：年龄存于数组，年级/班级字典编码为整数，姓名集中存放在一个字节堆中，
+选课和成绩保存为课程句柄（整数）和成绩组成的数组；学生对象只是按需生成的轻量视图
+"""
+
+import copy
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Mapping, Optional
+
+# 成绩数组中表示“已选课但没有成绩”的值
+NO_SCORE = float('nan')
+# 年龄数组（C int）能保存的范围
+_AGE_LIMIT = 1 << (8 * array('i').itemsize - 1)
+
+
+class Categories:
+    """字典编码：重复的值只保存一次，列中只存整数编号"""
+    
+    def __init__(self):
+        self.values: List[Hashable] = []
+        self._codes: Dict[Hashable, int] = {}
+    
+    def encode(self, value: Hashable) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+    
+    def code_of(self, value: Hashable) -> Optional[int]:
+        """已有的编号，不存在时返回None（不新增编号）"""
+        return self._codes.get(value)
+    
+    def __getitem__(self, code: int) -> Hashable:
+        return self.values[code]
+
+
+def _storable_age(age) -> bool:
+    """能够保存在年龄数组中的年龄"""
+    return type(age) is int and -_AGE_LIMIT <= age < _AGE_LIMIT
+
+
+def _storable(score) -> bool:
+    """能够原样保存在成绩数组中的成绩；整数成绩另存，以免读回时变成浮点数"""
+    return type(score) is float and score == score
+
+
+class RowCourses(MutableMapping):
+    """一名学生的选课（按选课顺序的有序集合，值均为None），保存为课程句柄数组"""
+    
+    __slots__ = ('_store', '_row')
+    
+    def __init__(self, store: 'ColumnarStudentStore', row: int):
+        self._store = store
+        self._row = row
+    
+    def __contains__(self, course_id) -> bool:
+        return self._store._course_index(self._row, course_id) >= 0
+    
+    def __getitem__(self, course_id: str) -> None:
+        if course_id not in self:
+            raise KeyError(course_id)
+        return None
+    
+    def __setitem__(self, course_id: str, value: None):
+        self._store._enroll(self._row, course_id)
+    
+    def __delitem__(self, course_id: str):
+        self._store._unenroll(self._row, course_id)
+    
+    def __iter__(self) -> Iterator[str]:
+        course_ids = self._store._course_handles.values
+        return (course_ids[handle] for handle in self._store._enrolled[self._row] or ())
+    
+    def __len__(self) -> int:
+        return len(self._store._enrolled[self._row] or ())
+
+
+class RowScores(MutableMapping):
+    """
+    一名学生的成绩：已选课程的浮点数成绩保存在与选课数组平行的数组中；
+    整数成绩、未选课程的成绩和不是数值的成绩（来自旧数据）另存于字典
+    """
+    
+    __slots__ = ('_store', '_row')
+    
+    def __init__(self, store: 'ColumnarStudentStore', row: int):
+        self._store = store
+        self._row = row
+    
+    def __getitem__(self, course_id: str):
+        store, row = self._store, self._row
+        index = store._course_index(row, course_id)
+        if index >= 0:
+            score = store._enrolled_scores[row][index]
+            if score == score:
+                return score
+        stray = store._stray_scores.get(row)
+        if stray is not None and course_id in stray:
+            return stray[course_id]
+        raise KeyError(course_id)
+    
+    def __setitem__(self, course_id: str, score):
+        store, row = self._store, self._row
+        index = store._course_index(row, course_id)
+        if index >= 0 and _storable(score):
+            store._enrolled_scores[row][index] = score
+            store._discard_stray(row, course_id)
+        else:
+            if index >= 0:
+                store._enrolled_scores[row][index] = NO_SCORE
+            store._stray_scores.setdefault(row, {})[course_id] = score
+    
+    def __delitem__(self, course_id: str):
+        store, row = self._store, self._row
+        found = store._discard_stray(row, course_id)
+        index = store._course_index(row, course_id)
+        if index >= 0 and store._enrolled_scores[row][index] == store._enrolled_scores[row][index]:
+            store._enrolled_scores[row][index] = NO_SCORE
+            found = True
+        if not found:
+            raise KeyError(course_id)
+    
+    def __iter__(self) -> Iterator[str]:
+        store, row = self._store, self._row
+        course_ids = store._course_handles.values
+        for handle, score in zip(store._enrolled[row] or (), store._enrolled_scores[row] or ()):
+            if score == score:
+                yield course_ids[handle]
+        yield from store._stray_scores.get(row, ())
+    
+    def items(self):
+        # 一次性转换全部课程句柄，比逐个按键查找快
+        return self._store._scores_of(self._row).items()
+    
+    def __len__(self) -> int:
+        store, row = self._store, self._row
+        scored = sum(1 for score in store._enrolled_scores[row] or () if score == score)
+        return scored + len(store._stray_scores.get(row, ()))
+
+
+class StudentRow:
+    """
+    列式存储中一名学生的视图，字段的读写直接作用于存储的各列；
+    视图本身不保存数据，同一名学生每次取出的视图是不同的对象
+    """
+    
+    __slots__ = ('_store', '_row')
+    
+    def __init__(self, store: 'ColumnarStudentStore', row: int):
+        self._store = store
+        self._row = row
+    
+    @property
+    def student_id(self) -> str:
+        return self._store._ids[self._row]
+    
+    @student_id.setter
+    def student_id(self, value: str):
+        self._store._ids[self._row] = value
+    
+    @property
+    def name(self) -> str:
+        return self._store._get_name(self._row)
+    
+    @name.setter
+    def name(self, value: str):
+        self._store._set_name(self._row, value)
+    
+    @property
+    def age(self) -> int:
+        return self._store._get_age(self._row)
+    
+    @age.setter
+    def age(self, value: int):
+        self._store._set_age(self._row, value)
+    
+    @property
+    def grade(self) -> str:
+        return self._store._grade_values[self._store._grades[self._row]]
+    
+    @grade.setter
+    def grade(self, value: str):
+        self._store._grades[self._row] = self._store._grade_values.encode(value)
+    
+    @property
+    def class_name(self) -> str:
+        return self._store._class_values[self._store._classes[self._row]]
+    
+    @class_name.setter
+    def class_name(self, value: str):
+        self._store._classes[self._row] = self._store._class_values.encode(value)
+    
+    @property
+    def courses(self) -> RowCourses:
+        return RowCourses(self._store, self._row)
+    
+    @courses.setter
+    def courses(self, value: Iterable[str]):
+        self._store._set_enrollments(self._row, list(value), dict(self.scores))
+    
+    @property
+    def scores(self) -> RowScores:
+        return RowScores(self._store, self._row)
+    
+    @scores.setter
+    def scores(self, value: Mapping[str, Any]):
+        self._store._set_enrollments(self._row, list(self.courses), value)
+    
+    def to_dict(self) -> Dict:
+        """与Student.to_dict相同的字典，课程句柄在此转换回课程ID"""
+        store, row = self._store, self._row
+        return {
+            'student_id': store._ids[row],
+            'name': store._get_name(row),
+            'age': store._get_age(row),
+            'grade': store._grade_values[store._grades[row]],
+            'class_name': store._class_values[store._classes[row]],
+            'courses': list(RowCourses(store, row)),
+            'scores': store._scores_of(row)
+        }
+    
+    def __deepcopy__(self, memo):
+        # 副本（如批量操作的撤销记录）脱离存储，是独立的学生对象
+        return self._store._factory(copy.deepcopy(self.to_dict(), memo))
+
+
+class ColumnarStudentStore(MutableMapping):
+    """
+    列式的学生映射，可代替 StudentManagementSystem.students 中的字典
+    
+    每名学生占用各列中的一行：年龄（array）、年级和班级的编码（array）、姓名在字节堆中的
+    偏移和长度（array），以及选课的课程句柄数组和平行的成绩数组。课程ID只在存取时与
+    整数句柄相互转换。删除的行留待新学生复用，被替换的姓名留下的空洞在超过堆的一半时整理。
+    迭代顺序与字典相同
+    """
+    
+    def __init__(self, factory: Callable[[Dict], object]):
+        # factory 从字典创建独立的学生对象，用于生成脱离存储的副本
+        self._factory = factory
+        self._rows: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._ages = array('i')
+        self._grade_values = Categories()
+        self._class_values = Categories()
+        self._grades = array('I')
+        self._classes = array('I')
+        self._name_heap = bytearray()
+        self._name_offsets = array('Q')
+        self._name_lengths = array('I')
+        self._name_garbage = 0
+        # 行 -> 无法放入年龄数组或姓名字节堆的值（如旧数据中字符串形式的年龄），原样保存
+        self._other_ages: Dict[int, Any] = {}
+        self._other_names: Dict[int, Any] = {}
+        # 课程ID <-> 整数句柄；每行的选课句柄数组及平行的成绩数组（NaN表示没有成绩），没有选课时为None
+        self._course_handles = Categories()
+        self._enrolled: List[Optional[array]] = []
+        self._enrolled_scores: List[Optional[array]] = []
+        # 行 -> 无法放入成绩数组的成绩
+        self._stray_scores: Dict[int, Dict[str, Any]] = {}
+    
+    def __getitem__(self, student_id: str) -> StudentRow:
+        return StudentRow(self, self._rows[student_id])
+    
+    def get(self, student_id: str, default=None):
+        row = self._rows.get(student_id)
+        return default if row is None else StudentRow(self, row)
+    
+    def __contains__(self, student_id) -> bool:
+        return student_id in self._rows
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __setitem__(self, student_id: str, student):
+        row = self._rows.get(student_id)
+        if isinstance(student, StudentRow) and student._store is self and student._row == row:
+            return
+        
+        # 先读出全部字段并完成编码，再分配和写入行，出错时不会留下写了一半的行
+        record_id, name, age, grade, class_name = (student.student_id, student.name, student.age,
+                                                   student.grade, student.class_name)
+        courses, scores = list(student.courses), dict(student.scores)
+        grade_code = self._grade_values.encode(grade)
+        class_code = self._class_values.encode(class_name)
+        if row is None:
+            row = self._rows[student_id] = self._allocate_row()
+        self._ids[row] = record_id
+        self._grades[row] = grade_code
+        self._classes[row] = class_code
+        self._set_age(row, age)
+        self._set_name(row, name)
+        self._set_enrollments(row, courses, scores)
+    
+    def __delitem__(self, student_id: str):
+        row = self._rows.pop(student_id)
+        self._name_garbage += self._name_lengths[row]
+        self._name_lengths[row] = 0
+        self._ids[row] = self._enrolled[row] = self._enrolled_scores[row] = None
+        self._stray_scores.pop(row, None)
+        self._other_ages.pop(row, None)
+        self._other_names.pop(row, None)
+        self._free.append(row)
+    
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._ids.append(None)
+        self._ages.append(0)
+        self._grades.append(0)
+        self._classes.append(0)
+        self._name_offsets.append(len(self._name_heap))
+        self._name_lengths.append(0)
+        self._enrolled.append(None)
+        self._enrolled_scores.append(None)
+        return len(self._ids) - 1
+    
+    def _set_enrollments(self, row: int, courses: List[str], scores: Mapping[str, Any]):
+        """以选课列表和成绩字典整体替换一行的选课和成绩"""
+        self._stray_scores.pop(row, None)
+        if not courses:
+            self._enrolled[row] = self._enrolled_scores[row] = None
+        else:
+            self._enrolled[row] = array('I', map(self._course_handles.encode, courses))
+            self._enrolled_scores[row] = array('d', [NO_SCORE]) * len(courses)
+        
+        index_of = {course_id: index for index, course_id in enumerate(courses)}
+        for course_id, score in scores.items():
+            index = index_of.get(course_id)
+            if index is not None and _storable(score):
+                self._enrolled_scores[row][index] = score
+            else:
+                self._stray_scores.setdefault(row, {})[course_id] = score
+    
+    def _course_index(self, row: int, course_id: str) -> int:
+        """课程在该行选课数组中的位置，未选时返回-1"""
+        handle = self._course_handles.code_of(course_id)
+        enrolled = self._enrolled[row]
+        if handle is None or enrolled is None:
+            return -1
+        try:
+            return enrolled.index(handle)
+        except ValueError:
+            return -1
+    
+    def _enroll(self, row: int, course_id: str):
+        if self._course_index(row, course_id) >= 0:
+            return
+        if self._enrolled[row] is None:
+            self._enrolled[row] = array('I')
+            self._enrolled_scores[row] = array('d')
+        self._enrolled[row].append(self._course_handles.encode(course_id))
+        self._enrolled_scores[row].append(NO_SCORE)
+        # 选课前已有的成绩（来自旧数据）放回成绩数组
+        stray = self._stray_scores.get(row)
+        if stray is not None and _storable(stray.get(course_id)):
+            self._enrolled_scores[row][-1] = stray[course_id]
+            self._discard_stray(row, course_id)
+    
+    def _unenroll(self, row: int, course_id: str):
+        index = self._course_index(row, course_id)
+        if index < 0:
+            raise KeyError(course_id)
+        score = self._enrolled_scores[row][index]
+        del self._enrolled[row][index]
+        del self._enrolled_scores[row][index]
+        if not self._enrolled[row]:
+            self._enrolled[row] = self._enrolled_scores[row] = None
+        # 与字典表示一致：退选只移除选课，成绩需另行删除
+        if score == score:
+            self._stray_scores.setdefault(row, {})[course_id] = score
+    
+    def _discard_stray(self, row: int, course_id: str) -> bool:
+        stray = self._stray_scores.get(row)
+        if stray is None or course_id not in stray:
+            return False
+        del stray[course_id]
+        if not stray:
+            del self._stray_scores[row]
+        return True
+    
+    def course_roster(self, course_id: str, student_ids: Iterable[str]) -> List[Dict]:
+        """
+        课程详细信息中的选课学生列表：课程句柄只解析一次，之后直接按行读取各列，
+        不创建学生视图。不存在的学生被跳过
+        """
+        handle = self._course_handles.code_of(course_id)
+        grade_values, class_values = self._grade_values.values, self._class_values.values
+        roster = []
+        for student_id in student_ids:
+            row = self._rows.get(student_id)
+            if row is None:
+                continue
+            score = None
+            enrolled = self._enrolled[row]
+            if handle is not None and enrolled is not None and handle in enrolled:
+                score = self._enrolled_scores[row][enrolled.index(handle)]
+                if score != score:
+                    score = None
+            stray = self._stray_scores.get(row)
+            if score is None and stray is not None:
+                score = stray.get(course_id)
+            roster.append({
+                'student_id': student_id,
+                'name': self._get_name(row),
+                'grade': grade_values[self._grades[row]],
+                'class_name': class_values[self._classes[row]],
+                'score': score
+            })
+        return roster
+    
+    def _scores_of(self, row: int) -> Dict[str, Any]:
+        """一行的成绩字典（课程ID -> 成绩）"""
+        course_ids = self._course_handles.values
+        scores = {course_ids[handle]: score
+                  for handle, score in zip(self._enrolled[row] or (), self._enrolled_scores[row] or ())
+                  if score == score}
+        scores.update(self._stray_scores.get(row, ()))
+        return scores
+    
+    def _get_age(self, row: int) -> int:
+        if self._other_ages and row in self._other_ages:
+            return self._other_ages[row]
+        return self._ages[row]
+    
+    def _set_age(self, row: int, age: int):
+        if _storable_age(age):
+            self._ages[row] = age
+            self._other_ages.pop(row, None)
+        else:
+            self._ages[row] = 0
+            self._other_ages[row] = age
+    
+    def _get_name(self, row: int) -> str:
+        if self._other_names and row in self._other_names:
+            return self._other_names[row]
+        offset = self._name_offsets[row]
+        return self._name_heap[offset:offset + self._name_lengths[row]].decode('utf-8')
+    
+    def _set_name(self, row: int, name: str):
+        if isinstance(name, str):
+            data = name.encode('utf-8')
+            self._other_names.pop(row, None)
+        else:
+            data = b''
+            self._other_names[row] = name
+        old_length = self._name_lengths[row]
+        if len(data) <= old_length:
+            # 不超过原长度时原地覆盖
+            offset = self._name_offsets[row]
+            self._name_heap[offset:offset + len(data)] = data
+            self._name_garbage += old_length - len(data)
+        else:
+            self._name_offsets[row] = len(self._name_heap)
+            self._name_heap += data
+            self._name_garbage += old_length
+        self._name_lengths[row] = len(data)
+        
+        if self._name_garbage > len(self._name_heap) // 2:
+            self._compact_names()
+    
+    def _compact_names(self):
+        """按行重新排列姓名，去掉删除和改名留下的空洞"""
+        heap = bytearray()
+        for row, offset in enumerate(self._name_offsets):
+            length = self._name_lengths[row]
+            self._name_offsets[row] = len(heap)
+            heap += self._name_heap[offset:offset + length]
+        self._name_heap = heap
+        self._name_garbage = 0
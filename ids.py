@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生管理系统 - ID生成
+Student Management System - ID Generation
+按时间戳加计数器生成单调递增、可排序的记录ID
+"""
+
+import calendar
+import random
+import threading
+import time
+from typing import Callable, Iterable, List
+
+# 计数器使用的36进制数字，按ASCII顺序排列，保证字符串顺序与数值顺序一致
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+# 两位36进制数的查找表
+_PAIRS = [a + b for a in DIGITS for b in DIGITS]
+# 每秒可生成的ID数（4位36进制计数器）
+IDS_PER_SECOND = len(_PAIRS) ** 2
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S'
+TIMESTAMP_LENGTH = 14
+
+
+class IdGenerator:
+    """
+    ID格式：前缀 + 14位UTC时间戳（年月日时分秒） + 4位36进制计数器，与旧格式同为19个字符；
+    使用UTC而不是本地时间，夏令时结束时钟拨回一小时也不会生成更小的ID
+    
+    同一秒内计数器递增，一秒内用完时借用下一秒的时间戳，时钟回拨时沿用已用过的时间；
+    因此同一生成器产生的ID严格递增，用 skip_existing 接续已有数据后也大于已有的ID。
+    每进入新的一秒，计数器从前一半范围内的随机位置开始，使同一秒内启动的其他进程
+    （例如只加载了部分分片）不易生成相同的ID；是否已被使用仍由调用方检查
+    """
+    
+    def __init__(self, prefix: str, clock: Callable[[], float] = time.time):
+        self.prefix = prefix
+        self._clock = clock
+        self._second = -1
+        self._counter = 0
+        self._stamp = ''
+        self._lock = threading.Lock()
+    
+    def next_id(self) -> str:
+        """生成下一个ID"""
+        with self._lock:
+            counter = self._counter
+            if int(self._clock()) <= self._second and counter < IDS_PER_SECOND:
+                # 仍在当前秒内，直接取下一个计数器
+                self._counter = counter + 1
+                return self._stamp + _PAIRS[counter // len(_PAIRS)] + _PAIRS[counter % len(_PAIRS)]
+            return self._allocate(1)[0]
+    
+    def reserve(self, count: int) -> List[str]:
+        """一次预留count个连续的ID，供批量导入使用"""
+        if count < 0:
+            raise ValueError("预留的ID数量不能为负数")
+        with self._lock:
+            return self._allocate(count)
+    
+    def skip_existing(self, record_ids: Iterable[str]):
+        """保证之后生成的ID大于record_ids中同格式的最大ID（旧格式的16进制后缀同样可比较）"""
+        length = len(self.prefix) + TIMESTAMP_LENGTH + 4
+        latest = max((record_id for record_id in record_ids
+                      if len(record_id) == length and record_id.startswith(self.prefix)), default=None)
+        if latest is None:
+            return
+        stamp, suffix = latest[len(self.prefix):-4], latest[-4:]
+        if not stamp.isdigit() or any(char not in DIGITS for char in suffix):
+            return
+        try:
+            second = calendar.timegm(time.strptime(stamp, TIMESTAMP_FORMAT))
+        except (ValueError, OverflowError):
+            return
+        # 同样跳过一段随机的间隔，避免与未加载的记录（如其他分片中同一秒生成的ID）相同
+        counter = int(suffix, 36) + 1
+        counter += random.randrange(max(1, (IDS_PER_SECOND - counter) // 2))
+        with self._lock:
+            if (second, counter) > (self._second, self._counter):
+                self._second, self._counter = second, counter
+                self._stamp = self.prefix + stamp
+    
+    def _allocate(self, count: int) -> List[str]:
+        now = int(self._clock())
+        if now > self._second:
+            self._second = now
+            self._counter = random.randrange(IDS_PER_SECOND // 2)
+            self._stamp = self.prefix + time.strftime(TIMESTAMP_FORMAT, time.gmtime(now))
+        
+        ids = []
+        while len(ids) < count:
+            if self._counter >= IDS_PER_SECOND:
+                self._second += 1
+                self._counter = 0
+                self._stamp = self.prefix + time.strftime(TIMESTAMP_FORMAT, time.gmtime(self._second))
+            # 本秒内剩余的计数器一次取完
+            stop = min(IDS_PER_SECOND, self._counter + count - len(ids))
+            stamp = self._stamp
+            ids.extend(stamp + _PAIRS[counter // len(_PAIRS)] + _PAIRS[counter % len(_PAIRS)]
+                       for counter in range(self._counter, stop))
+            self._counter = stop
+        return ids
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生管理系统 - 二级索引
+Student Management System - Secondary Indexes
+由学生和课程记录派生、随每次修改增量维护的索引
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class RecordIndex:
+    """
+    索引基类：记录发生变化后，系统以记录的最新状态调用 update_*；
+    记录为None表示已被删除。索引自行保存旧状态，以便移除过时的条目
+    """
+    
+    def update_student(self, student_id: str, student) -> None:
+        pass
+    
+    def update_course(self, course_id: str, course) -> None:
+        pass
+    
+    def build(self, students: Dict, courses: Dict) -> None:
+        """根据全部记录建立索引"""
+        for student_id, student in students.items():
+            self.update_student(student_id, student)
+        for course_id, course in courses.items():
+            self.update_course(course_id, course)
+
+
+class ClassIndex(RecordIndex):
+    """年级 -> 班级 -> 学生ID 的索引，班级内按加入顺序排列"""
+    
+    def __init__(self):
+        self._classes: Dict[str, Dict[str, Dict[str, None]]] = {}
+        # 每名学生当前所在的 (年级, 班级)
+        self._key_of: Dict[str, Tuple[str, str]] = {}
+    
+    def update_student(self, student_id: str, student) -> None:
+        key = None if student is None else (student.grade, student.class_name)
+        old_key = self._key_of.get(student_id)
+        if key == old_key:
+            return
+        
+        if old_key is not None:
+            grade, class_name = old_key
+            classes = self._classes[grade]
+            del classes[class_name][student_id]
+            if not classes[class_name]:
+                del classes[class_name]
+                if not classes:
+                    del self._classes[grade]
+            del self._key_of[student_id]
+        
+        if key is not None:
+            self._classes.setdefault(key[0], {}).setdefault(key[1], {})[student_id] = None
+            self._key_of[student_id] = key
+    
+    def class_members(self, grade: str, class_name: str) -> List[str]:
+        """指定班级的学生ID"""
+        return list(self._classes.get(grade, {}).get(class_name, ()))
+    
+    def grade_members(self, grade: str) -> List[str]:
+        """指定年级的学生ID，按班级分组"""
+        return [student_id for members in self._classes.get(grade, {}).values() for student_id in members]
+
+
+
+class NGramIndex(RecordIndex):
+    """
+    学生搜索用的字符n-gram倒排索引，与逐个比较子串的结果相同（包括顺序）
+    
+    姓名、年级、班级按不同取值建立一元和二元gram（中文按单字切分，无需分词），
+    同一取值的学生共用一份倒排记录；学号各不相同且字符集很小，gram无法缩小范围，
+    改为在拼接后的学号文本上直接查找子串
+    """
+    
+    def __init__(self):
+        # 学生ID -> 序号，字典顺序与学生字典一致，序号用于按原顺序排列结果
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        # 每名学生的 (姓名, 年级, 班级)，均已转为小写
+        self._fields_of: Dict[str, Tuple[str, ...]] = {}
+        self._value_students: Dict[str, Dict[str, None]] = {}
+        self._gram_values: Dict[str, Set[str]] = {}
+        # 学号文本：各学号（小写）以\0分隔拼接，删除的学号在查询时跳过，积累过多时重建；
+        # 新增的学号先放在 _new_ids 中，查询时一次性拼接
+        self._ids: List[str] = []
+        self._id_starts = array('Q')
+        self._id_text = ''
+        self._id_length = 0
+        self._new_ids: List[str] = []
+        self._id_chars: Set[str] = set()
+    
+    @staticmethod
+    def grams(value: str) -> Set[str]:
+        """取值的全部一元和二元gram"""
+        return set(value) | {value[i:i + 2] for i in range(len(value) - 1)}
+    
+    def update_student(self, student_id: str, student) -> None:
+        fields = None if student is None else (student.name.lower(), student.grade.lower(),
+                                                 student.class_name.lower())
+        old_fields = self._fields_of.get(student_id)
+        if fields == old_fields:
+            return
+        
+        if old_fields is not None:
+            for value in set(old_fields):
+                students = self._value_students[value]
+                del students[student_id]
+                if not students:
+                    del self._value_students[value]
+                    for gram in self.grams(value):
+                        values = self._gram_values[gram]
+                        values.discard(value)
+                        if not values:
+                            del self._gram_values[gram]
+            del self._fields_of[student_id]
+        
+        if fields is None:
+            self._seq.pop(student_id, None)
+            return
+        
+        for value in set(fields):
+            if value not in self._value_students:
+                for gram in self.grams(value):
+                    self._gram_values.setdefault(gram, set()).add(value)
+            self._value_students.setdefault(value, {})[student_id] = None
+        self._fields_of[student_id] = fields
+        
+        if student_id not in self._seq:
+            self._seq[student_id] = self._next_seq
+            self._next_seq += 1
+            self._append_id(student_id)
+    
+    def _append_id(self, student_id: str):
+        if len(self._ids) > 2 * len(self._seq) + 1024:
+            # 已删除的学号过多，按当前学生重建学号文本
+            self._ids = []
+            self._id_starts = array('Q')
+            self._id_text = ''
+            self._id_length = 0
+            self._new_ids = []
+            for existing_id in self._seq:
+                if existing_id != student_id:
+                    self._append_id(existing_id)
+        
+        value = student_id.lower()
+        if self._ids:
+            self._id_length += 1
+        self._id_starts.append(self._id_length)
+        self._id_length += len(value)
+        self._ids.append(student_id)
+        self._new_ids.append(value)
+        self._id_chars.update(value)
+    
+    def _match_ids(self, keyword: str) -> Set[str]:
+        """学号中包含关键字的学生"""
+        matched = set()
+        if not set(keyword) <= self._id_chars:
+            return matched
+        if self._new_ids:
+            if len(self._new_ids) < len(self._ids):
+                self._new_ids.insert(0, self._id_text)
+            self._id_text = '\0'.join(self._new_ids)
+            self._new_ids = []
+        text = self._id_text
+        position = text.find(keyword)
+        while position != -1:
+            i = bisect_right(self._id_starts, position) - 1
+            student_id = self._ids[i]
+            if student_id in self._seq and keyword in student_id.lower():
+                matched.add(student_id)
+            # 同一学号只需命中一次，从下一个学号开始继续查找
+            if i + 1 == len(self._ids):
+                break
+            position = text.find(keyword, self._id_starts[i + 1])
+        return matched
+    
+    def search(self, keyword: str) -> List[str]:
+        """姓名、学号、年级或班级中包含关键字（已转为小写）的学生ID，按学生字典的顺序排列"""
+        if not keyword:
+            return list(self._seq)
+        
+        if len(keyword) == 1:
+            values = self._gram_values.get(keyword, ())
+        else:
+            # 只需取最少的一个二元gram作为候选，再逐个验证子串
+            candidates = min((self._gram_values.get(keyword[i:i + 2], set()) for i in range(len(keyword) - 1)),
+                             key=len)
+            values = [value for value in candidates if keyword in value]
+        
+        matched = self._match_ids(keyword)
+        for value in values:
+            matched.update(self._value_students[value])
+        
+        if len(matched) * 8 > len(self._seq):
+            return [student_id for student_id in self._seq if student_id in matched]
+        return sorted(matched, key=self._seq.__getitem__)
+
+
+class PrefixIndex(RecordIndex):
+    """姓名和学号的前缀补全索引：按小写键排序的数组，通过二分查找定位前缀范围"""
+    
+    def __init__(self):
+        # (小写姓名, 学号) 和 (小写学号, 学号)，均保持有序
+        self._names: List[Tuple[str, str]] = []
+        self._ids: List[Tuple[str, str]] = []
+        self._name_of: Dict[str, str] = {}
+    
+    def build(self, students: Dict, courses: Dict) -> None:
+        # 一次性排序，避免逐条插入有序数组
+        self._name_of = {student_id: student.name.lower() for student_id, student in students.items()}
+        self._names = sorted((name, student_id) for student_id, name in self._name_of.items())
+        self._ids = sorted((student_id.lower(), student_id) for student_id in self._name_of)
+    
+    def update_student(self, student_id: str, student) -> None:
+        name = None if student is None else student.name.lower()
+        old_name = self._name_of.get(student_id)
+        if name == old_name:
+            return
+        
+        if old_name is not None:
+            del self._names[bisect_left(self._names, (old_name, student_id))]
+            del self._name_of[student_id]
+        if name is None:
+            del self._ids[bisect_left(self._ids, (student_id.lower(), student_id))]
+            return
+        
+        insort(self._names, (name, student_id))
+        self._name_of[student_id] = name
+        if old_name is None:
+            insort(self._ids, (student_id.lower(), student_id))
+    
+    @staticmethod
+    def _prefixed(entries: List[Tuple[str, str]], prefix: str) -> Iterator[str]:
+        """键以prefix开头的条目对应的学号，按键的顺序"""
+        for i in range(bisect_left(entries, (prefix,)), len(entries)):
+            key, student_id = entries[i]
+            if not key.startswith(prefix):
+                break
+            yield student_id
+    
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """姓名或学号以prefix开头（不区分大小写）的前limit名学生，姓名匹配的在前"""
+        prefix = prefix.lower()
+        results: Dict[str, None] = {}
+        for entries in (self._names, self._ids):
+            for student_id in self._prefixed(entries, prefix):
+                if len(results) >= limit:
+                    return list(results)
+                results[student_id] = None
+        return list(results)
+
+
+# 排名范围：(课程ID, 年级, 班级)，课程ID为None表示按平均成绩，年级/班级为None表示不限
+RankKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+class ScoreIndex(RecordIndex):
+    """
+    成绩排名索引：每门课程（及平均成绩）在全校、各年级、各班级范围内
+    各维护一个按成绩从高到低排序的数组 [(-成绩, 学号), ...]
+    """
+    
+    def __init__(self):
+        self._rankings: Dict[RankKey, List[Tuple[float, str]]] = {}
+        # 每名学生当前所在的排名范围及对应的成绩
+        self._entries_of: Dict[str, Dict[RankKey, float]] = {}
+    
+    @staticmethod
+    def _entries(student) -> Dict[RankKey, float]:
+        entries = {}
+        scores = [(course_id, score) for course_id, score in student.scores.items() if score is not None]
+        if scores:
+            scores.append((None, sum(score for _, score in scores) / len(scores)))
+        for course_id, score in scores:
+            entries[(course_id, None, None)] = score
+            entries[(course_id, student.grade, None)] = score
+            entries[(course_id, student.grade, student.class_name)] = score
+        return entries
+    
+    def build(self, students: Dict, courses: Dict) -> None:
+        # 先收集全部条目再逐个排序，避免逐条插入有序数组
+        for student_id, student in students.items():
+            entries = self._entries(student)
+            if entries:
+                self._entries_of[student_id] = entries
+                for key, score in entries.items():
+                    self._rankings.setdefault(key, []).append((-score, student_id))
+        for ranking in self._rankings.values():
+            ranking.sort()
+    
+    def update_student(self, student_id: str, student) -> None:
+        entries = {} if student is None else self._entries(student)
+        old_entries = self._entries_of.get(student_id, {})
+        if entries == old_entries:
+            return
+        
+        for key, score in old_entries.items():
+            if entries.get(key) != score:
+                ranking = self._rankings[key]
+                del ranking[bisect_left(ranking, (-score, student_id))]
+                if not ranking:
+                    del self._rankings[key]
+        for key, score in entries.items():
+            if old_entries.get(key) != score:
+                insort(self._rankings.setdefault(key, []), (-score, student_id))
+        
+        if entries:
+            self._entries_of[student_id] = entries
+        else:
+            self._entries_of.pop(student_id, None)
+    
+    def top(self, key: RankKey, k: int) -> List[Tuple[int, str, float]]:
+        """范围内成绩最高的k名学生 [(名次, 学号, 成绩), ...]，同分同名次"""
+        results = []
+        ranking = self._rankings.get(key, [])
+        for i, (negative, student_id) in enumerate(ranking[:k]):
+            rank = results[-1][0] if results and results[-1][2] == -negative else i + 1
+            results.append((rank, student_id, -negative))
+        return results
+    
+    def rank(self, key: RankKey, student_id: str) -> Optional[Tuple[int, int, float]]:
+        """学生在范围内的 (名次, 总人数, 成绩)，没有成绩时返回None"""
+        score = self._entries_of.get(student_id, {}).get(key)
+        if score is None:
+            return None
+        ranking = self._rankings[key]
+        return bisect_left(ranking, (-score,)) + 1, len(ranking), score
+
+
+class RunningStats:
+    """可增可减的成绩统计：计数、总和、平方和，以及按取值计数维护的最值"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self._values: Dict[float, int] = {}
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+    
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        self._values[value] = self._values.get(value, 0) + 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+    
+    def remove(self, value: float):
+        self.count -= 1
+        if self.count == 0:
+            # 清零以免浮点误差累积
+            self.total = self.total_squares = 0.0
+        else:
+            self.total -= value
+            self.total_squares -= value * value
+        
+        remaining = self._values[value] - 1
+        if remaining:
+            self._values[value] = remaining
+            return
+        del self._values[value]
+        # 最值被移除时才在剩余的不同取值中重新查找，成绩的不同取值通常很少
+        if value == self.min:
+            self.min = min(self._values) if self._values else None
+        if value == self.max:
+            self.max = max(self._values) if self._values else None
+    
+    def summary(self) -> Dict:
+        """计数、平均值、标准差和最值，没有数据时平均值等为None"""
+        if not self.count:
+            return {'count': 0, 'average': None, 'std': None, 'min': None, 'max': None}
+        average = self.total / self.count
+        variance = max(self.total_squares / self.count - average * average, 0.0)
+        return {
+            'count': self.count,
+            'average': average,
+            'std': variance ** 0.5,
+            'min': self.min,
+            'max': self.max
+        }
+
+
+class ClassAggregate:
+    """一个班级的汇总：人数、年龄分布、各课程选课人数和成绩统计"""
+    
+    def __init__(self):
+        self.students = 0
+        self.ages: Dict[int, int] = {}
+        self.enrollments: Dict[str, int] = {}
+        self.scores = RunningStats()
+
+
+class CourseAggregate:
+    """一门课程的汇总：选课人数和成绩统计"""
+    
+    def __init__(self):
+        self.enrolled = 0
+        self.scores = RunningStats()
+
+
+def _count(counter: Dict, key, delta: int):
+    """增减计数，计数为0时删除该键"""
+    value = counter.get(key, 0) + delta
+    if value:
+        counter[key] = value
+    else:
+        counter.pop(key, None)
+
+
+class AggregateIndex(RecordIndex):
+    """
+    按课程和按班级增量维护的汇总统计：学生变化时先减去其原有贡献再加上新的贡献，
+    每次修改的开销只与该学生的选课数有关
+    """
+    
+    def __init__(self):
+        self._classes: Dict[Tuple[str, str], ClassAggregate] = {}
+        self._courses: Dict[str, CourseAggregate] = {}
+        # 每名学生计入汇总的状态：(年级, 班级, 年龄, 选课, 成绩)
+        self._state_of: Dict[str, Tuple] = {}
+    
+    def update_student(self, student_id: str, student) -> None:
+        state = None if student is None else (
+            student.grade, student.class_name, student.age,
+            tuple(student.courses), tuple(student.scores.items())
+        )
+        old_state = self._state_of.get(student_id)
+        if state == old_state:
+            return
+        
+        if old_state is not None:
+            self._apply(old_state, -1)
+            del self._state_of[student_id]
+        if state is not None:
+            self._apply(state, 1)
+            self._state_of[student_id] = state
+    
+    def _apply(self, state: Tuple, sign: int):
+        grade, class_name, age, courses, scores = state
+        class_aggregate = self._classes.get((grade, class_name))
+        if class_aggregate is None:
+            class_aggregate = self._classes[(grade, class_name)] = ClassAggregate()
+        class_aggregate.students += sign
+        _count(class_aggregate.ages, age, sign)
+        
+        for course_id in courses:
+            _count(class_aggregate.enrollments, course_id, sign)
+            self._course(course_id).enrolled += sign
+        for course_id, score in scores:
+            if score is None:
+                continue
+            for stats in (class_aggregate.scores, self._course(course_id).scores):
+                if sign > 0:
+                    stats.add(score)
+                else:
+                    stats.remove(score)
+        
+        if not class_aggregate.students:
+            del self._classes[(grade, class_name)]
+        for course_id in courses:
+            course_aggregate = self._courses.get(course_id)
+            if course_aggregate is not None and not course_aggregate.enrolled and not course_aggregate.scores.count:
+                del self._courses[course_id]
+    
+    def _course(self, course_id: str) -> CourseAggregate:
+        course_aggregate = self._courses.get(course_id)
+        if course_aggregate is None:
+            course_aggregate = self._courses[course_id] = CourseAggregate()
+        return course_aggregate
+    
+    def course(self, course_id: str) -> CourseAggregate:
+        """课程的汇总，没有学生选课时返回空的汇总"""
+        return self._courses.get(course_id) or CourseAggregate()
+    
+    def class_(self, grade: str, class_name: str) -> ClassAggregate:
+        """班级的汇总，班级没有学生时返回空的汇总"""
+        return self._classes.get((grade, class_name)) or ClassAggregate()
+
+
+class DetailCache(RecordIndex):
+    """
+    学生/课程详细信息的LRU缓存。每个缓存项登记其依赖的记录（自身及关联的课程或学生），
+    任一依赖记录发生变化时只失效依赖它的缓存项
+    """
+    
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._views: 'OrderedDict[Hashable, Dict]' = OrderedDict()
+        # 缓存项 -> 依赖的记录，以及记录 -> 依赖它的缓存项；记录以 ('student'/'course', ID) 表示
+        self._depends_on: Dict[Hashable, Tuple] = {}
+        self._dependents: Dict[Tuple[str, str], Set[Hashable]] = {}
+    
+    def build(self, students: Dict, courses: Dict) -> None:
+        # 缓存从空开始，不需要遍历记录
+        pass
+    
+    def update_student(self, student_id: str, student) -> None:
+        self._invalidate(('student', student_id))
+    
+    def update_course(self, course_id: str, course) -> None:
+        self._invalidate(('course', course_id))
+    
+    def get(self, key: Hashable) -> Optional[Dict]:
+        """取出缓存项并计入命中/未命中次数，未缓存时返回None"""
+        view = self._views.get(key)
+        if view is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._views.move_to_end(key)
+        return view
+    
+    def put(self, key: Hashable, view: Dict, depends_on: Iterable[Tuple[str, str]]) -> None:
+        """缓存一项结果，超出容量时淘汰最久未使用的项"""
+        if self.capacity <= 0:
+            return
+        self._discard(key)
+        self._views[key] = view
+        self._depends_on[key] = tuple(depends_on)
+        for record in self._depends_on[key]:
+            self._dependents.setdefault(record, set()).add(key)
+        while len(self._views) > self.capacity:
+            self._discard(next(iter(self._views)))
+    
+    def _invalidate(self, record: Tuple[str, str]):
+        for key in self._dependents.pop(record, ()):
+            self._discard(key)
+    
+    def _discard(self, key: Hashable):
+        if self._views.pop(key, None) is None:
+            return
+        for record in self._depends_on.pop(key):
+            dependents = self._dependents.get(record)
+            if dependents is not None:
+                dependents.discard(key)
+                if not dependents:
+                    del self._dependents[record]
+    
+    def info(self) -> Dict:
+        """命中次数、未命中次数、当前缓存项数和容量"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._views), 'capacity': self.capacity}
@@ -0,0 +1,1556 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+学生管理系统 - 存储后端
+Student Management System - Storage Backends
+负责学生和课程数据的持久化，支持JSON文件和SQLite数据库
+"""
+
+import bz2
+import codecs
+import copy
+import gzip
+import json
+import lzma
+import math
+import mmap
+import os
+import sqlite3
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+
+# 加载进度回调：progress(已处理量, 总量)
+ProgressCallback = Callable[[int, int], None]
+
+# 加载事件：(记录类型 'student'/'course', 记录ID, 记录数据)，数据为None表示该记录已被删除
+LoadEvent = Tuple[str, str, Optional[Dict]]
+
+# 写入任务：在数据锁内准备好，之后可在任意线程中执行，执行时不再访问内存中的对象
+WriteJob = Callable[[], None]
+
+# 快照压缩格式：名称 -> (扩展名, 文件头魔数)
+COMPRESSIONS = {
+    'gzip': ('.gz', b'\x1f\x8b'),
+    'bz2': ('.bz2', b'BZh'),
+    'lzma': ('.xz', b'\xfd7zXZ\x00'),
+}
+
+
+def compression_from_extension(path: str) -> Optional[str]:
+    """根据扩展名判断压缩格式"""
+    extension = os.path.splitext(path)[1].lower()
+    for name, (suffix, _) in COMPRESSIONS.items():
+        if extension == suffix:
+            return name
+    return None
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """根据文件头魔数判断压缩格式，文件不存在或未压缩时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for name, (_, magic) in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def compress(data: bytes, compression: str, level: Optional[int] = None) -> bytes:
+    """按指定格式压缩数据，level为None时使用各格式的默认级别"""
+    if compression == 'gzip':
+        return gzip.compress(data) if level is None else gzip.compress(data, compresslevel=level)
+    if compression == 'bz2':
+        return bz2.compress(data) if level is None else bz2.compress(data, compresslevel=level)
+    if compression == 'lzma':
+        return lzma.compress(data, preset=level)
+    raise ValueError(f"不支持的压缩格式: {compression}")
+
+
+def open_snapshot_file(path: str):
+    """
+    以二进制只读方式打开快照文件，压缩的文件按魔数自动解压，
+    返回 (可读取解压后内容的文件对象, 底层原始文件)
+    """
+    raw = open(path, 'rb')
+    compression = detect_compression(path)
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='rb'), raw
+    if compression == 'bz2':
+        return bz2.BZ2File(raw), raw
+    if compression == 'lzma':
+        return lzma.LZMAFile(raw), raw
+    return raw, raw
+
+
+class Storage:
+    """存储后端基类"""
+    
+    def exists(self) -> bool:
+        """是否已有持久化的数据"""
+        raise NotImplementedError
+    
+    def load(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        """逐条产生加载事件，调用方按顺序应用即可得到完整数据"""
+        raise NotImplementedError
+    
+    def prepare_save(self, students: Dict, courses: Dict) -> WriteJob:
+        """复制保存全部数据所需的内容，返回执行写入的任务"""
+        raise NotImplementedError
+    
+    def prepare_changes(self, students: Dict, courses: Dict, student_ids, course_ids) -> WriteJob:
+        """复制指定学生和课程的当前状态，返回执行写入的任务；ID不在字典中表示该记录已被删除"""
+        return self.prepare_save(students, courses)
+    
+    def save(self, students: Dict, courses: Dict):
+        """保存全部数据"""
+        self.prepare_save(students, courses)()
+    
+    def save_changes(self, students: Dict, courses: Dict, student_ids, course_ids):
+        """保存指定学生和课程的修改"""
+        self.prepare_changes(students, courses, student_ids, course_ids)()
+    
+    def load_partition(self, grade: str, class_name: str) -> Iterator[LoadEvent]:
+        """加载指定班级所在的、尚未加载的数据分片；不分片的存储在load时已加载全部数据"""
+        return iter(())
+    
+    def open_lazy(self) -> Optional[Tuple['RecordSource', 'RecordSource', Iterator[LoadEvent]]]:
+        """
+        按需加载：返回 (学生数据源, 课程数据源, 数据源之后的修改事件)，
+        记录只在被访问时才从数据源读取；不支持按需加载时返回None
+        """
+        return None
+    
+    def close(self):
+        """释放存储后端占用的资源"""
+        pass
+
+
+class RecordSource:
+    """按ID读取单条记录的数据源"""
+    
+    def ids(self) -> Iterable[str]:
+        """按存储顺序产生全部记录ID"""
+        raise NotImplementedError
+    
+    def __len__(self) -> int:
+        raise NotImplementedError
+    
+    def read(self, record_id: str) -> Dict:
+        """读取并解码一条记录"""
+        raise NotImplementedError
+    
+    def close(self):
+        pass
+
+
+class SnapshotSource(RecordSource):
+    """
+    快照文件数据源的包装：全量写入快照前关闭底层数据源，写入后换成新打开的数据源，
+    因为Windows上无法替换仍被打开（或映射）的文件；替换期间的读取等待新数据源就绪
+    """
+    
+    def __init__(self, source: RecordSource, lock: threading.RLock):
+        self.source = source
+        self._lock = lock
+    
+    def ids(self) -> Iterable[str]:
+        return self.source.ids()
+    
+    def __len__(self) -> int:
+        return len(self.source)
+    
+    def read(self, record_id: str) -> Dict:
+        with self._lock:
+            return self.source.read(record_id)
+    
+    def close(self):
+        self.source.close()
+
+
+class LazyRecordMap(MutableMapping):
+    """
+    按需加载的记录映射：记录在首次访问时才从数据源读取并解码
+    
+    未修改的记录由LRU缓存限制常驻数量，被淘汰后下次访问重新读取；
+    修改过的记录（pin 或直接赋值）与数据源不再一致，在本次会话中一直常驻内存
+    """
+    
+    def __init__(self, source: RecordSource, factory: Callable[[Dict], object], cache_size: int = 10000):
+        self._source = source
+        self._factory = factory
+        self.cache_size = cache_size
+        # 全部记录ID，保持与字典相同的顺序语义
+        self._keys: Dict[str, None] = dict.fromkeys(source.ids())
+        self._cache: 'OrderedDict[str, object]' = OrderedDict()
+        self._pinned: Dict[str, object] = {}
+        # 映射可能同时被调用线程和后台写线程访问
+        self._lock = threading.RLock()
+    
+    def __getitem__(self, key: str):
+        with self._lock:
+            value = self._pinned.get(key)
+            if value is not None:
+                return value
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                return value
+            if key not in self._keys:
+                raise KeyError(key)
+            
+            value = self._cache[key] = self._factory(self._source.read(key))
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return value
+    
+    def __setitem__(self, key: str, value):
+        with self._lock:
+            self._cache.pop(key, None)
+            self._pinned[key] = value
+            if key not in self._keys:
+                self._keys[key] = None
+    
+    def __delitem__(self, key: str):
+        with self._lock:
+            del self._keys[key]
+            self._cache.pop(key, None)
+            self._pinned.pop(key, None)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def pin(self, key: str):
+        """将记录固定在内存中，记录即将被修改时调用；记录不存在时忽略"""
+        with self._lock:
+            if key in self._keys and key not in self._pinned:
+                self._pinned[key] = self[key]
+                self._cache.pop(key, None)
+    
+    def resident(self) -> int:
+        """当前常驻内存的已解码记录数"""
+        return len(self._cache) + len(self._pinned)
+    
+    def close(self):
+        """关闭数据源"""
+        self._source.close()
+
+
+class FileStorage(Storage):
+    """基于快照文件的存储，修改以增量日志的形式追加，日志过长时自动合并回快照"""
+    
+    def __init__(self, data_file: str, journal: bool = True, compact_threshold: int = 1000,
+                 compression: Optional[str] = None, compression_level: Optional[int] = None):
+        self.data_file = data_file
+        # 快照压缩格式：未指定时根据扩展名（.gz/.bz2/.xz）判断，再沿用已有文件的格式
+        self.compression = compression or compression_from_extension(data_file) or detect_compression(data_file)
+        if self.compression is not None and self.compression not in COMPRESSIONS:
+            raise ValueError(f"不支持的压缩格式: {self.compression}")
+        self.compression_level = compression_level
+        # 日志模式：每次修改只向日志文件追加涉及的记录，而不是重写整个数据文件
+        self.journal = journal
+        self.journal_file = data_file + ".journal"
+        # 日志记录数超过该值且超过快照记录数时，下次保存改为全量写入快照，
+        # 使每次修改的平均写入量与修改大小成正比，同时日志长度不会无限增长
+        self.compact_threshold = compact_threshold
+        self._snapshot_records = 0
+        self._journal_records = 0
+        # 日志末尾不完整记录的起始字节偏移量，下次追加前截断到此处；None表示日志完整
+        self._journal_end: Optional[int] = None
+        # 按需加载打开的快照数据源，全量写入快照时关闭并重新打开
+        self._sources: List[SnapshotSource] = []
+        self._sources_lock = threading.RLock()
+    
+    def exists(self) -> bool:
+        return os.path.exists(self.data_file) or os.path.exists(self.journal_file)
+    
+    def load(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        self._snapshot_records = 0
+        self._journal_records = 0
+        if os.path.exists(self.data_file):
+            for event in self.load_snapshot(progress):
+                self._snapshot_records += 1
+                yield event
+        
+        # 重放快照之后的修改日志
+        for event in self.replay_journal():
+            self._journal_records += 1
+            yield event
+    
+    def load_snapshot(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        """逐条读取快照文件中的记录"""
+        raise NotImplementedError
+    
+    def encode_snapshot(self, student_records: Iterable[Dict], course_records: Iterable[Dict]) -> bytes:
+        """将全部记录编码为快照文件内容"""
+        raise NotImplementedError
+    
+    def encode_files(self, student_records: Iterable[Dict], course_records: Iterable[Dict]) -> Dict[str, bytes]:
+        """编码快照及其附属文件，返回 {路径: 内容}，按顺序写入"""
+        data = self.encode_snapshot(student_records, course_records)
+        if self.compression:
+            data = compress(data, self.compression, self.compression_level)
+        return {self.data_file: data}
+    
+    def write_snapshot(self, student_records: Iterable[Dict], course_records: Iterable[Dict]):
+        """将全部记录写入快照文件"""
+        for path, data in self.encode_files(student_records, course_records).items():
+            atomic_write(path, data)
+    
+    def open_sources(self) -> Tuple[RecordSource, RecordSource]:
+        """打开快照文件的学生和课程数据源"""
+        raise NotImplementedError
+    
+    def open_lazy(self) -> Optional[Tuple[RecordSource, RecordSource, Iterator[LoadEvent]]]:
+        # 压缩的快照无法按偏移量随机读取
+        if not os.path.exists(self.data_file) or detect_compression(self.data_file):
+            return None
+        self._sources = [SnapshotSource(source, self._sources_lock) for source in self.open_sources()]
+        student_source, course_source = self._sources
+        self._snapshot_records = len(student_source) + len(course_source)
+        self._journal_records = 0
+        
+        def journal_events():
+            for event in self.replay_journal():
+                self._journal_records += 1
+                yield event
+        return student_source, course_source, journal_events()
+    
+    def replay_journal(self) -> Iterator[LoadEvent]:
+        """逐条读取快照之后的修改日志"""
+        self._journal_end = None
+        if not os.path.exists(self.journal_file):
+            return
+        
+        offset = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    # 最后一条记录可能因崩溃只写了一半，忽略之后的内容，
+                    # 并记下截断位置，避免之后追加的记录接在残缺的内容后面
+                    self._journal_end = offset
+                    break
+                
+                offset += len(line)
+                yield record['type'], record['id'], record['data']
+    
+    def prepare_save(self, students: Dict, courses: Dict) -> WriteJob:
+        files = self.encode_files(
+            (student.to_dict() for student in students.values()),
+            (course.to_dict() for course in courses.values())
+        )
+        self._snapshot_records = len(students) + len(courses)
+        self._journal_records = 0
+        self._journal_end = None
+        
+        def write():
+            with self._sources_lock:
+                for source in self._sources:
+                    source.close()
+                try:
+                    for path, data in files.items():
+                        atomic_write(path, data)
+                    # 快照已包含日志中的全部修改，清空日志
+                    if os.path.exists(self.journal_file):
+                        os.remove(self.journal_file)
+                finally:
+                    # 未修改的记录与新快照中的相同，改为从新快照读取
+                    if self._sources:
+                        for source, reopened in zip(self._sources, self.open_sources()):
+                            source.source = reopened
+        return write
+    
+    def prepare_changes(self, students: Dict, courses: Dict, student_ids, course_ids) -> WriteJob:
+        journal_records = self._journal_records + len(student_ids) + len(course_ids)
+        if not self.journal or journal_records > max(self.compact_threshold, self._snapshot_records):
+            return self.prepare_save(students, courses)
+        
+        lines = []
+        for student_id in student_ids:
+            student = students.get(student_id)
+            lines.append({
+                'type': 'student',
+                'id': student_id,
+                'data': student.to_dict() if student else None
+            })
+        for course_id in course_ids:
+            course = courses.get(course_id)
+            lines.append({
+                'type': 'course',
+                'id': course_id,
+                'data': course.to_dict() if course else None
+            })
+        data = ''.join(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in lines
+        ).encode('utf-8')
+        self._journal_records = journal_records
+        journal_end, self._journal_end = self._journal_end, None
+        
+        def append():
+            """将记录追加到日志文件并同步到磁盘"""
+            with open(self.journal_file, 'ab') as f:
+                if journal_end is not None:
+                    # 先去掉上次崩溃留下的不完整记录
+                    f.truncate(journal_end)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        return append
+
+
+class JSONStorage(FileStorage):
+    """
+    JSON文件存储
+    
+    快照旁附带偏移量索引文件（.idx），记录每条记录的ID、字节偏移量和长度，
+    按需加载时只读取被访问的记录
+    """
+    
+    ID_FIELDS = {'students': 'student_id', 'courses': 'course_id'}
+    
+    @property
+    def index_file(self) -> str:
+        return self.data_file + ".idx"
+    
+    def load_snapshot(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        for section, record in iter_json_records(self.data_file, progress):
+            if section == 'students':
+                yield 'student', record['student_id'], record
+            elif section == 'courses':
+                yield 'course', record['course_id'], record
+    
+    def encode_snapshot(self, student_records: Iterable[Dict], course_records: Iterable[Dict]) -> bytes:
+        data = {
+            'students': list(student_records),
+            'courses': list(course_records)
+        }
+        return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+    
+    def encode_files(self, student_records: Iterable[Dict], course_records: Iterable[Dict]) -> Dict[str, bytes]:
+        if self.compression:
+            # 压缩的快照不支持按需加载，不需要偏移量索引
+            return super().encode_files(student_records, course_records)
+        
+        # 逐条编码记录并拼接成与 encode_snapshot 相同的内容，同时得到每条记录的位置
+        parts = []
+        size = 0
+        
+        def emit(text: str) -> int:
+            nonlocal size
+            data = text.encode('utf-8')
+            parts.append(data)
+            size += len(data)
+            return len(data)
+        
+        index = {}
+        emit('{')
+        for section, records in (('students', student_records), ('courses', course_records)):
+            ids, offsets, lengths = [], [], []
+            emit(('\n' if section == 'students' else ',\n') + f'  "{section}": [')
+            for record in records:
+                emit(',\n    ' if ids else '\n    ')
+                offsets.append(size)
+                lengths.append(emit(json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n    ')))
+                ids.append(record[self.ID_FIELDS[section]])
+            emit('\n  ]' if ids else ']')
+            index[section] = {'ids': ids, 'offsets': offsets, 'lengths': lengths}
+        emit('\n}')
+        index['size'] = size
+        
+        return {
+            self.data_file: b''.join(parts),
+            # 索引在快照之后写入，两次写入之间崩溃时，文件大小不符的旧索引会在加载时被重建
+            self.index_file: json.dumps(index, separators=(',', ':')).encode('utf-8')
+        }
+    
+    def build_index(self) -> Dict:
+        """扫描数据文件生成偏移量索引"""
+        index = {section: {'ids': [], 'offsets': [], 'lengths': []} for section in self.ID_FIELDS}
+        index['size'] = os.path.getsize(self.data_file)
+        for section, record, offset, length in iter_json_spans(self.data_file):
+            entry = index[section]
+            entry['ids'].append(record[self.ID_FIELDS[section]])
+            entry['offsets'].append(offset)
+            entry['lengths'].append(length)
+        return index
+    
+    def load_index(self) -> Dict:
+        """读取偏移量索引，索引缺失或与数据文件不匹配时重新扫描并保存"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('size') == os.path.getsize(self.data_file):
+                return index
+        except (OSError, ValueError):
+            pass
+        
+        index = self.build_index()
+        try:
+            atomic_write(self.index_file, json.dumps(index, separators=(',', ':')).encode('utf-8'))
+        except OSError:
+            # 索引只是加速手段，无法保存时下次重新扫描即可
+            pass
+        return index
+    
+    def open_sources(self) -> Tuple[RecordSource, RecordSource]:
+        index = self.load_index()
+        return (JSONRecordSource(self.data_file, index['students'], 'student_id'),
+                JSONRecordSource(self.data_file, index['courses'], 'course_id'))
+
+
+class JSONRecordSource(RecordSource):
+    """
+    根据偏移量索引从JSON快照中读取单条记录
+    
+    打开后一直持有文件句柄，读取的是打开时的版本，与索引保持一致；
+    本存储全量写入快照时会先关闭，再按新的索引重新打开
+    """
+    
+    def __init__(self, data_file: str, entry: Dict, id_field: str):
+        self._file = open(data_file, 'rb')
+        self._ids = entry['ids']
+        self._positions = {record_id: i for i, record_id in enumerate(self._ids)}
+        self._offsets = array('Q', entry['offsets'])
+        self._lengths = array('I', entry['lengths'])
+        self._id_field = id_field
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def ids(self) -> Iterable[str]:
+        return self._ids
+    
+    def read(self, record_id: str) -> Dict:
+        i = self._positions[record_id]
+        self._file.seek(self._offsets[i])
+        record = json.loads(self._file.read(self._lengths[i]).decode('utf-8'))
+        if record.get(self._id_field) != record_id:
+            raise ValueError(f"偏移量索引与数据文件不一致: {record_id}")
+        return record
+    
+    def close(self):
+        self._file.close()
+
+
+class BinaryStorage(FileStorage):
+    """
+    紧凑的二进制快照存储
+    
+    文件布局（小端序）：
+      文件头   魔数、版本、各区段的记录数和偏移量
+      字符串表 偏移数组 + UTF-8数据，年级、班级、教师、ID等重复字符串只存一份
+      学生表   定长记录 (ID, 姓名, 年龄, 年级, 班级, 选课起始位置, 选课数)
+      课程表   定长记录 (ID, 名称, 教师, 学分, 成员起始位置, 成员数)
+      选课矩阵 定长记录 (课程ID, 成绩)，成绩为NaN表示暂无成绩
+      课程成员 学生ID
+      ID索引   按ID排序的学生/课程记录下标，用于二分查找
+      替换字段 （版本2）JSON对象 {"students"/"courses": {记录下标: {字段: 值}}}，
+               保存无法原样放入定长记录的字段：非整数的年龄、非浮点数的成绩和学分、
+               未选课程的成绩、非字符串的文本字段；解码时覆盖定长记录中的对应字段
+    所有字符串字段都是字符串表下标
+    """
+    
+    MAGIC = b'SMSB'
+    VERSION = 2
+    # 仍可读取的旧版本（版本1没有替换字段区段）
+    READABLE_VERSIONS = (1, 2)
+    # 定长记录中年龄字段（int32）的范围
+    AGE_RANGE = range(-(1 << 31), 1 << 31)
+    HEADER = struct.Struct('<4sHH5I7Q')
+    STUDENT = struct.Struct('<IIiIIII')
+    COURSE = struct.Struct('<IIIdII')
+    ENROLLMENT = struct.Struct('<Id')
+    MEMBER = struct.Struct('<I')
+    
+    def load_snapshot(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        with BinarySnapshot(self.data_file) as snapshot:
+            total = snapshot.student_count + snapshot.course_count
+            done = 0
+            for index in range(snapshot.student_count):
+                record = snapshot.student(index)
+                yield 'student', record['student_id'], record
+                done += 1
+                if progress and done % 10000 == 0:
+                    progress(done, total)
+            for index in range(snapshot.course_count):
+                record = snapshot.course(index)
+                yield 'course', record['course_id'], record
+            if progress:
+                progress(total, total)
+    
+    def encode_snapshot(self, student_records: Iterable[Dict], course_records: Iterable[Dict]) -> bytes:
+        strings: Dict[str, int] = {}
+        
+        def intern(value) -> int:
+            value = str(value)
+            index = strings.get(value)
+            if index is None:
+                index = strings[value] = len(strings)
+            return index
+        
+        # 记录类型 -> {记录下标: {字段: 原值}}，定长记录中无法原样保存的字段
+        overrides: Dict[str, Dict[int, Dict]] = {'students': {}, 'courses': {}}
+        
+        def override(section: str, index: int, record: Dict, field: str):
+            overrides[section].setdefault(index, {})[field] = record[field]
+        
+        def text(section: str, index: int, record: Dict, field: str) -> int:
+            if type(record[field]) is not str:
+                override(section, index, record, field)
+            return intern(record[field])
+        
+        students = bytearray()
+        enrollments = bytearray()
+        student_ids = []
+        enrollment_count = 0
+        for index, record in enumerate(student_records):
+            scores = record.get('scores', {})
+            courses = record.get('courses', [])
+            age = record['age']
+            if type(age) is not int or age not in self.AGE_RANGE:
+                override('students', index, record, 'age')
+                age = 0
+            # 成绩只有浮点数能原样存入选课矩阵；其余情况（整数、None、NaN、未选课程的成绩）整体另存
+            if any(type(score) is not float or score != score or course_id not in courses
+                   for course_id, score in scores.items()):
+                override('students', index, record, 'scores')
+                scores = {}
+            students += self.STUDENT.pack(
+                intern(record['student_id']), text('students', index, record, 'name'), age,
+                text('students', index, record, 'grade'), text('students', index, record, 'class_name'),
+                enrollment_count, len(courses)
+            )
+            for course_id in courses:
+                score = scores.get(course_id)
+                enrollments += self.ENROLLMENT.pack(intern(course_id), math.nan if score is None else score)
+            enrollment_count += len(courses)
+            student_ids.append(record['student_id'])
+        
+        courses = bytearray()
+        members = bytearray()
+        course_ids = []
+        member_count = 0
+        for index, record in enumerate(course_records):
+            course_students = record.get('students', [])
+            credit = record['credit']
+            if type(credit) is not float:
+                override('courses', index, record, 'credit')
+                credit = math.nan
+            courses += self.COURSE.pack(
+                intern(record['course_id']), text('courses', index, record, 'name'),
+                text('courses', index, record, 'teacher'), credit, member_count, len(course_students)
+            )
+            for student_id in course_students:
+                members += self.MEMBER.pack(intern(student_id))
+            member_count += len(course_students)
+            course_ids.append(record['course_id'])
+        
+        student_order = array('I', sorted(range(len(student_ids)), key=student_ids.__getitem__))
+        course_order = array('I', sorted(range(len(course_ids)), key=course_ids.__getitem__))
+        
+        string_data = bytearray()
+        string_offsets = array('I', [0])
+        for value in strings:
+            string_data += value.encode('utf-8')
+            string_offsets.append(len(string_data))
+        if len(string_data) >= 1 << 32:
+            raise ValueError("字符串表超过4GB，无法写入二进制快照")
+        
+        sections = [
+            string_offsets.tobytes(), bytes(string_data), bytes(students), bytes(courses),
+            bytes(enrollments), bytes(members), student_order.tobytes(), course_order.tobytes()
+        ]
+        if overrides['students'] or overrides['courses']:
+            # 替换字段紧接在课程ID索引之后，一直到文件末尾
+            sections.append(json.dumps(overrides, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        offsets = []
+        position = self.HEADER.size
+        for section in sections:
+            offsets.append(position)
+            position += len(section)
+        
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, 0,
+            len(strings), len(student_ids), len(course_ids), enrollment_count, member_count,
+            # 替换字段区段的位置由课程ID索引的末尾推算，不在文件头中
+            *offsets[1:8]
+        )
+        return b''.join([header] + sections)
+    
+    def open_sources(self) -> Tuple[RecordSource, RecordSource]:
+        # 快照自带按ID排序的索引，两个数据源共用同一个内存映射
+        snapshot = BinarySnapshot(self.data_file)
+        return BinaryRecordSource(snapshot, 'student'), BinaryRecordSource(snapshot, 'course')
+
+
+class BinarySnapshot:
+    """通过mmap只读打开二进制快照，按需解码记录；压缩的快照先整体解压到内存"""
+    
+    def __init__(self, data_file: str):
+        if detect_compression(data_file):
+            # 整体解压到内存后不再需要文件
+            self._file = None
+            stream, raw = open_snapshot_file(data_file)
+            with stream, raw:
+                self._mm = stream.read()
+        else:
+            self._file = open(data_file, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.string_count, self.student_count, self.course_count,
+         self.enrollment_count, self.member_count, self._strings_off, self._students_off,
+         self._courses_off, self._enrollments_off, self._members_off, self._student_order_off,
+         self._course_order_off) = BinaryStorage.HEADER.unpack_from(self._mm, 0)
+        if magic != BinaryStorage.MAGIC or version not in BinaryStorage.READABLE_VERSIONS:
+            self.close()
+            raise ValueError(f"不是有效的二进制快照文件: {data_file}")
+        # 替换字段：记录类型 -> {记录下标: {字段: 原值}}
+        self._overrides: Dict[str, Dict[int, Dict]] = {'students': {}, 'courses': {}}
+        overrides_off = self._course_order_off + self.course_count * BinaryStorage.MEMBER.size
+        if len(self._mm) > overrides_off:
+            for section, records in json.loads(bytes(self._mm[overrides_off:]).decode('utf-8')).items():
+                self._overrides[section] = {int(index): fields for index, fields in records.items()}
+        # 已解码的字符串，相同下标只解码一次
+        self._strings: Dict[int, str] = {}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        """关闭内存映射和文件"""
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        if self._file is not None:
+            self._file.close()
+    
+    def string(self, index: int) -> str:
+        """按下标解码字符串表中的字符串"""
+        value = self._strings.get(index)
+        if value is None:
+            start, end = struct.unpack_from('<II', self._mm, BinaryStorage.HEADER.size + index * 4)
+            value = self._strings[index] = self._mm[self._strings_off + start:self._strings_off + end].decode('utf-8')
+        return value
+    
+    def student(self, index: int) -> Dict:
+        """解码第index条学生记录"""
+        (student_id, name, age, grade, class_name, start, count) = BinaryStorage.STUDENT.unpack_from(
+            self._mm, self._students_off + index * BinaryStorage.STUDENT.size)
+        courses = []
+        scores = {}
+        for course_id, score in BinaryStorage.ENROLLMENT.iter_unpack(self._mm[
+                self._enrollments_off + start * BinaryStorage.ENROLLMENT.size:
+                self._enrollments_off + (start + count) * BinaryStorage.ENROLLMENT.size]):
+            course_id = self.string(course_id)
+            courses.append(course_id)
+            if not math.isnan(score):
+                scores[course_id] = score
+        record = {
+            'student_id': self.string(student_id),
+            'name': self.string(name),
+            'age': age,
+            'grade': self.string(grade),
+            'class_name': self.string(class_name),
+            'courses': courses,
+            'scores': scores
+        }
+        overrides = self._overrides['students'].get(index)
+        if overrides:
+            record.update(copy.deepcopy(overrides))
+        return record
+    
+    def course(self, index: int) -> Dict:
+        """解码第index条课程记录"""
+        (course_id, name, teacher, credit, start, count) = BinaryStorage.COURSE.unpack_from(
+            self._mm, self._courses_off + index * BinaryStorage.COURSE.size)
+        members = self._mm[self._members_off + start * 4:self._members_off + (start + count) * 4]
+        record = {
+            'course_id': self.string(course_id),
+            'name': self.string(name),
+            'teacher': self.string(teacher),
+            'credit': credit,
+            'students': [self.string(student_id) for student_id, in BinaryStorage.MEMBER.iter_unpack(members)]
+        }
+        overrides = self._overrides['courses'].get(index)
+        if overrides:
+            record.update(copy.deepcopy(overrides))
+        return record
+    
+    def _find(self, record_id: str, order_off: int, record_off: int, record_size: int,
+              count: int) -> Optional[int]:
+        """在按ID排序的索引上二分查找记录下标（ID是每条记录的第一个字段）"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            index, = BinaryStorage.MEMBER.unpack_from(self._mm, order_off + middle * 4)
+            id_index, = BinaryStorage.MEMBER.unpack_from(self._mm, record_off + index * record_size)
+            middle_id = self.string(id_index)
+            if middle_id == record_id:
+                return index
+            if middle_id < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+    
+    def find_student(self, student_id: str) -> Optional[Dict]:
+        """按学号查找学生记录，只解码查找路径上的ID"""
+        index = self._find(student_id, self._student_order_off, self._students_off,
+                           BinaryStorage.STUDENT.size, self.student_count)
+        return None if index is None else self.student(index)
+    
+    def find_course(self, course_id: str) -> Optional[Dict]:
+        """按课程号查找课程记录"""
+        index = self._find(course_id, self._course_order_off, self._courses_off,
+                           BinaryStorage.COURSE.size, self.course_count)
+        return None if index is None else self.course(index)
+    
+    def student_ids(self) -> Iterator[str]:
+        """按存储顺序产生全部学号，不解码记录的其他字段"""
+        for index in range(self.student_count):
+            id_index, = BinaryStorage.MEMBER.unpack_from(
+                self._mm, self._students_off + index * BinaryStorage.STUDENT.size)
+            yield self.string(id_index)
+    
+    def course_ids(self) -> Iterator[str]:
+        """按存储顺序产生全部课程号"""
+        for index in range(self.course_count):
+            id_index, = BinaryStorage.MEMBER.unpack_from(
+                self._mm, self._courses_off + index * BinaryStorage.COURSE.size)
+            yield self.string(id_index)
+
+
+class BinaryRecordSource(RecordSource):
+    """通过二进制快照的ID索引二分查找单条记录"""
+    
+    def __init__(self, snapshot: BinarySnapshot, record_type: str):
+        self._snapshot = snapshot
+        self._record_type = record_type
+    
+    def __len__(self) -> int:
+        if self._record_type == 'student':
+            return self._snapshot.student_count
+        return self._snapshot.course_count
+    
+    def ids(self) -> Iterable[str]:
+        if self._record_type == 'student':
+            return self._snapshot.student_ids()
+        return self._snapshot.course_ids()
+    
+    def read(self, record_id: str) -> Dict:
+        if self._record_type == 'student':
+            record = self._snapshot.find_student(record_id)
+        else:
+            record = self._snapshot.find_course(record_id)
+        if record is None:
+            raise KeyError(record_id)
+        return record
+    
+    def close(self):
+        # 共用的快照由两个数据源各关闭一次，重复关闭无副作用
+        self._snapshot.close()
+
+
+class SQLiteStorage(Storage):
+    """SQLite数据库存储，单条记录的修改只更新对应的行"""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS students (
+            student_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            age INTEGER,
+            grade TEXT,
+            class_name TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_students_class ON students (grade, class_name);
+        CREATE INDEX IF NOT EXISTS idx_students_name ON students (name);
+        
+        CREATE TABLE IF NOT EXISTS courses (
+            course_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            teacher TEXT,
+            credit REAL
+        );
+        
+        CREATE TABLE IF NOT EXISTS enrollments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT NOT NULL,
+            course_id TEXT NOT NULL,
+            score REAL,
+            roster_position INTEGER,
+            UNIQUE (student_id, course_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_enrollments_course ON enrollments (course_id);
+    """
+    
+    def __init__(self, data_file: str):
+        self.data_file = data_file
+        self._existed = os.path.exists(data_file)
+        # 写入可能由后台写线程执行，调用方保证同一时间只有一个线程访问连接
+        self.conn = sqlite3.connect(data_file, check_same_thread=False)
+        self.conn.executescript(self.SCHEMA)
+        # 旧数据库没有 roster_position 列，补上后旧的行为NULL，仍按 id 排在前面
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(enrollments)")]
+        if 'roster_position' not in columns:
+            with self.conn:
+                self.conn.execute("ALTER TABLE enrollments ADD COLUMN roster_position INTEGER")
+    
+    def exists(self) -> bool:
+        return self._existed
+    
+    def load(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        students = {}
+        for student_id, name, age, grade, class_name in self.conn.execute(
+                "SELECT student_id, name, age, grade, class_name FROM students ORDER BY rowid"):
+            students[student_id] = {
+                'student_id': student_id,
+                'name': name,
+                'age': age,
+                'grade': grade,
+                'class_name': class_name,
+                'courses': [],
+                'scores': {}
+            }
+        
+        courses = {}
+        for course_id, name, teacher, credit in self.conn.execute(
+                "SELECT course_id, name, teacher, credit FROM courses ORDER BY rowid"):
+            courses[course_id] = {
+                'course_id': course_id,
+                'name': name,
+                'teacher': teacher,
+                'credit': credit,
+                'students': []
+            }
+        
+        # 选课关系还原到学生和课程两侧：学生的选课按 id（插入顺序），
+        # 课程的学生名单按 roster_position（全量保存时无法让 id 同时符合两侧的顺序）
+        for student_id, course_id, score in self.conn.execute(
+                "SELECT student_id, course_id, score FROM enrollments ORDER BY id"):
+            if student_id in students:
+                students[student_id]['courses'].append(course_id)
+                if score is not None:
+                    students[student_id]['scores'][course_id] = score
+        for student_id, course_id in self.conn.execute(
+                "SELECT student_id, course_id FROM enrollments ORDER BY roster_position, id"):
+            if course_id in courses:
+                courses[course_id]['students'].append(student_id)
+        
+        total = len(students) + len(courses)
+        for student_id, student_data in students.items():
+            yield 'student', student_id, student_data
+        for course_id, course_data in courses.items():
+            yield 'course', course_id, course_data
+        if progress:
+            progress(total, total)
+    
+    def prepare_save(self, students: Dict, courses: Dict) -> WriteJob:
+        student_rows = [(s.student_id, s.name, s.age, s.grade, s.class_name) for s in students.values()]
+        course_rows = [(c.course_id, c.name, c.teacher, c.credit) for c in courses.values()]
+        positions = {}
+        for course in courses.values():
+            positions.update(((course.course_id, student_id), position)
+                             for position, student_id in enumerate(course.students))
+        enrollment_rows = [(s.student_id, course_id, s.scores.get(course_id), positions.get((course_id, s.student_id)))
+                           for s in students.values() for course_id in s.courses]
+        
+        def write():
+            with self.conn:
+                self.conn.execute("DELETE FROM enrollments")
+                self.conn.execute("DELETE FROM students")
+                self.conn.execute("DELETE FROM courses")
+                self.conn.executemany(
+                    "INSERT INTO students (student_id, name, age, grade, class_name) VALUES (?, ?, ?, ?, ?)",
+                    student_rows
+                )
+                self.conn.executemany(
+                    "INSERT INTO courses (course_id, name, teacher, credit) VALUES (?, ?, ?, ?)",
+                    course_rows
+                )
+                self.conn.executemany(
+                    "INSERT INTO enrollments (student_id, course_id, score, roster_position) VALUES (?, ?, ?, ?)",
+                    enrollment_rows
+                )
+        return write
+    
+    def prepare_changes(self, students: Dict, courses: Dict, student_ids, course_ids) -> WriteJob:
+        # 学生: (ID, 基本信息行或None, [(课程ID, 成绩), ...])
+        student_changes = []
+        for student_id in student_ids:
+            student = students.get(student_id)
+            if student is None:
+                student_changes.append((student_id, None, []))
+            else:
+                student_changes.append((
+                    student_id,
+                    (student.student_id, student.name, student.age, student.grade, student.class_name),
+                    [(course_id, student.scores.get(course_id)) for course_id in student.courses]
+                ))
+        
+        course_changes = []
+        for course_id in course_ids:
+            course = courses.get(course_id)
+            course_changes.append((
+                course_id,
+                None if course is None else (course.course_id, course.name, course.teacher, course.credit)
+            ))
+        
+        def write():
+            with self.conn:
+                for student_id, row, enrollments in student_changes:
+                    if row is None:
+                        self.conn.execute("DELETE FROM students WHERE student_id = ?", (student_id,))
+                        self.conn.execute("DELETE FROM enrollments WHERE student_id = ?", (student_id,))
+                    else:
+                        self._upsert_student(row, enrollments)
+                
+                for course_id, row in course_changes:
+                    if row is None:
+                        self.conn.execute("DELETE FROM courses WHERE course_id = ?", (course_id,))
+                        self.conn.execute("DELETE FROM enrollments WHERE course_id = ?", (course_id,))
+                    else:
+                        self.conn.execute(
+                            "INSERT INTO courses (course_id, name, teacher, credit) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (course_id) DO UPDATE SET "
+                            "name = excluded.name, teacher = excluded.teacher, credit = excluded.credit",
+                            row
+                        )
+        return write
+    
+    def _upsert_student(self, row: Tuple, enrollments):
+        """更新一名学生的基本信息及其选课和成绩行"""
+        student_id = row[0]
+        self.conn.execute(
+            "INSERT INTO students (student_id, name, age, grade, class_name) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (student_id) DO UPDATE SET "
+            "name = excluded.name, age = excluded.age, grade = excluded.grade, class_name = excluded.class_name",
+            row
+        )
+        
+        stored = {
+            course_id: score for course_id, score in self.conn.execute(
+                "SELECT course_id, score FROM enrollments WHERE student_id = ?", (student_id,))
+        }
+        current = dict(enrollments)
+        
+        for course_id in stored:
+            if course_id not in current:
+                self.conn.execute(
+                    "DELETE FROM enrollments WHERE student_id = ? AND course_id = ?",
+                    (student_id, course_id)
+                )
+        
+        for course_id, score in enrollments:
+            if course_id not in stored:
+                # 新选课排在课程名单末尾，与内存中的顺序一致
+                self.conn.execute(
+                    "INSERT INTO enrollments (student_id, course_id, score, roster_position) "
+                    "SELECT ?, ?, ?, COALESCE(MAX(roster_position), -1) + 1 FROM enrollments WHERE course_id = ?",
+                    (student_id, course_id, score, course_id)
+                )
+            elif stored[course_id] != score:
+                self.conn.execute(
+                    "UPDATE enrollments SET score = ? WHERE student_id = ? AND course_id = ?",
+                    (score, student_id, course_id)
+                )
+    
+    def open_lazy(self) -> Optional[Tuple[RecordSource, RecordSource, Iterator[LoadEvent]]]:
+        # 数据库本身按主键和索引查询，修改直接写入数据库，没有额外的修改事件
+        return SQLiteRecordSource(self.data_file, 'student'), SQLiteRecordSource(self.data_file, 'course'), iter(())
+    
+    def close(self):
+        self.conn.close()
+
+
+class SQLiteRecordSource(RecordSource):
+    """通过索引查询从数据库读取单条记录，使用独立的只读连接，不与写入共用"""
+    
+    def __init__(self, data_file: str, record_type: str):
+        self.conn = sqlite3.connect(data_file, check_same_thread=False)
+        self._record_type = record_type
+    
+    def __len__(self) -> int:
+        table = 'students' if self._record_type == 'student' else 'courses'
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    
+    def ids(self) -> Iterable[str]:
+        if self._record_type == 'student':
+            rows = self.conn.execute("SELECT student_id FROM students ORDER BY rowid")
+        else:
+            rows = self.conn.execute("SELECT course_id FROM courses ORDER BY rowid")
+        return [record_id for record_id, in rows]
+    
+    def read(self, record_id: str) -> Dict:
+        if self._record_type == 'student':
+            row = self.conn.execute(
+                "SELECT student_id, name, age, grade, class_name FROM students WHERE student_id = ?",
+                (record_id,)).fetchone()
+            if row is None:
+                raise KeyError(record_id)
+            courses = []
+            scores = {}
+            for course_id, score in self.conn.execute(
+                    "SELECT course_id, score FROM enrollments WHERE student_id = ? ORDER BY id", (record_id,)):
+                courses.append(course_id)
+                if score is not None:
+                    scores[course_id] = score
+            return {
+                'student_id': row[0],
+                'name': row[1],
+                'age': row[2],
+                'grade': row[3],
+                'class_name': row[4],
+                'courses': courses,
+                'scores': scores
+            }
+        
+        row = self.conn.execute(
+            "SELECT course_id, name, teacher, credit FROM courses WHERE course_id = ?", (record_id,)).fetchone()
+        if row is None:
+            raise KeyError(record_id)
+        return {
+            'course_id': row[0],
+            'name': row[1],
+            'teacher': row[2],
+            'credit': row[3],
+            'students': [student_id for student_id, in self.conn.execute(
+                "SELECT student_id FROM enrollments WHERE course_id = ? ORDER BY roster_position, id", (record_id,))]
+        }
+    
+    def close(self):
+        self.conn.close()
+
+
+class ShardedStorage(Storage):
+    """
+    分片存储：数据目录下学生按年级（或年级+班级）分别保存到独立文件，课程保存到courses.json
+    
+    只加载本次会话需要的分片，保存时只重写发生变化的分片
+    """
+    
+    def __init__(self, data_dir: str, by: str = 'class', shards: Optional[List[Tuple[str, ...]]] = None):
+        if by not in ('grade', 'class'):
+            raise ValueError("by 只能是 'grade' 或 'class'")
+        self.data_dir = data_dir
+        self.by = by
+        # 启动时加载的分片，元素为 (年级,) 或 (年级, 班级)；None表示加载全部分片
+        self.shards = None if shards is None else [tuple(key) for key in shards]
+        self.courses_file = os.path.join(data_dir, 'courses.json')
+        # 已加载的分片，以及内存中每个分片包含的学生ID（保持顺序）
+        self._loaded = set()
+        self._members: Dict[Tuple[str, ...], Dict[str, None]] = {}
+        self._shard_of: Dict[str, Tuple[str, ...]] = {}
+        
+        # _shard_files 只列出本方式的分片，需直接检查目录中是否有另一种方式的分片
+        other = 'grade' if by == 'class' else 'class'
+        if os.path.isdir(data_dir) and any(name.startswith(other + '.') and name.endswith('.json')
+                                           for name in os.listdir(data_dir)):
+            raise ValueError(f"数据目录 {data_dir} 不是按 {by} 分片的")
+    
+    def _shard_files(self) -> List[str]:
+        """数据目录下的所有学生分片文件名"""
+        if not os.path.isdir(self.data_dir):
+            return []
+        return sorted(name for name in os.listdir(self.data_dir)
+                      if name.startswith(self.by + '.') and name.endswith('.json'))
+    
+    def shard_key(self, grade: str, class_name: str) -> Tuple[str, ...]:
+        """学生所属分片的键"""
+        return (grade,) if self.by == 'grade' else (grade, class_name)
+    
+    def shard_file(self, key: Tuple[str, ...]) -> str:
+        """分片文件路径，年级和班级名经过百分号编码以便安全地用作文件名"""
+        parts = [quote(part, safe='').replace('.', '%2E') for part in key]
+        return os.path.join(self.data_dir, '.'.join([self.by] + parts + ['json']))
+    
+    def _parse_shard_file(self, name: str) -> Tuple[str, ...]:
+        return tuple(unquote(part) for part in name[len(self.by) + 1:-len('.json')].split('.'))
+    
+    def exists(self) -> bool:
+        return os.path.exists(self.courses_file) or bool(self._shard_files())
+    
+    def load(self, progress: Optional[ProgressCallback] = None) -> Iterator[LoadEvent]:
+        keys = [self._parse_shard_file(name) for name in self._shard_files()]
+        if self.shards is not None:
+            keys = [key for key in keys if key in self.shards]
+        
+        for done, key in enumerate(keys):
+            yield from self._load_shard(key)
+            if progress:
+                progress(done + 1, len(keys) + 1)
+        
+        if os.path.exists(self.courses_file):
+            for _, record in iter_json_records(self.courses_file):
+                yield 'course', record['course_id'], record
+        if progress:
+            progress(len(keys) + 1, len(keys) + 1)
+    
+    def load_partition(self, grade: str, class_name: str) -> Iterator[LoadEvent]:
+        key = self.shard_key(grade, class_name)
+        if key in self._loaded:
+            return iter(())
+        return self._load_shard(key)
+    
+    def _load_shard(self, key: Tuple[str, ...]) -> Iterator[LoadEvent]:
+        """逐条读取一个分片中的学生记录"""
+        self._loaded.add(key)
+        members = self._members.setdefault(key, {})
+        path = self.shard_file(key)
+        if not os.path.exists(path):
+            return
+        for _, record in iter_json_records(path):
+            members[record['student_id']] = None
+            self._shard_of[record['student_id']] = key
+            yield 'student', record['student_id'], record
+    
+    def _encode_shard(self, key: Tuple[str, ...], students: Dict, members: Dict[str, None], superseded) -> bytes:
+        """编码一个分片的全部学生（members）；分片未加载时与磁盘上的内容合并"""
+        records = []
+        if key not in self._loaded and os.path.exists(self.shard_file(key)):
+            records = [record for _, record in iter_json_records(self.shard_file(key))
+                       if record['student_id'] not in superseded]
+        records.extend(students[student_id].to_dict() for student_id in members)
+        return json.dumps({'students': records}, ensure_ascii=False, indent=2).encode('utf-8')
+    
+    def _encode_courses(self, courses: Dict) -> bytes:
+        records = [course.to_dict() for course in courses.values()]
+        return json.dumps({'courses': records}, ensure_ascii=False, indent=2).encode('utf-8')
+    
+    def _prepare_writes(self, shard_data: Dict[Tuple[str, ...], Optional[bytes]],
+                        courses_data: Optional[bytes]) -> WriteJob:
+        """返回写入变化的分片（内容为None表示删除分片文件）和课程文件的任务"""
+        def write():
+            os.makedirs(self.data_dir, exist_ok=True)
+            for key, data in shard_data.items():
+                path = self.shard_file(key)
+                if data is not None:
+                    atomic_write(path, data)
+                elif os.path.exists(path):
+                    os.remove(path)
+            if courses_data is not None:
+                atomic_write(self.courses_file, courses_data)
+        return write
+    
+    def prepare_save(self, students: Dict, courses: Dict) -> WriteJob:
+        # 全量保存只重写已加载的分片，未加载的分片文件保持不变
+        self._members = {key: {} for key in self._loaded}
+        self._shard_of = {}
+        for student in students.values():
+            key = self.shard_key(student.grade, student.class_name)
+            self._members.setdefault(key, {})[student.student_id] = None
+            self._shard_of[student.student_id] = key
+        
+        shard_data = {}
+        for key, members in self._members.items():
+            # 已加载但已没有学生的分片删除其文件
+            shard_data[key] = self._encode_shard(key, students, members, members) if members else None
+        return self._prepare_writes(shard_data, self._encode_courses(courses))
+    
+    def prepare_changes(self, students: Dict, courses: Dict, student_ids, course_ids) -> WriteJob:
+        # 在副本上计算分片成员的变化，全部编码成功后才生效，
+        # 编码失败（如读取未加载的分片出错）时这些学生仍可原样重试
+        members: Dict[Tuple[str, ...], Dict[str, None]] = {}
+        shard_of: Dict[str, Optional[Tuple[str, ...]]] = {}
+        
+        def members_of(key: Tuple[str, ...]) -> Dict[str, None]:
+            if key not in members:
+                members[key] = dict(self._members.get(key, {}))
+            return members[key]
+        
+        for student_id in student_ids:
+            old_key = self._shard_of.get(student_id)
+            if old_key is not None:
+                members_of(old_key).pop(student_id, None)
+            
+            student = students.get(student_id)
+            shard_of[student_id] = None
+            if student is not None:
+                new_key = self.shard_key(student.grade, student.class_name)
+                members_of(new_key)[student_id] = None
+                shard_of[student_id] = new_key
+        
+        shard_data = {}
+        for key, shard_members in members.items():
+            if shard_members or key not in self._loaded:
+                # 未加载的分片中，本次会话之前保存过的学生也已在磁盘上，同样以内存中的为准
+                superseded = set(student_ids).union(self._members.get(key, ()))
+                shard_data[key] = self._encode_shard(key, students, shard_members, superseded)
+            else:
+                # 已加载的分片中已没有学生，删除分片文件
+                shard_data[key] = None
+        courses_data = self._encode_courses(courses) if course_ids else None
+        
+        self._members.update(members)
+        for student_id, key in shard_of.items():
+            if key is None:
+                self._shard_of.pop(student_id, None)
+            else:
+                self._shard_of[student_id] = key
+        return self._prepare_writes(shard_data, courses_data)
+
+def atomic_write(path: str, data: bytes):
+    """先写入同目录下的临时文件并同步到磁盘，再原子替换目标文件，写入中途崩溃也不会损坏原文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # 临时文件默认只有属主可读写，沿用原文件的权限
+        mode = stat.S_IMODE(os.stat(path).st_mode) if os.path.exists(path) else 0o644
+        os.chmod(temp_path, mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    # 同步目录项，确保重命名本身也已落盘（Windows不支持打开目录）
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class BackgroundWriter:
+    """后台写线程：保存请求只做标记，多次未处理的请求合并为一次写入"""
+    
+    def __init__(self, write: Callable[[], None]):
+        self._write = write
+        self._condition = threading.Condition()
+        self._pending = False
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+    
+    def request(self):
+        """请求一次写入，立即返回"""
+        with self._condition:
+            self._pending = True
+            self._condition.notify_all()
+    
+    def flush(self):
+        """等待所有已请求的写入完成"""
+        with self._condition:
+            while self._pending or self._busy:
+                self._condition.wait()
+    
+    def close(self):
+        """完成剩余写入并结束写线程"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                self._pending = False
+                self._busy = True
+            
+            try:
+                self._write()
+            except Exception as e:
+                # 写线程不能因一次失败而退出，否则之后的修改都不会再写入
+                print(f"数据保存失败: {e}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+
+def iter_json_records(data_file: str, progress: Optional[ProgressCallback] = None,
+                      chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Dict]]:
+    """
+    增量解析 {"students": [...], "courses": [...]} 格式的数据文件，
+    逐条产生 (数组名, 记录)，内存中只保留当前读取块和一条记录
+    """
+    for section, record, _, _ in _scan_json_records(data_file, progress, chunk_size):
+        yield section, record
+
+
+def iter_json_spans(data_file: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[str, Dict, int, int]]:
+    """同 iter_json_records，额外给出每条记录在文件中的字节偏移量和字节长度"""
+    return _scan_json_records(data_file, None, chunk_size, offsets=True)
+
+
+def _scan_json_records(data_file: str, progress: Optional[ProgressCallback], chunk_size: int,
+                       offsets: bool = False) -> Iterator[Tuple[str, Dict, Optional[int], Optional[int]]]:
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    total = os.path.getsize(data_file)
+    # 压缩的文件边读边解压，进度按已读取的压缩数据计算
+    f, raw = open_snapshot_file(data_file)
+    
+    with f, raw:
+        buf = ''
+        pos = 0
+        eof = False
+        read_bytes = 0
+        # 已换算成字节偏移量的位置：buf[mark_pos] 位于文件的第 mark_bytes 字节
+        mark_pos = 0
+        mark_bytes = 0
+        value_start = 0
+        
+        def byte_offset(position: int) -> int:
+            """缓冲区位置对应的文件字节偏移量，位置必须单调不减"""
+            nonlocal mark_pos, mark_bytes
+            mark_bytes += len(buf[mark_pos:position].encode('utf-8'))
+            mark_pos = position
+            return mark_bytes
+        
+        def fill():
+            """读入下一块数据，返回是否读到了新内容"""
+            nonlocal buf, pos, eof, read_bytes, mark_pos
+            if eof:
+                return False
+            chunk = f.read(chunk_size)
+            read_bytes = raw.tell()
+            if not chunk:
+                eof = True
+            if offsets:
+                byte_offset(pos)
+                mark_pos = 0
+            # 丢弃已解析的部分，缓冲区只保留未处理的内容
+            buf = buf[pos:] + text_decoder.decode(chunk, final=eof)
+            pos = 0
+            if progress:
+                progress(read_bytes, total)
+            return True
+        
+        def peek() -> str:
+            """跳过空白并返回下一个字符，文件结束时返回空串"""
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not fill():
+                    return ''
+        
+        def expect(chars: str) -> str:
+            nonlocal pos
+            ch = peek()
+            if not ch or ch not in chars:
+                raise ValueError(f"数据文件格式错误: 期望 {chars!r}, 实际为 {ch!r}")
+            pos += 1
+            return ch
+        
+        def value():
+            """解析一个完整的JSON值，数据不足时继续读入"""
+            nonlocal pos, value_start
+            peek()
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if not fill():
+                        raise
+                    continue
+                # 数字等值可能恰好被块边界截断，需要读到更多内容才能确认结束
+                if end == len(buf) and not eof:
+                    fill()
+                    continue
+                value_start = pos
+                pos = end
+                return obj
+        
+        expect('{')
+        if peek() == '}':
+            return
+        while True:
+            key = value()
+            expect(':')
+            if key in ('students', 'courses') and peek() == '[':
+                pos += 1
+                if peek() == ']':
+                    pos += 1
+                else:
+                    while True:
+                        record = value()
+                        if offsets:
+                            start = byte_offset(value_start)
+                            yield key, record, start, byte_offset(pos) - start
+                        else:
+                            yield key, record, None, None
+                        if expect(',]') == ']':
+                            break
+            else:
+                value()
+            if expect(',}') == '}':
+                break
+
+
+def open_storage(data_file: str, journal: bool = True, compression_level: Optional[int] = None) -> Storage:
+    """根据文件扩展名选择存储后端，快照文件可再带一层压缩扩展名，如 students_data.json.gz"""
+    base = data_file[:-len(os.path.splitext(data_file)[1])] if compression_from_extension(data_file) else data_file
+    extension = os.path.splitext(base)[1].lower()
+    if extension in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteStorage(data_file)
+    if extension == '.sms':
+        return BinaryStorage(data_file, journal=journal, compression_level=compression_level)
+    if extension == '.shards':
+        return ShardedStorage(data_file)
+    return JSONStorage(data_file, journal=journal, compression_level=compression_level)
+
+
+def load_records(data_file: str) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """读取数据文件中的全部学生和课程记录（字典形式）"""
+    students: Dict[str, Dict] = {}
+    courses: Dict[str, Dict] = {}
+    for record_type, record_id, data in open_storage(data_file).load():
+        records = students if record_type == 'student' else courses
+        if data is None:
+            records.pop(record_id, None)
+        else:
+            records[record_id] = data
+    return students, courses
+
+
+def convert_data_file(source: str, target: str):
+    """在JSON数据文件和二进制快照之间转换，格式和压缩方式由扩展名决定"""
+    students, courses = load_records(source)
+    storage = open_storage(target)
+    if not isinstance(storage, FileStorage):
+        raise ValueError(f"不支持转换到该格式: {target}")
+    storage.write_snapshot(students.values(), courses.values())
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("用法: python storage.py <源文件> <目标文件>")
+        print("例如: python storage.py students_data.json students_data.sms")
+        sys.exit(1)
+    convert_data_file(sys.argv[1], sys.argv[2])
+    print(f"已将 {sys.argv[1]} 转换为 {sys.argv[2]}")
@@ -21,8 +21,9 @@ class StudentManagementGUI:
         self.root.title("学生管理系统")
         self.root.geometry("1000x700")
         
-        # 初始化系统
-        self.system = StudentManagementSystem()
+        # 初始化系统，保存操作由后台写线程执行，避免界面卡顿
+        self.system = StudentManagementSystem(background=True)
+        self.root.protocol("WM_DELETE_WINDOW", self.quit)
         
         # 创建界面
         self.create_widgets()
@@ -61,7 +62,7 @@ class StudentManagementGUI:
         file_menu.add_command(label="保存数据", command=self.save_data)
         file_menu.add_command(label="重新加载", command=self.refresh_all_data)
         file_menu.add_separator()
-        file_menu.add_command(label="退出", command=self.root.quit)
+        file_menu.add_command(label="退出", command=self.quit)
         
         # 帮助菜单
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -87,9 +88,11 @@ class StudentManagementGUI:
         
         ttk.Label(search_frame, text="搜索:").pack(side=tk.LEFT, padx=5)
         self.student_search_var = tk.StringVar()
-        search_entry = ttk.Entry(search_frame, textvariable=self.student_search_var)
-        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
-        search_entry.bind('<KeyRelease>', self.search_students)
+        # 输入时下拉列表给出姓名或学号以输入内容开头的学生
+        self.student_search_entry = ttk.Combobox(search_frame, textvariable=self.student_search_var)
+        self.student_search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.student_search_entry.bind('<KeyRelease>', self.search_students)
+        self.student_search_entry.bind('<<ComboboxSelected>>', self.select_student_completion)
         
         # 学生列表
         self.student_tree = ttk.Treeview(left_frame, columns=('ID', 'Name', 'Age', 'Grade', 'Class'), 
@@ -353,19 +356,23 @@ class StudentManagementGUI:
     
     def refresh_all_data(self):
         """刷新所有数据"""
-        self.refresh_student_list()
-        self.refresh_course_list()
-        self.refresh_enrollment_data()
-        self.refresh_score_data()
+        # 学生和课程只获取一次，各页共用同一份只读视图
+        students = self.system.get_all_students()
+        courses = self.system.get_all_courses()
+        self.refresh_student_list(students)
+        self.refresh_course_list(courses)
+        self.refresh_enrollment_data(students, courses)
+        self.refresh_score_data(students)
     
-    def refresh_student_list(self):
+    def refresh_student_list(self, students=None):
         """刷新学生列表"""
         # 清空现有数据
         for item in self.student_tree.get_children():
             self.student_tree.delete(item)
         
         # 加载学生数据
-        students = self.system.get_all_students()
+        if students is None:
+            students = self.system.get_all_students()
         for student in students:
             self.student_tree.insert('', 'end', values=(
                 student['student_id'],
@@ -375,14 +382,15 @@ class StudentManagementGUI:
                 student['class_name']
             ))
     
-    def refresh_course_list(self):
+    def refresh_course_list(self, courses=None):
         """刷新课程列表"""
         # 清空现有数据
         for item in self.course_tree.get_children():
             self.course_tree.delete(item)
         
         # 加载课程数据
-        courses = self.system.get_all_courses()
+        if courses is None:
+            courses = self.system.get_all_courses()
         for course in courses:
             self.course_tree.insert('', 'end', values=(
                 course['course_id'],
@@ -391,14 +399,15 @@ class StudentManagementGUI:
                 course['credit']
             ))
     
-    def refresh_enrollment_data(self):
+    def refresh_enrollment_data(self, students=None, courses=None):
         """刷新选课数据"""
         # 清空学生列表
         for item in self.enrollment_student_tree.get_children():
             self.enrollment_student_tree.delete(item)
         
         # 加载学生
-        students = self.system.get_all_students()
+        if students is None:
+            students = self.system.get_all_students()
         for student in students:
             self.enrollment_student_tree.insert('', 'end', values=(
                 student['student_id'],
@@ -412,7 +421,8 @@ class StudentManagementGUI:
             self.available_course_tree.delete(item)
         
         # 加载课程
-        courses = self.system.get_all_courses()
+        if courses is None:
+            courses = self.system.get_all_courses()
         for course in courses:
             self.available_course_tree.insert('', 'end', values=(
                 course['course_id'],
@@ -421,14 +431,15 @@ class StudentManagementGUI:
                 course['credit']
             ))
     
-    def refresh_score_data(self):
+    def refresh_score_data(self, students=None):
         """刷新成绩数据"""
         # 清空学生列表
         for item in self.score_student_tree.get_children():
             self.score_student_tree.delete(item)
         
         # 加载学生
-        students = self.system.get_all_students()
+        if students is None:
+            students = self.system.get_all_students()
         for student in students:
             self.score_student_tree.insert('', 'end', values=(
                 student['student_id'],
@@ -456,6 +467,17 @@ class StudentManagementGUI:
                 student['grade'],
                 student['class_name']
             ))
+        
+        completions = self.system.complete_students(keyword) if keyword else []
+        self.student_search_entry['values'] = [
+            f"{student['student_id']} {student['name']}" for student in completions
+        ]
+    
+    def select_student_completion(self, event=None):
+        """选中补全项后按学号搜索"""
+        student_id = self.student_search_var.get().split(' ', 1)[0]
+        self.student_search_var.set(student_id)
+        self.search_students()
     
     def search_courses(self, event=None):
         """搜索课程"""
@@ -988,6 +1010,11 @@ class StudentManagementGUI:
         self.system.save_data()
         messagebox.showinfo("成功", "数据保存成功")
     
+    def quit(self):
+        """等待未完成的保存后退出"""
+        self.system.close()
+        self.root.quit()
+    
     def show_about(self):
         """显示关于信息"""
         messagebox.showinfo("关于", "学生管理系统\n版本: 1.0\n作者: AI Assistant")
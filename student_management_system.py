@@ -6,23 +6,41 @@ Student Management System
 一个功能完整的学生信息管理系统
 """
 
-import json
-import os
-import datetime
-from typing import Dict, List, Optional, Any
-import uuid
+import copy
+import functools
+import heapq
+import sys
+import threading
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+from itertools import islice
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
+
+from columnar import ColumnarStudentStore
+from ids import IdGenerator
+from indexes import AggregateIndex, ClassIndex, DetailCache, NGramIndex, PrefixIndex, RecordIndex, ScoreIndex
+from storage import BackgroundWriter, LazyRecordMap, ProgressCallback, Storage, open_storage
+
+
+def _intern(value):
+    """驻留字符串，使重复出现的年级、班级、教师和ID共用同一个对象"""
+    return sys.intern(value) if type(value) is str else value
 
 
 class Student:
     """学生类"""
     
+    # 固定字段，实例不带__dict__
+    __slots__ = ('student_id', 'name', 'age', 'grade', 'class_name', 'courses', 'scores')
+    
     def __init__(self, student_id: str, name: str, age: int, grade: str, class_name: str):
-        self.student_id = student_id
+        self.student_id = _intern(student_id)
         self.name = name
         self.age = age
-        self.grade = grade
-        self.class_name = class_name
-        self.courses = []  # 选修的课程列表
+        self.grade = _intern(grade)
+        self.class_name = _intern(class_name)
+        self.courses: Dict[str, None] = {}  # 选修的课程（以字典作有序集合，保持选课顺序）
         self.scores = {}   # 课程成绩字典
         
     def to_dict(self) -> Dict:
@@ -33,7 +51,7 @@ class Student:
             'age': self.age,
             'grade': self.grade,
             'class_name': self.class_name,
-            'courses': self.courses,
+            'courses': list(self.courses),
             'scores': self.scores
         }
     
@@ -47,20 +65,22 @@ class Student:
             data['grade'],
             data['class_name']
         )
-        student.courses = data.get('courses', [])
-        student.scores = data.get('scores', {})
+        student.courses = dict.fromkeys(map(_intern, data.get('courses', [])))
+        student.scores = {_intern(course_id): score for course_id, score in data.get('scores', {}).items()}
         return student
 
 
 class Course:
     """课程类"""
     
+    __slots__ = ('course_id', 'name', 'teacher', 'credit', 'students')
+    
     def __init__(self, course_id: str, name: str, teacher: str, credit: float):
-        self.course_id = course_id
+        self.course_id = _intern(course_id)
         self.name = name
-        self.teacher = teacher
+        self.teacher = _intern(teacher)
         self.credit = credit
-        self.students = []  # 选课学生列表
+        self.students: Dict[str, None] = {}  # 选课学生（以字典作有序集合，保持选课顺序）
         
     def to_dict(self) -> Dict:
         """将课程对象转换为字典"""
@@ -69,7 +89,7 @@ class Course:
             'name': self.name,
             'teacher': self.teacher,
             'credit': self.credit,
-            'students': self.students
+            'students': list(self.students)
         }
     
     @classmethod
@@ -81,170 +101,716 @@ class Course:
             data['teacher'],
             data['credit']
         )
-        course.students = data.get('students', [])
+        course.students = dict.fromkeys(map(_intern, data.get('students', [])))
         return course
 
 
+class IdList(Sequence):
+    """有序集合（选课、选课学生）的只读序列视图，可与列表比较"""
+    
+    __slots__ = ('_ids',)
+    
+    def __init__(self, ids):
+        self._ids = ids
+    
+    def __getitem__(self, index):
+        if isinstance(index, int) and index >= 0:
+            # 非负下标只需迭代到该位置，不必复制整个集合
+            try:
+                return next(islice(self._ids, index, None))
+            except StopIteration:
+                raise IndexError("索引超出范围") from None
+        return list(self._ids)[index]
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+    
+    def __reversed__(self) -> Iterator[str]:
+        return reversed(list(self._ids))
+    
+    def index(self, record_id, start: int = 0, stop: Optional[int] = None) -> int:
+        # Sequence 默认的实现逐个按下标取值，这里改为一次迭代
+        for position, value in islice(enumerate(self._ids), start, stop):
+            if value == record_id:
+                return position
+        raise ValueError(f"{record_id} 不在列表中")
+    
+    def __contains__(self, record_id) -> bool:
+        return record_id in self._ids
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, IdList)):
+            return list(self._ids) == list(other)
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return repr(list(self._ids))
+
+
+class RecordView(Mapping):
+    """
+    学生或课程的只读视图：字段与 to_dict() 相同，但直接读取记录的当前值而不复制；
+    记录被删除（或按需加载时被淘汰后又修改）后视图不再反映最新数据，需要独立副本时调用 snapshot()
+    """
+    
+    __slots__ = ('_record', '_fields')
+    
+    STUDENT_FIELDS = ('student_id', 'name', 'age', 'grade', 'class_name', 'courses', 'scores')
+    COURSE_FIELDS = ('course_id', 'name', 'teacher', 'credit', 'students')
+    
+    def __init__(self, record, fields: Tuple[str, ...]):
+        self._record = record
+        self._fields = fields
+    
+    @classmethod
+    def of_student(cls, student) -> 'RecordView':
+        return cls(student, cls.STUDENT_FIELDS)
+    
+    @classmethod
+    def of_course(cls, course) -> 'RecordView':
+        return cls(course, cls.COURSE_FIELDS)
+    
+    def __getitem__(self, field: str):
+        if field not in self._fields:
+            raise KeyError(field)
+        value = getattr(self._record, field)
+        if field in ('courses', 'students'):
+            return IdList(value)
+        if field == 'scores':
+            return MappingProxyType(value)
+        return value
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+    
+    def __len__(self) -> int:
+        return len(self._fields)
+    
+    def __repr__(self) -> str:
+        return f"RecordView({dict(self)!r})"
+    
+    def snapshot(self) -> Dict:
+        """与记录脱离的独立副本；字段值均为不可变类型，只需复制其中的列表和字典"""
+        return {key: value.copy() if isinstance(value, (list, dict)) else value
+                for key, value in self._record.to_dict().items()}
+
+
+class StudentQuery:
+    """
+    学生查询：条件、排序和分页可链式组合，每一步返回新的查询对象
+    
+    有选课或年级/班级条件时只从对应的选课名单或索引中取候选学生；
+    未排序时结果按候选顺序逐条产生，排序且有limit时只保留前limit条
+    """
+    
+    FIELDS = ('student_id', 'name', 'age', 'grade', 'class_name', 'score')
+    
+    def __init__(self, system: 'StudentManagementSystem'):
+        self._system = system
+        self._grade: Optional[str] = None
+        self._class_name: Optional[str] = None
+        self._min_age: Optional[int] = None
+        self._max_age: Optional[int] = None
+        # 选课条件：(课程ID, 最低成绩, 最高成绩)，成绩为None表示不限
+        self._courses: List[Tuple[str, Optional[float], Optional[float]]] = []
+        # 排序：(字段, 按成绩排序时的课程ID, 是否降序)
+        self._order: Optional[Tuple[str, Optional[str], bool]] = None
+        self._offset = 0
+        self._limit: Optional[int] = None
+        self._cursor: Optional[Tuple] = None
+    
+    def _copy(self) -> 'StudentQuery':
+        query = copy.copy(self)
+        query._courses = list(self._courses)
+        return query
+    
+    def filter(self, grade: Optional[str] = None, class_name: Optional[str] = None,
+               min_age: Optional[int] = None, max_age: Optional[int] = None,
+               course_id: Optional[str] = None, min_score: Optional[float] = None,
+               max_score: Optional[float] = None) -> 'StudentQuery':
+        """添加筛选条件，多次调用的条件同时成立；成绩条件针对course_id指定的课程"""
+        if (min_score is not None or max_score is not None) and course_id is None:
+            raise ValueError("按成绩筛选时必须指定课程")
+        query = self._copy()
+        if grade is not None:
+            query._grade = grade
+        if class_name is not None:
+            query._class_name = class_name
+        if min_age is not None:
+            query._min_age = min_age
+        if max_age is not None:
+            query._max_age = max_age
+        if course_id is not None:
+            query._courses.append((course_id, min_score, max_score))
+        return query
+    
+    def order_by(self, field: str, descending: bool = False, course_id: Optional[str] = None) -> 'StudentQuery':
+        """按字段排序；按 'score' 排序时需指定课程，没有成绩的学生排在最后"""
+        if field not in self.FIELDS:
+            raise ValueError(f"不支持按 {field} 排序")
+        if field == 'score' and course_id is None:
+            raise ValueError("按成绩排序时必须指定课程")
+        query = self._copy()
+        query._order = (field, course_id, descending)
+        return query
+    
+    def offset(self, offset: int) -> 'StudentQuery':
+        query = self._copy()
+        query._offset = offset
+        return query
+    
+    def limit(self, limit: Optional[int]) -> 'StudentQuery':
+        query = self._copy()
+        query._limit = limit
+        return query
+    
+    def after(self, cursor: Optional[Tuple]) -> 'StudentQuery':
+        """从上一页返回的游标之后继续查询（按排序字段，未指定排序时按候选顺序中的位置）"""
+        query = self._copy()
+        query._cursor = None if cursor is None else tuple(cursor)
+        return query
+    
+    def _candidates(self) -> List[str]:
+        """利用选课名单或年级/班级索引缩小候选范围"""
+        system = self._system
+        if self._courses:
+            courses = [system.courses.get(course_id) for course_id, _, _ in self._courses]
+            if any(course is None for course in courses):
+                return []
+            return list(min(courses, key=lambda course: len(course.students)).students)
+        if self._grade is not None and self._class_name is not None:
+            system.load_partition(self._grade, self._class_name)
+            return system._index('class', ClassIndex).class_members(self._grade, self._class_name)
+        if self._grade is not None:
+            return system._index('class', ClassIndex).grade_members(self._grade)
+        return list(system.students)
+    
+    @staticmethod
+    def _resume(candidates: List[str], student_id: str, position: int) -> int:
+        """未排序查询的游标 (学号, 位置) 之后的第一个候选位置；该学生已被删除时从原位置继续"""
+        if position < len(candidates) and candidates[position] == student_id:
+            return position + 1
+        try:
+            return candidates.index(student_id) + 1
+        except ValueError:
+            return min(position, len(candidates))
+    
+    def _matches(self, after: Optional[Tuple] = None) -> Iterator[Tuple[int, Student]]:
+        """满足条件的学生及其在候选列表中的位置，只读取实际检查到的学生"""
+        candidates = self._candidates()
+        start = 0 if after is None else self._resume(candidates, *after)
+        for position in range(start, len(candidates)):
+            student = self._system.students.get(candidates[position])
+            if student is None:
+                continue
+            if self._grade is not None and student.grade != self._grade:
+                continue
+            if self._class_name is not None and student.class_name != self._class_name:
+                continue
+            if self._min_age is not None and student.age < self._min_age:
+                continue
+            if self._max_age is not None and student.age > self._max_age:
+                continue
+            if all(self._course_matches(student, *condition) for condition in self._courses):
+                yield position, student
+    
+    @staticmethod
+    def _course_matches(student: Student, course_id: str, min_score: Optional[float],
+                        max_score: Optional[float]) -> bool:
+        if course_id not in student.courses:
+            return False
+        if min_score is None and max_score is None:
+            return True
+        score = student.scores.get(course_id)
+        if score is None:
+            return False
+        return (min_score is None or score >= min_score) and (max_score is None or score <= max_score)
+    
+    def _sort_key(self, student: Student) -> Tuple:
+        """排序键 (是否排在最后, 字段值, 学号)，学号保证顺序唯一，可作为分页游标"""
+        field, course_id, descending = self._order or ('student_id', None, False)
+        value = student.scores.get(course_id) if field == 'score' else getattr(student, field)
+        # 降序时按键从大到小取，缺失值的标记取反后同样排在最后
+        return ((value is not None) if descending else (value is None), value, student.student_id)
+    
+    def __iter__(self) -> Iterator[RecordView]:
+        for student in self._students():
+            yield RecordView.of_student(student)
+    
+    def _students(self) -> Iterator[Student]:
+        stop = None if self._limit is None else self._offset + self._limit
+        if self._order is None:
+            return islice((student for _, student in self._matches(self._cursor)), self._offset, stop)
+        
+        descending = self._order[2]
+        keyed = ((self._sort_key(student), student) for _, student in self._matches())
+        if self._cursor is not None:
+            cursor = self._cursor
+            keyed = (item for item in keyed if (item[0] < cursor if descending else item[0] > cursor))
+        if stop is None:
+            ordered = sorted(keyed, key=lambda item: item[0], reverse=descending)
+        elif descending:
+            ordered = heapq.nlargest(stop, keyed, key=lambda item: item[0])
+        else:
+            ordered = heapq.nsmallest(stop, keyed, key=lambda item: item[0])
+        return (student for _, student in ordered[self._offset:])
+    
+    def count(self) -> int:
+        """满足条件的学生数（不考虑分页）"""
+        return sum(1 for _ in self._matches())
+    
+    def page(self, size: int, cursor: Optional[Tuple] = None) -> Tuple[List[RecordView], Optional[Tuple]]:
+        """返回一页结果和下一页的游标，没有更多结果时游标为None"""
+        if self._order is None:
+            # 未排序时按候选顺序分页，游标为 (最后一名学生的学号, 其在候选列表中的位置)，
+            # 只读取本页及被条件排除的学生，不必像排序那样检查全部学生
+            matches = list(islice(self._matches(None if cursor is None else tuple(cursor)), size))
+            next_cursor = (matches[-1][1].student_id, matches[-1][0]) if len(matches) == size else None
+            return [RecordView.of_student(student) for _, student in matches], next_cursor
+        
+        students = list(self.after(cursor).offset(0).limit(size)._students())
+        next_cursor = self._sort_key(students[-1]) if len(students) == size else None
+        return [RecordView.of_student(student) for student in students], next_cursor
+
+
+def _mutation(method):
+    """修改数据的方法：执行期间持有数据锁，结束后持久化涉及的记录"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                self._reindex()
+            self._commit()
+            return result
+    return wrapper
+
+
 class StudentManagementSystem:
     """学生管理系统主类"""
     
-    def __init__(self, data_file: str = "students_data.json"):
+    def __init__(self, data_file: str = "students_data.json", journal: bool = True,
+                 storage: Optional[Storage] = None, progress: Optional[ProgressCallback] = None,
+                 background: bool = False, lazy: bool = False, cache_size: int = 10000,
+                 detail_cache_size: int = 1024, columnar: bool = False,
+                 id_generator: Callable[[str], IdGenerator] = IdGenerator):
+        if lazy and columnar:
+            raise ValueError("按需加载与列式存储不能同时使用")
         self.data_file = data_file
-        self.students: Dict[str, Student] = {}
+        # 存储后端：默认根据文件扩展名选择JSON文件或SQLite数据库；
+        # journal为True时文件存储只追加修改过的记录，为False时每次修改都重写整个文件
+        self.storage = storage or open_storage(data_file, journal=journal)
+        # 加载进度回调
+        self.progress = progress
+        # 按需加载：记录在首次访问时才解码，最多缓存cache_size条未修改的记录
+        self.lazy = lazy
+        self.cache_size = cache_size
+        # 学生/课程详细信息最多缓存的条数，为0时不缓存
+        self.detail_cache_size = detail_cache_size
+        # 列式存储：学生字段按列保存在数组中，适合在一个进程中保存数百万名学生
+        self.columnar = columnar
+        self.students: Dict[str, Student] = self._new_student_map()
+        # ID生成器：以前缀（'S'/'C'）创建，提供 next_id()、reserve(count) 和 skip_existing(ids)
+        self._student_ids = id_generator('S')
+        self._course_ids = id_generator('C')
         self.courses: Dict[str, Course] = {}
+        # 数据锁保护内存中的记录；写入锁保证写入按准备的顺序逐个执行。
+        # 总是先持有数据锁再获取写入锁，执行写入时只持有写入锁
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        # 本次修改涉及的学生/课程ID（用字典保持首次修改的顺序，新记录按添加顺序写入）
+        self._dirty_students: Dict[str, None] = {}
+        self._dirty_courses: Dict[str, None] = {}
+        # 已提交但尚未写入存储后端的学生/课程ID
+        self._pending_students: Dict[str, None] = {}
+        self._pending_courses: Dict[str, None] = {}
+        # 批量操作：嵌套层数及修改前的记录副本（用于回滚）
+        self._batch_depth = 0
+        self._undo_students: Dict[str, Optional[Student]] = {}
+        self._undo_courses: Dict[str, Optional[Course]] = {}
+        # 已建立的二级索引（首次使用时建立），以及修改后尚未同步到索引的记录ID
+        self._indexes: Dict[str, RecordIndex] = {}
+        self._unindexed_students: Dict[str, None] = {}
+        self._unindexed_courses: Dict[str, None] = {}
         self.load_data()
+        # 后台写线程：修改操作只提交保存请求，不在调用线程中写文件
+        self._writer = BackgroundWriter(self._write_pending) if background else None
     
     def load_data(self):
-        """从文件加载数据"""
-        if os.path.exists(self.data_file):
+        """从存储后端加载数据"""
+        if self.storage.exists():
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                # 加载学生数据
-                for student_data in data.get('students', []):
-                    student = Student.from_dict(student_data)
-                    self.students[student.student_id] = student
-                    
-                # 加载课程数据
-                for course_data in data.get('courses', []):
-                    course = Course.from_dict(course_data)
-                    self.courses[course.course_id] = course
-                    
+                sources = self.storage.open_lazy() if self.lazy else None
+                if sources:
+                    student_source, course_source, events = sources
+                    self.students = LazyRecordMap(student_source, Student.from_dict, self.cache_size)
+                    self.courses = LazyRecordMap(course_source, Course.from_dict, self.cache_size)
+                    self._apply_events(events)
+                else:
+                    # 逐条解析并创建对象，不必先把整个文件读入内存
+                    self._apply_events(self.storage.load(self.progress))
+                # 新生成的ID接续已有记录的ID
+                self._student_ids.skip_existing(self.students)
+                self._course_ids.skip_existing(self.courses)
                 print("数据加载成功！")
             except Exception as e:
                 print(f"数据加载失败: {e}")
-                self.students = {}
+                self.students = self._new_student_map()
                 self.courses = {}
     
+    def _new_student_map(self) -> Dict[str, Student]:
+        """空的学生映射：普通字典或列式存储"""
+        return ColumnarStudentStore(Student.from_dict) if self.columnar else {}
+    
+    def load_partition(self, grade: str, class_name: str):
+        """按需加载指定班级所在的数据分片（仅分片存储需要），内存中已有的记录保持不变"""
+        with self._lock:
+            self._apply_events(self.storage.load_partition(grade, class_name), overwrite=False)
+    
+    def _apply_events(self, events, overwrite: bool = True):
+        """按顺序应用存储后端产生的加载事件"""
+        for record_type, record_id, data in events:
+            records = self.students if record_type == 'student' else self.courses
+            if data is None:
+                records.pop(record_id, None)
+            elif overwrite or record_id not in records:
+                cls = Student if record_type == 'student' else Course
+                records[record_id] = cls.from_dict(data)
+            else:
+                continue
+            if self._indexes:
+                unindexed = self._unindexed_students if record_type == 'student' else self._unindexed_courses
+                unindexed[record_id] = None
+        self._reindex()
+    
     def save_data(self):
-        """保存数据到文件"""
+        """保存全部数据到存储后端"""
+        with self._lock:
+            # 全量保存已包含所有尚未写入的修改
+            student_ids, self._pending_students = self._pending_students, {}
+            course_ids, self._pending_courses = self._pending_courses, {}
+            try:
+                write = self.storage.prepare_save(self.students, self.courses)
+            except Exception as e:
+                print(f"数据保存失败: {e}")
+                self._requeue(student_ids, course_ids)
+                return
+            self._write_lock.acquire()
+        
         try:
-            data = {
-                'students': [student.to_dict() for student in self.students.values()],
-                'courses': [course.to_dict() for course in self.courses.values()]
-            }
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
+            write()
             print("数据保存成功！")
         except Exception as e:
             print(f"数据保存失败: {e}")
+            self._requeue(student_ids, course_ids)
+        finally:
+            self._write_lock.release()
+    
+    def checkpoint(self):
+        """将修改日志合并到数据文件快照中"""
+        self.save_data()
+    
+    def flush(self):
+        """等待后台写线程完成所有已提交的修改"""
+        if self._writer:
+            self._writer.flush()
+    
+    def close(self):
+        """写完剩余修改并关闭存储后端"""
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        for records in (self.students, self.courses):
+            if isinstance(records, LazyRecordMap):
+                records.close()
+        self.storage.close()
+    
+    @contextmanager
+    def batch(self):
+        """批量操作：期间的修改只在内存中进行，退出时统一保存一次，出现异常则回滚"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._rollback()
+                raise
+            
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._undo_students = {}
+                self._undo_courses = {}
+                self._commit()
+    
+    def _rollback(self):
+        """撤销批量操作中的所有修改"""
+        for student_id, student in self._undo_students.items():
+            if student is None:
+                self.students.pop(student_id, None)
+            else:
+                self.students[student_id] = student
+        for course_id, course in self._undo_courses.items():
+            if course is None:
+                self.courses.pop(course_id, None)
+            else:
+                self.courses[course_id] = course
+        
+        if self._indexes:
+            self._unindexed_students.update(dict.fromkeys(self._undo_students))
+            self._unindexed_courses.update(dict.fromkeys(self._undo_courses))
+            self._reindex()
+        self._undo_students = {}
+        self._undo_courses = {}
+        self._dirty_students = {}
+        self._dirty_courses = {}
+    
+    def _touch(self, students=(), courses=()):
+        """记录即将被修改的学生和课程"""
+        if self._batch_depth:
+            # 保存首次修改前的副本，以便回滚
+            for student_id in students:
+                if student_id not in self._undo_students:
+                    self._undo_students[student_id] = copy.deepcopy(self.students.get(student_id))
+            for course_id in courses:
+                if course_id not in self._undo_courses:
+                    self._undo_courses[course_id] = copy.deepcopy(self.courses.get(course_id))
+        
+        # 按需加载时，修改过的记录不能被缓存淘汰；记录可能已被淘汰而重新解码，
+        # 调用方须在此之后再取记录的引用，修改的才是被固定的对象
+        for records, record_ids in ((self.students, students), (self.courses, courses)):
+            if isinstance(records, LazyRecordMap):
+                for record_id in record_ids:
+                    records.pin(record_id)
+        
+        self._dirty_students.update(dict.fromkeys(students))
+        self._dirty_courses.update(dict.fromkeys(courses))
+        if self._indexes:
+            self._unindexed_students.update(dict.fromkeys(students))
+            self._unindexed_courses.update(dict.fromkeys(courses))
+    
+    def _reindex(self):
+        """将修改过的记录同步到已建立的二级索引"""
+        student_ids, self._unindexed_students = self._unindexed_students, {}
+        course_ids, self._unindexed_courses = self._unindexed_courses, {}
+        for index in self._indexes.values():
+            for student_id in student_ids:
+                index.update_student(student_id, self.students.get(student_id))
+            for course_id in course_ids:
+                index.update_course(course_id, self.courses.get(course_id))
+    
+    def _index(self, name: str, factory: Callable[[], RecordIndex]) -> RecordIndex:
+        """获取二级索引，首次使用时根据全部记录建立"""
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = factory()
+                index.build(self.students, self.courses)
+                self._indexes[name] = index
+            return index
+    
+    def _commit(self):
+        """提交本次修改，由后台写线程或当前线程写入存储后端"""
+        if self._batch_depth or not (self._dirty_students or self._dirty_courses):
+            return
+        
+        self._pending_students.update(self._dirty_students)
+        self._pending_courses.update(self._dirty_courses)
+        self._dirty_students = {}
+        self._dirty_courses = {}
+        
+        if self._writer:
+            self._writer.request()
+        else:
+            self._write_pending()
+    
+    def _write_pending(self):
+        """将已提交的修改写入存储后端，多次提交的修改合并为一次写入"""
+        with self._lock:
+            student_ids, self._pending_students = self._pending_students, {}
+            course_ids, self._pending_courses = self._pending_courses, {}
+            if not (student_ids or course_ids):
+                return
+            try:
+                write = self.storage.prepare_changes(self.students, self.courses, student_ids, course_ids)
+            except Exception as e:
+                # 准备写入（如读取未加载的分片）也可能失败
+                print(f"数据保存失败: {e}")
+                self._requeue(student_ids, course_ids)
+                return
+            self._write_lock.acquire()
+        
+        try:
+            write()
+        except Exception as e:
+            print(f"数据保存失败: {e}")
+            self._requeue(student_ids, course_ids)
+        finally:
+            self._write_lock.release()
+    
+    def _requeue(self, student_ids, course_ids):
+        """写入失败的记录留待下次重试"""
+        with self._lock:
+            self._pending_students.update(student_ids)
+            self._pending_courses.update(course_ids)
     
     def generate_student_id(self) -> str:
         """生成唯一的学生ID"""
-        return f"S{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:4]}"
+        return self._unused_id(self._student_ids, self.students)
     
     def generate_course_id(self) -> str:
         """生成唯一的课程ID"""
-        return f"C{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:4]}"
+        return self._unused_id(self._course_ids, self.courses)
+    
+    def reserve_student_ids(self, count: int) -> List[str]:
+        """为批量导入预留count个未使用的学生ID，可作为 add_student 的 student_id 参数"""
+        return self._unused_ids(self._student_ids, self.students, count)
+    
+    def reserve_course_ids(self, count: int) -> List[str]:
+        """为批量导入预留count个未使用的课程ID，可作为 add_course 的 course_id 参数"""
+        return self._unused_ids(self._course_ids, self.courses, count)
+    
+    @staticmethod
+    def _unused_id(generator: IdGenerator, records: Dict) -> str:
+        """从生成器取出一个未被记录使用的ID"""
+        while True:
+            record_id = generator.next_id()
+            if record_id not in records:
+                return record_id
+    
+    @staticmethod
+    def _unused_ids(generator: IdGenerator, records: Dict, count: int) -> List[str]:
+        """从生成器取出count个ID，跳过已被记录使用的（例如旧格式或导入的ID）"""
+        ids = []
+        while len(ids) < count:
+            ids.extend(record_id for record_id in generator.reserve(count - len(ids)) if record_id not in records)
+        return ids
     
-    def add_student(self, name: str, age: int, grade: str, class_name: str) -> str:
-        """添加学生"""
-        student_id = self.generate_student_id()
+    @_mutation
+    def add_student(self, name: str, age: int, grade: str, class_name: str,
+                    student_id: Optional[str] = None) -> str:
+        """添加学生；student_id 为None时自动生成，否则使用给定的（如预留的）学号"""
+        if student_id is None:
+            student_id = self.generate_student_id()
+        elif student_id in self.students:
+            raise ValueError(f"学号 {student_id} 已存在")
         student = Student(student_id, name, age, grade, class_name)
+        self._touch(students=[student_id])
         self.students[student_id] = student
-        self.save_data()
         return student_id
     
+    @_mutation
     def remove_student(self, student_id: str) -> bool:
         """删除学生"""
         if student_id in self.students:
-            # 从所有课程中移除该学生
-            for course in self.courses.values():
-                if student_id in course.students:
-                    course.students.remove(student_id)
+            # 只需从该学生所选的课程中移除该学生
+            self._touch(students=[student_id])
+            for course_id in self.students[student_id].courses:
+                course = self.courses.get(course_id)
+                if course is not None and student_id in course.students:
+                    self._touch(courses=[course_id])
+                    del self.courses[course_id].students[student_id]
             
             del self.students[student_id]
-            self.save_data()
             return True
         return False
     
+    @_mutation
     def update_student(self, student_id: str, **kwargs) -> bool:
         """更新学生信息"""
         if student_id in self.students:
+            self._touch(students=[student_id])
             student = self.students[student_id]
             for key, value in kwargs.items():
                 if hasattr(student, key):
-                    setattr(student, key, value)
-            self.save_data()
+                    setattr(student, key, _intern(value))
             return True
         return False
     
-    def add_course(self, name: str, teacher: str, credit: float) -> str:
-        """添加课程"""
-        course_id = self.generate_course_id()
+    @_mutation
+    def add_course(self, name: str, teacher: str, credit: float, course_id: Optional[str] = None) -> str:
+        """添加课程；course_id 为None时自动生成，否则使用给定的（如预留的）课程号"""
+        if course_id is None:
+            course_id = self.generate_course_id()
+        elif course_id in self.courses:
+            raise ValueError(f"课程号 {course_id} 已存在")
         course = Course(course_id, name, teacher, credit)
+        self._touch(courses=[course_id])
         self.courses[course_id] = course
-        self.save_data()
         return course_id
     
+    @_mutation
     def remove_course(self, course_id: str) -> bool:
         """删除课程"""
         if course_id in self.courses:
-            # 从所有学生的课程列表中移除该课程
-            for student in self.students.values():
-                if course_id in student.courses:
-                    student.courses.remove(course_id)
-                if course_id in student.scores:
-                    del student.scores[course_id]
+            # 只需从选了该课程的学生的课程列表和成绩中移除该课程
+            self._touch(courses=[course_id])
+            for student_id in self.courses[course_id].students:
+                if student_id in self.students:
+                    self._touch(students=[student_id])
+                    student = self.students[student_id]
+                    student.courses.pop(course_id, None)
+                    student.scores.pop(course_id, None)
             
             del self.courses[course_id]
-            self.save_data()
             return True
         return False
     
+    @_mutation
     def enroll_student_in_course(self, student_id: str, course_id: str) -> bool:
         """学生选课"""
         if student_id in self.students and course_id in self.courses:
-            student = self.students[student_id]
-            course = self.courses[course_id]
-            
-            if course_id not in student.courses:
-                student.courses.append(course_id)
-                course.students.append(student_id)
-                self.save_data()
+            if course_id not in self.students[student_id].courses:
+                self._touch(students=[student_id], courses=[course_id])
+                self.students[student_id].courses[course_id] = None
+                self.courses[course_id].students[student_id] = None
                 return True
         return False
     
+    @_mutation
     def drop_course(self, student_id: str, course_id: str) -> bool:
         """学生退课"""
         if student_id in self.students and course_id in self.courses:
-            student = self.students[student_id]
-            course = self.courses[course_id]
-            
-            if course_id in student.courses:
-                student.courses.remove(course_id)
+            if course_id in self.students[student_id].courses:
+                self._touch(students=[student_id], courses=[course_id])
+                student = self.students[student_id]
+                del student.courses[course_id]
                 if course_id in student.scores:
                     del student.scores[course_id]
-                
-                if student_id in course.students:
-                    course.students.remove(student_id)
-                
-                self.save_data()
+                self.courses[course_id].students.pop(student_id, None)
                 return True
         return False
     
+    @_mutation
     def add_score(self, student_id: str, course_id: str, score: float) -> bool:
         """添加或更新学生成绩"""
         if student_id in self.students and course_id in self.courses:
-            student = self.students[student_id]
-            if course_id in student.courses:
-                student.scores[course_id] = score
-                self.save_data()
+            if course_id in self.students[student_id].courses:
+                self._touch(students=[student_id])
+                self.students[student_id].scores[course_id] = score
                 return True
         return False
     
     def get_student_info(self, student_id: str) -> Optional[Dict]:
-        """获取学生详细信息"""
-        if student_id in self.students:
+        """获取学生详细信息（结果会被缓存，调用方不应修改）"""
+        with self._lock:
+            cache = self._detail_cache()
+            student_info = cache.get(('student', student_id))
+            if student_info is not None or student_id not in self.students:
+                return student_info
+            
             student = self.students[student_id]
             student_info = student.to_dict()
             
-            # 添加课程详细信息
+            # 添加课程详细信息（选课和成绩取自已转换好的字典，不再逐个访问学生对象）
+            scores = student_info['scores']
             course_details = []
-            for course_id in student.courses:
+            for course_id in student_info['courses']:
                 if course_id in self.courses:
                     course = self.courses[course_id]
                     course_details.append({
@@ -252,59 +818,88 @@ class StudentManagementSystem:
                         'name': course.name,
                         'teacher': course.teacher,
                         'credit': course.credit,
-                        'score': student.scores.get(course_id, None)
+                        'score': scores.get(course_id, None)
                     })
             
             student_info['course_details'] = course_details
+            cache.put(('student', student_id), student_info,
+                      [('student', student_id)] + [('course', course_id) for course_id in student_info['courses']])
             return student_info
-        return None
     
     def get_course_info(self, course_id: str) -> Optional[Dict]:
-        """获取课程详细信息"""
-        if course_id in self.courses:
+        """获取课程详细信息（结果会被缓存，调用方不应修改）"""
+        with self._lock:
+            cache = self._detail_cache()
+            course_info = cache.get(('course', course_id))
+            if course_info is not None or course_id not in self.courses:
+                return course_info
+            
             course = self.courses[course_id]
             course_info = course.to_dict()
             
             # 添加学生详细信息
-            student_details = []
-            for student_id in course.students:
-                if student_id in self.students:
-                    student = self.students[student_id]
-                    student_details.append({
-                        'student_id': student_id,
-                        'name': student.name,
-                        'grade': student.grade,
-                        'class_name': student.class_name,
-                        'score': student.scores.get(course_id, None)
-                    })
+            if isinstance(self.students, ColumnarStudentStore):
+                # 列式存储按课程句柄直接读取各列，不逐个创建学生视图
+                student_details = self.students.course_roster(course_id, course.students)
+            else:
+                student_details = []
+                for student_id in course.students:
+                    if student_id in self.students:
+                        student = self.students[student_id]
+                        student_details.append({
+                            'student_id': student_id,
+                            'name': student.name,
+                            'grade': student.grade,
+                            'class_name': student.class_name,
+                            'score': student.scores.get(course_id, None)
+                        })
             
             course_info['student_details'] = student_details
+            cache.put(('course', course_id), course_info,
+                      [('course', course_id)] + [('student', student_id) for student_id in course.students])
             return course_info
-        return None
     
-    def get_all_students(self) -> List[Dict]:
-        """获取所有学生列表"""
-        return [student.to_dict() for student in self.students.values()]
+    def _detail_cache(self) -> DetailCache:
+        """详细信息缓存，作为索引随记录的修改失效相关的缓存项"""
+        return self._index('details', lambda: DetailCache(self.detail_cache_size))
     
-    def get_all_courses(self) -> List[Dict]:
-        """获取所有课程列表"""
-        return [course.to_dict() for course in self.courses.values()]
+    def detail_cache_info(self) -> Dict:
+        """详细信息缓存的命中次数、未命中次数、缓存项数和容量"""
+        return self._detail_cache().info()
     
-    def search_students(self, keyword: str) -> List[Dict]:
-        """搜索学生"""
-        results = []
+    def query(self) -> StudentQuery:
+        """创建学生查询，例如 system.query().filter(grade="高一").order_by("age").limit(20)"""
+        return StudentQuery(self)
+    
+    def get_all_students(self) -> List[RecordView]:
+        """获取所有学生列表（只读视图，不复制记录）"""
+        return [RecordView.of_student(student) for student in self.students.values()]
+    
+    def get_all_courses(self) -> List[RecordView]:
+        """获取所有课程列表（只读视图，不复制记录）"""
+        return [RecordView.of_course(course) for course in self.courses.values()]
+    
+    def snapshot(self) -> Dict[str, List[Dict]]:
+        """全部学生和课程的独立副本，之后的修改不会影响副本"""
+        with self._lock:
+            return {
+                'students': [RecordView.of_student(student).snapshot() for student in self.students.values()],
+                'courses': [RecordView.of_course(course).snapshot() for course in self.courses.values()]
+            }
+    
+    def search_students(self, keyword: str) -> List[RecordView]:
+        """搜索学生（姓名、学号、年级或班级包含关键字，不区分大小写）"""
         keyword = keyword.lower()
-        
-        for student in self.students.values():
-            if (keyword in student.name.lower() or 
-                keyword in student.student_id.lower() or
-                keyword in student.grade.lower() or
-                keyword in student.class_name.lower()):
-                results.append(student.to_dict())
-        
-        return results
+        # 通过n-gram倒排索引找出匹配的学生，不必逐个比较
+        student_ids = self._index('search', NGramIndex).search(keyword)
+        return [RecordView.of_student(self.students[student_id]) for student_id in student_ids]
     
-    def search_courses(self, keyword: str) -> List[Dict]:
+    def complete_students(self, prefix: str, limit: int = 10) -> List[RecordView]:
+        """按姓名或学号前缀补全学生，返回至多limit名，姓名匹配的在前"""
+        student_ids = self._index('prefix', PrefixIndex).complete(prefix, limit)
+        return [RecordView.of_student(self.students[student_id]) for student_id in student_ids]
+    
+    def search_courses(self, keyword: str) -> List[RecordView]:
         """搜索课程"""
         results = []
         keyword = keyword.lower()
@@ -313,50 +908,125 @@ class StudentManagementSystem:
             if (keyword in course.name.lower() or 
                 keyword in course.teacher.lower() or
                 keyword in course.course_id.lower()):
-                results.append(course.to_dict())
+                results.append(RecordView.of_course(course))
         
         return results
     
+    def _rank_key(self, course_id: Optional[str], grade: Optional[str], class_name: Optional[str]):
+        """排名范围对应的索引键，限定班级时必须同时指定年级"""
+        if class_name is not None:
+            if grade is None:
+                raise ValueError("按班级排名时必须指定年级")
+            self.load_partition(grade, class_name)
+        return course_id, grade, class_name
+    
+    def get_top_students(self, course_id: Optional[str] = None, k: int = 10,
+                         grade: Optional[str] = None, class_name: Optional[str] = None) -> List[Dict]:
+        """
+        成绩排名前k的学生，可限定年级或班级；course_id为None时按已有成绩的平均分排名。
+        同分的学生名次相同
+        """
+        key = self._rank_key(course_id, grade, class_name)
+        results = []
+        for rank, student_id, score in self._index('score', ScoreIndex).top(key, k):
+            student = self.students[student_id]
+            results.append({
+                'rank': rank,
+                'student_id': student_id,
+                'name': student.name,
+                'grade': student.grade,
+                'class_name': student.class_name,
+                'score': score
+            })
+        return results
+    
+    def get_student_rank(self, student_id: str, course_id: Optional[str] = None,
+                         scope: str = 'class') -> Optional[Dict]:
+        """
+        学生在全校（'all'）、年级（'grade'）或班级（'class'）中的名次；
+        course_id为None时按平均分。学生不存在或没有成绩时返回None
+        """
+        if scope not in ('all', 'grade', 'class'):
+            raise ValueError("scope 只能是 'all'、'grade' 或 'class'")
+        student = self.students.get(student_id)
+        if student is None:
+            return None
+        grade = None if scope == 'all' else student.grade
+        class_name = student.class_name if scope == 'class' else None
+        result = self._index('score', ScoreIndex).rank(self._rank_key(course_id, grade, class_name), student_id)
+        if result is None:
+            return None
+        rank, total, score = result
+        return {'rank': rank, 'total': total, 'score': score}
+    
+    def get_class_students(self, grade: str, class_name: str) -> List[RecordView]:
+        """获取指定班级的学生列表"""
+        self.load_partition(grade, class_name)
+        return [RecordView.of_student(self.students[student_id])
+                for student_id in self._index('class', ClassIndex).class_members(grade, class_name)]
+    
+    def get_course_summary(self, course_id: str) -> Optional[Dict]:
+        """
+        课程的汇总统计：选课人数及成绩的计数、平均分、标准差和最值，
+        由汇总索引增量维护，无需遍历学生。课程不存在时返回None
+        """
+        course = self.courses.get(course_id)
+        if course is None:
+            return None
+        aggregate = self._index('aggregate', AggregateIndex).course(course_id)
+        summary = aggregate.scores.summary()
+        return {
+            'course_id': course_id,
+            'name': course.name,
+            'enrolled': aggregate.enrolled,
+            'scored': summary.pop('count'),
+            **summary
+        }
+    
+    def get_class_summary(self, grade: str, class_name: str) -> Dict:
+        """班级的汇总统计：人数、选课人次及全班成绩的计数、平均分、标准差和最值"""
+        self.load_partition(grade, class_name)
+        aggregate = self._index('aggregate', AggregateIndex).class_(grade, class_name)
+        summary = aggregate.scores.summary()
+        return {
+            'grade': grade,
+            'class_name': class_name,
+            'total_students': aggregate.students,
+            'enrollments': sum(aggregate.enrollments.values()),
+            'scored': summary.pop('count'),
+            **summary
+        }
+    
     def get_class_statistics(self, grade: str, class_name: str) -> Dict:
         """获取班级统计信息"""
-        class_students = [
-            student for student in self.students.values()
-            if student.grade == grade and student.class_name == class_name
-        ]
-        
-        if not class_students:
+        self.load_partition(grade, class_name)
+        # 年龄分布和选课人数由汇总索引增量维护
+        aggregate = self._index('aggregate', AggregateIndex).class_(grade, class_name)
+        if not aggregate.students:
             return {}
         
-        total_students = len(class_students)
-        age_distribution = {}
-        course_enrollment = {}
-        
-        for student in class_students:
-            # 年龄分布
-            age = student.age
-            age_distribution[age] = age_distribution.get(age, 0) + 1
-            
-            # 课程选课统计
-            for course_id in student.courses:
-                course_enrollment[course_id] = course_enrollment.get(course_id, 0) + 1
-        
         # 获取课程名称
         course_names = {}
-        for course_id, count in course_enrollment.items():
+        for course_id in aggregate.enrollments:
             if course_id in self.courses:
                 course_names[course_id] = self.courses[course_id].name
         
         return {
-            'total_students': total_students,
-            'age_distribution': age_distribution,
-            'course_enrollment': course_enrollment,
+            'total_students': aggregate.students,
+            'age_distribution': dict(aggregate.ages),
+            'course_enrollment': dict(aggregate.enrollments),
             'course_names': course_names
         }
 
+def print_progress(done: int, total: int):
+    """在命令行显示加载进度"""
+    percent = done * 100 // total if total else 100
+    print(f"\r正在加载数据... {percent}%", end="\n" if done >= total else "", flush=True)
+
 
 def main():
     """主函数 - 命令行界面"""
-    system = StudentManagementSystem()
+    system = StudentManagementSystem(progress=print_progress, lazy=True)
     
     print("=" * 50)
     print("    学生管理系统")
@@ -374,6 +1044,7 @@ def main():
         choice = input("\n请输入选项: ").strip()
         
         if choice == "0":
+            system.close()
             print("感谢使用学生管理系统！")
             break
         
@@ -436,11 +1107,16 @@ def main():
                     print("未找到该学生！")
             
             elif sub_choice == "5":
-                students = system.get_all_students()
+                # 分页显示，每次只取一页
+                students, cursor = system.query().page(20)
                 if students:
                     print("\n所有学生:")
-                    for student in students:
-                        print(f"{student['student_id']} - {student['name']} - {student['grade']}{student['class_name']}")
+                    while True:
+                        for student in students:
+                            print(f"{student['student_id']} - {student['name']} - {student['grade']}{student['class_name']}")
+                        if cursor is None or input("按回车显示下一页，输入q返回: ").strip().lower() == 'q':
+                            break
+                        students, cursor = system.query().page(20, cursor)
                 else:
                     print("暂无学生信息")
             
@@ -5,9 +5,29 @@
 用于验证系统功能的正确性
 """
 
+import gc
 import os
+import shutil
 import sys
-from student_management_system import StudentManagementSystem
+import threading
+import time
+import warnings
+from student_management_system import Student, StudentManagementSystem
+from columnar import ColumnarStudentStore
+import analytics
+import benchmark
+import calendar
+import ids
+import storage
+from storage import (BinarySnapshot, JSONStorage, LazyRecordMap, ShardedStorage, convert_data_file,
+                     detect_compression, iter_json_records)
+
+
+def remove_data_file(path):
+    """删除数据文件及其修改日志和偏移量索引"""
+    for name in (path, path + ".journal", path + ".idx"):
+        if os.path.exists(name):
+            os.remove(name)
 
 
 def test_system():
@@ -18,8 +38,7 @@ def test_system():
     test_data_file = "test_data.json"
     
     # 如果测试文件存在，先删除
-    if os.path.exists(test_data_file):
-        os.remove(test_data_file)
+    remove_data_file(test_data_file)
     
     # 创建系统实例
     system = StudentManagementSystem(test_data_file)
@@ -94,12 +113,1236 @@ def test_system():
     print(f"   重新加载后学生数: {len(students)}, 课程数: {len(courses)}")
     
     # 清理测试文件
-    if os.path.exists(test_data_file):
-        os.remove(test_data_file)
+    remove_data_file(test_data_file)
     
     print("\n所有测试完成！系统功能正常。")
 
 
+def test_journal():
+    """测试日志模式"""
+    print("开始测试日志模式...")
+    
+    test_data_file = "test_journal_data.json"
+    journal_file = test_data_file + ".journal"
+    remove_data_file(test_data_file)
+    
+    system = StudentManagementSystem(test_data_file, journal=True)
+    student_id = system.add_student("张三", 18, "高三", "1班")
+    course_id = system.add_course("数学", "张老师", 3.0)
+    system.enroll_student_in_course(student_id, course_id)
+    system.add_score(student_id, course_id, 95.5)
+    
+    # 修改只追加到日志，快照文件尚未生成
+    assert not os.path.exists(test_data_file)
+    assert os.path.exists(journal_file)
+    
+    # 重新加载时在快照上重放日志
+    new_system = StudentManagementSystem(test_data_file, journal=True)
+    assert new_system.get_student_info(student_id)['scores'] == {course_id: 95.5}
+    assert list(new_system.courses[course_id].students) == [student_id]
+    
+    # 检查点将日志合并到快照
+    new_system.remove_student(student_id)
+    new_system.checkpoint()
+    assert not os.path.exists(journal_file)
+    
+    reloaded = StudentManagementSystem(test_data_file)
+    assert student_id not in reloaded.students
+    assert list(reloaded.courses[course_id].students) == []
+    
+    remove_data_file(test_data_file)
+    print("日志模式测试完成！")
+
+
+def test_journal_torn_tail():
+    """测试日志末尾残缺记录的处理"""
+    print("开始测试日志残缺记录...")
+    
+    test_data_file = "test_torn_data.json"
+    journal_file = test_data_file + ".journal"
+    remove_data_file(test_data_file)
+    
+    system = StudentManagementSystem(test_data_file, journal=True)
+    student_ids = [system.add_student("张三", 18, "高三", "1班")]
+    system.checkpoint()
+    student_ids.append(system.add_student("李四", 17, "高三", "1班"))
+    
+    # 模拟追加时崩溃：最后一条记录只写了一半
+    with open(journal_file, 'ab') as f:
+        f.write('{"type":"student","id":"S1","data":{"na'.encode('utf-8'))
+    
+    # 按需加载和全量加载都应先截断残缺内容，之后追加的记录不会因接在其后而丢失
+    for lazy in (False, True):
+        system = StudentManagementSystem(test_data_file, journal=True, lazy=lazy)
+        assert sorted(system.students) == sorted(student_ids)
+        student_ids.append(system.add_student("王五", 17, "高三", "2班"))
+        
+        reloaded = StudentManagementSystem(test_data_file, journal=True)
+        assert sorted(reloaded.students) == sorted(student_ids)
+    
+    remove_data_file(test_data_file)
+    print("日志残缺记录测试完成！")
+
+def test_batch():
+    """测试批量操作"""
+    print("开始测试批量操作...")
+    
+    test_data_file = "test_batch_data.json"
+    remove_data_file(test_data_file)
+    
+    system = StudentManagementSystem(test_data_file)
+    course_id = system.add_course("数学", "张老师", 3.0)
+    
+    # 批量操作期间不写文件，退出时统一保存
+    with system.batch():
+        student_ids = [system.add_student(f"学生{i}", 18, "高三", "1班") for i in range(20)]
+        for student_id in student_ids:
+            system.enroll_student_in_course(student_id, course_id)
+            system.add_score(student_id, course_id, 90.0)
+        assert len(StudentManagementSystem(test_data_file).students) == 0
+    
+    assert len(StudentManagementSystem(test_data_file).students) == len(system.students)
+    student_count = len(system.students)
+    
+    # 异常时回滚内存中的修改
+    try:
+        with system.batch():
+            system.remove_course(course_id)
+            system.add_student("李四", 17, "高三", "2班")
+            raise RuntimeError("中断")
+    except RuntimeError:
+        pass
+    
+    assert len(system.students) == student_count
+    assert len(system.courses[course_id].students) == 20
+    assert system.students[student_ids[0]].scores == {course_id: 90.0}
+    
+    remove_data_file(test_data_file)
+    print("批量操作测试完成！")
+
+
+def test_sqlite_storage():
+    """测试SQLite存储后端"""
+    print("开始测试SQLite存储后端...")
+    
+    test_data_file = "test_data.db"
+    remove_data_file(test_data_file)
+    
+    system = StudentManagementSystem(test_data_file)
+    student_id1 = system.add_student("张三", 18, "高三", "1班")
+    student_id2 = system.add_student("李四", 17, "高三", "2班")
+    course_id1 = system.add_course("数学", "张老师", 3.0)
+    course_id2 = system.add_course("英语", "李老师", 2.5)
+    system.enroll_student_in_course(student_id1, course_id1)
+    system.enroll_student_in_course(student_id1, course_id2)
+    system.enroll_student_in_course(student_id2, course_id1)
+    system.add_score(student_id1, course_id1, 95.5)
+    system.update_student(student_id2, age=18)
+    system.drop_course(student_id1, course_id2)
+    expected_students = system.get_all_students()
+    expected_courses = system.get_all_courses()
+    system.close()
+    
+    new_system = StudentManagementSystem(test_data_file)
+    assert new_system.get_all_students() == expected_students
+    assert new_system.get_all_courses() == expected_courses
+    
+    # 全量保存后课程名单仍按选课顺序，而不是学生的添加顺序；之后的增量选课排在末尾
+    new_system.drop_course(student_id1, course_id1)
+    new_system.enroll_student_in_course(student_id1, course_id1)
+    new_system.enroll_student_in_course(student_id2, course_id2)
+    new_system.enroll_student_in_course(student_id1, course_id2)
+    new_system.checkpoint()
+    student_id3 = new_system.add_student("王五", 17, "高三", "1班")
+    new_system.enroll_student_in_course(student_id3, course_id1)
+    expected_courses = new_system.get_all_courses()
+    assert expected_courses[0]['students'] == [student_id2, student_id1, student_id3]
+    expected_students = new_system.get_all_students()
+    new_system.close()
+    for lazy in (False, True):
+        new_system = StudentManagementSystem(test_data_file, lazy=lazy)
+        assert new_system.get_all_courses() == expected_courses
+        assert new_system.get_all_students() == expected_students
+        new_system.close()
+    new_system = StudentManagementSystem(test_data_file)
+    
+    # 删除课程后对应的选课行一并删除
+    new_system.remove_course(course_id1)
+    new_system.close()
+    
+    reloaded = StudentManagementSystem(test_data_file)
+    assert list(reloaded.students[student_id1].courses) == [course_id2]
+    assert reloaded.students[student_id1].scores == {}
+    reloaded.close()
+    
+    remove_data_file(test_data_file)
+    print("SQLite存储后端测试完成！")
+
+
+def test_streaming_load():
+    """测试增量加载"""
+    print("开始测试增量加载...")
+    
+    test_data_file = "test_stream_data.json"
+    remove_data_file(test_data_file)
+    
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        course_id = system.add_course("高等数学", "张教授", 4.0)
+        for i in range(50):
+            student_id = system.add_student(f"小明{i}", 18, "高三", "1班")
+            system.enroll_student_in_course(student_id, course_id)
+            system.add_score(student_id, course_id, 60.0 + i / 2)
+    system.checkpoint()
+    
+    # 块大小很小时记录和多字节字符都会跨块
+    records = list(iter_json_records(test_data_file, chunk_size=7))
+    assert [r for key, r in records if key == 'students'] == system.get_all_students()
+    assert [r for key, r in records if key == 'courses'] == system.get_all_courses()
+    
+    reports = []
+    new_system = StudentManagementSystem(test_data_file, progress=lambda done, total: reports.append((done, total)))
+    assert new_system.get_all_students() == system.get_all_students()
+    assert reports[-1][0] == reports[-1][1] == os.path.getsize(test_data_file)
+    
+    remove_data_file(test_data_file)
+    print("增量加载测试完成！")
+
+
+def test_binary_snapshot():
+    """测试二进制快照"""
+    print("开始测试二进制快照...")
+    
+    json_file = "test_snapshot_data.json"
+    binary_file = "test_snapshot_data.sms"
+    for path in (json_file, binary_file):
+        remove_data_file(path)
+    
+    system = StudentManagementSystem(json_file)
+    with system.batch():
+        course_id1 = system.add_course("高等数学", "张教授", 4.0)
+        course_id2 = system.add_course("大学英语", "李老师", 3.0)
+        student_id1 = system.add_student("小明", 18, "高三", "1班")
+        student_id2 = system.add_student("小红", 17, "高三", "1班")
+        system.enroll_student_in_course(student_id1, course_id1)
+        system.enroll_student_in_course(student_id1, course_id2)
+        system.enroll_student_in_course(student_id2, course_id1)
+        system.add_score(student_id1, course_id1, 95.0)
+    
+    # JSON与二进制快照互相转换后内容不变
+    convert_data_file(json_file, binary_file)
+    binary_system = StudentManagementSystem(binary_file)
+    assert binary_system.get_all_students() == system.get_all_students()
+    assert binary_system.get_all_courses() == system.get_all_courses()
+    
+    with BinarySnapshot(binary_file) as snapshot:
+        assert snapshot.find_student(student_id2)['name'] == "小红"
+        assert snapshot.find_course(course_id2)['students'] == [student_id1]
+        assert snapshot.find_student("S000") is None
+    
+    remove_data_file(json_file)
+    convert_data_file(binary_file, json_file)
+    assert StudentManagementSystem(json_file).get_all_students() == system.get_all_students()
+    
+    # 定长记录放不下的值（非整数年龄、整数成绩和学分、未选课程的成绩等）原样保留
+    course_id3 = system.add_course("体育", None, 2)
+    system.update_student(student_id2, age="19", class_name=None)
+    system.add_score(student_id2, course_id1, 88)
+    system.students[student_id1].scores[course_id3] = 60
+    system.save_data()
+    convert_data_file(json_file, binary_file)
+    records = lambda system: repr([record.snapshot() for record in system.get_all_students() + system.get_all_courses()])
+    binary_system = StudentManagementSystem(binary_file)
+    assert records(binary_system) == records(system)
+    binary_system.update_student(student_id1, age=None)
+    system.update_student(student_id1, age=None)
+    assert records(StudentManagementSystem(binary_file)) == records(system)
+    
+    for path in (json_file, binary_file):
+        remove_data_file(path)
+    print("二进制快照测试完成！")
+
+
+def test_background_save():
+    """测试后台保存和原子写入"""
+    print("开始测试后台保存...")
+    
+    test_data_file = "test_background_data.json"
+    remove_data_file(test_data_file)
+    
+    # 统计实际写入次数，验证多次保存请求被合并
+    writes = []
+    original_atomic_write = storage.atomic_write
+    storage.atomic_write = lambda path, data: (writes.append(path), original_atomic_write(path, data))
+    try:
+        system = StudentManagementSystem(test_data_file, journal=False, background=True)
+        course_id = system.add_course("数学", "张老师", 3.0)
+        student_ids = [system.add_student(f"学生{i}", 18, "高三", "1班") for i in range(200)]
+        for student_id in student_ids:
+            system.enroll_student_in_course(student_id, course_id)
+        system.flush()
+        assert 1 <= len(writes) < 401
+        expected_students = system.get_all_students()
+        assert StudentManagementSystem(test_data_file).get_all_students() == expected_students
+        system.close()
+    finally:
+        storage.atomic_write = original_atomic_write
+    
+    # 替换文件前失败时原文件保持完整，也不会留下临时文件
+    original_replace = os.replace
+    def failing_replace(src, dst):
+        raise OSError("模拟写入中途崩溃")
+    os.replace = failing_replace
+    try:
+        system = StudentManagementSystem(test_data_file, journal=False)
+        system.add_student("张三", 18, "高三", "2班")
+    finally:
+        os.replace = original_replace
+    
+    assert StudentManagementSystem(test_data_file).get_all_students() == expected_students
+    assert [name for name in os.listdir('.')
+            if name.startswith(test_data_file + '.') and name.endswith('.tmp')] == []
+    
+    # 准备写入失败时写线程不会退出，失败的修改留待下次保存时重试
+    class FailingStorage(JSONStorage):
+        failures = 1
+        
+        def prepare_changes(self, *args):
+            if self.failures:
+                self.failures -= 1
+                raise ValueError("模拟准备写入失败")
+            return super().prepare_changes(*args)
+    
+    for background in (False, True):
+        remove_data_file(test_data_file)
+        system = StudentManagementSystem(storage=FailingStorage(test_data_file), background=background)
+        student_ids = [system.add_student("张三", 18, "高三", "1班")]
+        system.flush()
+        assert len(StudentManagementSystem(test_data_file).students) == 0
+        student_ids.append(system.add_student("李四", 18, "高三", "1班"))
+        flusher = threading.Thread(target=system.flush)
+        flusher.start()
+        flusher.join(5)
+        assert not flusher.is_alive(), "写线程不应因失败而退出"
+        assert sorted(StudentManagementSystem(test_data_file).students) == sorted(student_ids)
+        system.close()
+    
+    remove_data_file(test_data_file)
+    print("后台保存测试完成！")
+
+
+def test_delta_save():
+    """测试增量保存和自动合并"""
+    print("开始测试增量保存...")
+    
+    test_data_file = "test_delta_data.json"
+    journal_file = test_data_file + ".journal"
+    remove_data_file(test_data_file)
+    
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        student_ids = [system.add_student(f"学生{i}", 18, "高三", "1班") for i in range(30)]
+    system.checkpoint()
+    snapshot_size = os.path.getsize(test_data_file)
+    
+    # 只修改一名学生时，只有这条记录被追加到日志
+    system.storage.compact_threshold = 10
+    system.update_student(student_ids[0], age=19)
+    assert os.path.getsize(test_data_file) == snapshot_size
+    with open(journal_file, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
+    
+    # 日志记录数超过快照记录数后自动合并回快照
+    for i in range(30):
+        system.update_student(student_ids[i % 5], age=20 + i)
+    if os.path.exists(journal_file):
+        with open(journal_file, encoding='utf-8') as f:
+            assert len(f.readlines()) < 30
+    snapshot = {r['student_id']: r for key, r in iter_json_records(test_data_file) if key == 'students'}
+    assert snapshot[student_ids[0]]['age'] == 45
+    
+    reloaded = StudentManagementSystem(test_data_file)
+    assert reloaded.get_all_students() == system.get_all_students()
+    
+    remove_data_file(test_data_file)
+    print("增量保存测试完成！")
+
+
+def test_sharded_storage():
+    """测试按班级分片存储"""
+    print("开始测试分片存储...")
+    
+    data_dir = "test_data.shards"
+    if os.path.exists(data_dir):
+        shutil.rmtree(data_dir)
+    
+    system = StudentManagementSystem(data_dir)
+    with system.batch():
+        course_id = system.add_course("数学", "张老师", 3.0)
+        for grade, class_name in [("高三", "1班"), ("高三", "2班"), ("高二", "1班")]:
+            for i in range(3):
+                student_id = system.add_student(f"{grade}{class_name}学生{i}", 17, grade, class_name)
+                system.enroll_student_in_course(student_id, course_id)
+    assert len(os.listdir(data_dir)) == 4
+    
+    # 修改一名学生只重写其所在的分片
+    writes = []
+    original_atomic_write = storage.atomic_write
+    storage.atomic_write = lambda path, data: (writes.append(path), original_atomic_write(path, data))
+    try:
+        student_id = next(iter(system.students))
+        system.add_score(student_id, course_id, 88.0)
+    finally:
+        storage.atomic_write = original_atomic_write
+    assert writes == [system.storage.shard_file(("高三", "1班"))]
+    
+    # 只加载需要的分片，班级统计时按需加载对应分片
+    session = StudentManagementSystem(storage=ShardedStorage(data_dir, shards=[("高三", "1班")]))
+    assert len(session.students) == 3
+    assert session.get_class_statistics("高三", "2班")['total_students'] == 3
+    assert len(session.students) == 6
+    
+    # 向未加载的分片添加学生时与磁盘上已有的记录合并
+    session.add_student("新同学", 16, "高二", "1班")
+    reloaded = StudentManagementSystem(data_dir)
+    assert len(reloaded.students) == 10
+    
+    # 本次会话中已写入未加载分片的学生不会重复写入
+    session.add_student("插班生", 16, "高二", "1班")
+    shard_ids = [record['student_id'] for _, record in iter_json_records(system.storage.shard_file(("高二", "1班")))]
+    assert len(shard_ids) == len(set(shard_ids)) == 5
+    reloaded = StudentManagementSystem(data_dir)
+    assert len(reloaded.students) == 11
+    assert reloaded.students[student_id].scores == {course_id: 88.0}
+    assert reloaded.get_class_statistics("高二", "1班")['total_students'] == 5
+    
+    # 按年级分片的目录不能按班级打开（包括默认方式），反之亦然
+    grade_dir = "test_grade.shards"
+    if os.path.exists(grade_dir):
+        shutil.rmtree(grade_dir)
+    StudentManagementSystem(storage=ShardedStorage(grade_dir, by='grade')).add_student("张三", 17, "高三", "1班")
+    for open_mismatched in (lambda: StudentManagementSystem(grade_dir), lambda: ShardedStorage(data_dir, by='grade')):
+        try:
+            open_mismatched()
+            assert False, "分片方式不符时应报错"
+        except ValueError:
+            pass
+    assert [name.split('.')[0] for name in os.listdir(grade_dir)] == ['grade']
+    shutil.rmtree(grade_dir)
+    
+    shutil.rmtree(data_dir)
+    print("分片存储测试完成！")
+
+
+def test_lazy_loading():
+    """测试按需加载"""
+    print("开始测试按需加载...")
+    
+    test_data_file = "test_lazy_data.json"
+    binary_file = "test_lazy_data.sms"
+    sqlite_file = "test_lazy_data.db"
+    for path in (test_data_file, binary_file, sqlite_file):
+        remove_data_file(path)
+    
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        course_id = system.add_course("数学", "张老师", 3.0)
+        for i in range(50):
+            student_id = system.add_student(f"学生{i}", 15 + i % 4, "高一", f"{i % 3}班")
+            system.enroll_student_in_course(student_id, course_id)
+            system.add_score(student_id, course_id, 60.0 + i % 40)
+    system.save_data()
+    assert os.path.exists(test_data_file + ".idx")
+    expected = {student_id: student.to_dict() for student_id, student in system.students.items()}
+    student_id = next(iter(expected))
+    
+    # 启动时不解码记录，访问时才读取，常驻的已解码记录数受缓存大小限制
+    lazy = StudentManagementSystem(test_data_file, lazy=True, cache_size=5)
+    assert isinstance(lazy.students, LazyRecordMap)
+    assert lazy.students.resident() == 0
+    assert len(lazy.students) == len(expected)
+    assert lazy.get_student_info(student_id) == system.get_student_info(student_id)
+    assert {sid: student.to_dict() for sid, student in lazy.students.items()} == expected
+    assert lazy.students.resident() <= 5
+    
+    # 修改过的记录不会被淘汰，并通过日志持久化
+    lazy.update_student(student_id, age=30)
+    list(lazy.students.values())
+    assert lazy.students[student_id].age == 30
+    lazy.close()
+    
+    # 缓存为0时每次访问都重新解码，修改仍作用于被固定并保存的对象
+    lazy = StudentManagementSystem(test_data_file, lazy=True, cache_size=0)
+    other_id = list(expected)[1]
+    lazy.update_student(other_id, name="改名")
+    lazy.drop_course(other_id, course_id)
+    lazy.enroll_student_in_course(other_id, course_id)
+    lazy.add_score(other_id, course_id, 99.0)
+    for system_view in (lazy, StudentManagementSystem(test_data_file, lazy=True, cache_size=0)):
+        info = system_view.get_student_info(other_id)
+        assert info['name'] == "改名" and info['scores'] == {course_id: 99.0}
+        assert other_id in system_view.courses[course_id].students
+    lazy.remove_student(other_id)
+    assert other_id not in StudentManagementSystem(test_data_file).courses[course_id].students
+    lazy.close()
+    del expected[other_id]
+    
+    # 索引缺失时扫描数据文件重建
+    os.remove(test_data_file + ".idx")
+    lazy = StudentManagementSystem(test_data_file, lazy=True, cache_size=5)
+    assert lazy.students[student_id].age == 30
+    assert lazy.get_course_info(course_id)['students'] == list(expected)
+    lazy.close()
+    assert os.path.exists(test_data_file + ".idx")
+    
+    # 二进制快照和SQLite数据库同样支持按需加载
+    expected[student_id]['age'] = 30
+    convert_data_file(test_data_file, binary_file)
+    sqlite_system = StudentManagementSystem(sqlite_file)
+    sqlite_system.students = StudentManagementSystem(test_data_file).students
+    sqlite_system.courses = system.courses
+    sqlite_system.save_data()
+    sqlite_system.close()
+    for path in (binary_file, sqlite_file):
+        lazy = StudentManagementSystem(path, lazy=True, cache_size=5)
+        assert lazy.students.resident() == 0
+        assert {sid: student.to_dict() for sid, student in lazy.students.items()} == expected
+        lazy.close()
+    
+    # 全量写入快照时先关闭按需加载打开的文件（Windows上无法替换打开的文件），之后从新快照读取
+    open_files = lambda system: [getattr(source.source, '_file', None) or source.source._snapshot._file
+                                 for source in system.storage._sources]
+    original_atomic_write = storage.atomic_write
+    for path in (test_data_file, binary_file):
+        lazy = StudentManagementSystem(path, lazy=True, cache_size=5)
+        files = open_files(lazy)
+        closed = []
+        storage.atomic_write = lambda target, data: (closed.append(all(f.closed for f in files)),
+                                                     original_atomic_write(target, data))
+        try:
+            lazy.save_data()
+        finally:
+            storage.atomic_write = original_atomic_write
+        assert closed and all(closed)
+        assert not any(f.closed for f in open_files(lazy))
+        assert {sid: student.to_dict() for sid, student in lazy.students.items()} == expected
+        lazy.close()
+    
+    for path in (test_data_file, binary_file, sqlite_file):
+        remove_data_file(path)
+    print("按需加载测试完成！")
+
+
+def test_compressed_snapshot():
+    """测试压缩快照"""
+    print("开始测试压缩快照...")
+    
+    paths = ["test_compressed_data.json.gz", "test_compressed_data.json.bz2", "test_compressed_data.sms.xz"]
+    for path in paths:
+        remove_data_file(path)
+    
+    system = StudentManagementSystem(paths[0])
+    with system.batch():
+        course_id = system.add_course("数学", "张老师", 3.0)
+        for i in range(30):
+            student_id = system.add_student(f"学生{i}", 16, "高一", "1班")
+            system.enroll_student_in_course(student_id, course_id)
+            system.add_score(student_id, course_id, 70.0 + i)
+    system.save_data()
+    expected = system.get_all_students()
+    
+    # 压缩格式由扩展名决定，加载时按文件头魔数自动解压
+    for path, compression in zip(paths[1:], ['bz2', 'lzma']):
+        convert_data_file(paths[0], path)
+        assert detect_compression(path) == compression
+    assert detect_compression(paths[0]) == 'gzip'
+    for path in paths:
+        assert StudentManagementSystem(path).get_all_students() == expected
+    
+    # 压缩的二进制快照解压到内存后不再占用文件句柄
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        BinarySnapshot(paths[2]).close()
+        gc.collect()
+    assert not [warning for warning in caught if issubclass(warning.category, ResourceWarning)]
+    
+    # 扩展名不带压缩格式时按文件内容识别，保存时沿用原有的压缩格式
+    renamed = "test_compressed_data.json"
+    remove_data_file(renamed)
+    os.rename(paths[0], renamed)
+    reloaded = StudentManagementSystem(renamed, lazy=True)
+    assert reloaded.get_all_students() == expected
+    reloaded.checkpoint()
+    assert detect_compression(renamed) == 'gzip'
+    
+    # 压缩级别可配置
+    fast = JSONStorage(paths[0], compression_level=1)
+    fast.save(system.students, system.courses)
+    assert StudentManagementSystem(paths[0]).get_all_students() == expected
+    
+    results = benchmark.benchmark_compression(renamed)
+    assert [result['compression'] for result in results] == ['none', 'gzip', 'bz2', 'lzma']
+    assert all(result['records'] == 31 for result in results)
+    assert all(result['size'] < results[0]['size'] for result in results[1:])
+    
+    for path in paths + [renamed]:
+        remove_data_file(path)
+    print("压缩快照测试完成！")
+
+
+def test_class_index():
+    """测试年级/班级索引"""
+    print("开始测试班级索引...")
+    
+    test_data_file = "test_index_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    
+    def scan(grade, class_name):
+        return sorted((s.to_dict() for s in system.students.values()
+                       if s.grade == grade and s.class_name == class_name), key=lambda s: s['student_id'])
+    
+    def class_students(grade, class_name):
+        return sorted(system.get_class_students(grade, class_name), key=lambda s: s['student_id'])
+    
+    with system.batch():
+        course_id = system.add_course("数学", "张老师", 3.0)
+        student_ids = [system.add_student(f"学生{i}", 16, "高一", f"{i % 3}班") for i in range(12)]
+    assert system.get_class_statistics("高一", "0班")['total_students'] == 4
+    
+    # 索引建立后，添加、修改、删除学生都会同步更新索引
+    system.update_student(student_ids[0], class_name="1班")
+    system.remove_student(student_ids[1])
+    new_id = system.add_student("新同学", 15, "高一", "0班")
+    system.enroll_student_in_course(new_id, course_id)
+    for class_name in ("0班", "1班", "2班"):
+        assert class_students("高一", class_name) == scan("高一", class_name)
+    assert system.get_class_statistics("高一", "0班")['course_enrollment'] == {course_id: 1}
+    
+    # 批量操作回滚后索引恢复原状
+    try:
+        with system.batch():
+            system.update_student(student_ids[2], grade="高二")
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert system.get_class_students("高二", "2班") == []
+    assert class_students("高一", "2班") == scan("高一", "2班")
+    
+    remove_data_file(test_data_file)
+    print("班级索引测试完成！")
+
+
+def test_search_index():
+    """测试学生搜索索引"""
+    print("开始测试搜索索引...")
+    
+    test_data_file = "test_search_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    
+    def scan(keyword):
+        keyword = keyword.lower()
+        return [s.to_dict() for s in system.students.values()
+                if keyword in s.name.lower() or keyword in s.student_id.lower()
+                or keyword in s.grade.lower() or keyword in s.class_name.lower()]
+    
+    keywords = ["", "小", "小明", "明", "王", "Tom", "tom", "高一", "2班", "s", "S20", "zz"]
+    with system.batch():
+        student_ids = [system.add_student(name, 16, grade, class_name) for name, grade, class_name in [
+            ("小明", "高一", "1班"), ("王小明", "高一", "2班"), ("Tom", "高二", "1班"),
+            ("小红", "高二", "2班"), ("明明", "初三", "1班")
+        ]]
+    for keyword in keywords:
+        assert system.search_students(keyword) == scan(keyword)
+    
+    # 索引随添加、修改和删除学生增量更新，结果顺序与原先逐个比较时一致
+    system.update_student(student_ids[0], name="王明")
+    system.remove_student(student_ids[3])
+    system.add_student("小刚", 15, "高一", "2班")
+    system.update_student(student_ids[2], grade="高一")
+    for keyword in keywords + [student_ids[1], student_ids[1][-3:].upper()]:
+        assert system.search_students(keyword) == scan(keyword)
+    
+    remove_data_file(test_data_file)
+    print("搜索索引测试完成！")
+
+
+def test_complete_students():
+    """测试学生姓名和学号补全"""
+    print("开始测试补全...")
+    
+    test_data_file = "test_complete_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        ids = {name: system.add_student(name, 16, "高一", "1班") for name in ["小明", "小红", "Tom", "tony", "王小明"]}
+    
+    assert [s['name'] for s in system.complete_students("小")] == ["小明", "小红"]
+    assert [s['name'] for s in system.complete_students("TO")] == ["Tom", "tony"]
+    assert [s['name'] for s in system.complete_students("to", limit=1)] == ["Tom"]
+    assert system.complete_students("明") == []
+    
+    # 补全结果随修改更新，学号前缀同样可以补全
+    system.update_student(ids["小红"], name="红红")
+    system.remove_student(ids["小明"])
+    assert [s['name'] for s in system.complete_students("小")] == []
+    assert [s['name'] for s in system.complete_students("红")] == ["红红"]
+    assert [s['name'] for s in system.complete_students(ids["tony"].lower())] == ["tony"]
+    
+    remove_data_file(test_data_file)
+    print("补全测试完成！")
+
+
+def test_enrollment_sets():
+    """测试选课关系的有序集合表示"""
+    print("开始测试选课关系...")
+    
+    test_data_file = "test_enrollment_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file, journal=False)
+    with system.batch():
+        course_ids = [system.add_course(f"课程{i}", "张老师", 2.0) for i in range(3)]
+        student_ids = [system.add_student(f"学生{i}", 16, "高一", "1班") for i in range(4)]
+        for student_id in student_ids:
+            for course_id in reversed(course_ids):
+                system.enroll_student_in_course(student_id, course_id)
+    
+    # 重复选课无效，退课后其余记录保持原有顺序
+    assert not system.enroll_student_in_course(student_ids[0], course_ids[0])
+    system.drop_course(student_ids[0], course_ids[1])
+    system.drop_course(student_ids[2], course_ids[0])
+    assert system.get_student_info(student_ids[0])['courses'] == [course_ids[2], course_ids[0]]
+    assert system.get_course_info(course_ids[0])['students'] == [student_ids[0], student_ids[1], student_ids[3]]
+    
+    # 磁盘上仍是列表格式
+    section, record = next(iter_json_records(test_data_file))
+    assert section == 'students' and record['courses'] == [course_ids[2], course_ids[0]]
+    reloaded = StudentManagementSystem(test_data_file)
+    assert reloaded.get_all_students() == system.get_all_students()
+    assert reloaded.get_all_courses() == system.get_all_courses()
+    
+    remove_data_file(test_data_file)
+    print("选课关系测试完成！")
+
+
+def test_reverse_deletion():
+    """测试删除学生和课程时只访问相关的记录"""
+    print("开始测试删除...")
+    
+    test_data_file = "test_deletion_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        course_ids = [system.add_course(f"课程{i}", "张老师", 2.0) for i in range(4)]
+        student_ids = [system.add_student(f"学生{i}", 16, "高一", "1班") for i in range(20)]
+        for i, student_id in enumerate(student_ids):
+            system.enroll_student_in_course(student_id, course_ids[i % 4])
+            system.add_score(student_id, course_ids[i % 4], 90.0)
+    system.save_data()
+    
+    # 按需加载时只会解码被删除课程的学生和被删除学生的课程
+    lazy = StudentManagementSystem(test_data_file, lazy=True)
+    assert lazy.remove_course(course_ids[0])
+    assert lazy.students.resident() == 5
+    assert lazy.remove_student(student_ids[1])
+    assert lazy.courses.resident() == 1
+    lazy.close()
+    
+    reloaded = StudentManagementSystem(test_data_file)
+    assert all(course_ids[0] not in s['courses'] and course_ids[0] not in s['scores']
+               for s in reloaded.get_all_students())
+    assert student_ids[1] not in reloaded.get_course_info(course_ids[1])['students']
+    
+    results = benchmark.benchmark_deletion([100, 1000], deletions=10)
+    assert [result['students'] for result in results] == [100, 1000]
+    
+    remove_data_file(test_data_file)
+    print("删除测试完成！")
+
+
+def test_query():
+    """测试学生查询"""
+    print("开始测试查询...")
+    
+    test_data_file = "test_query_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        math_id = system.add_course("数学", "张老师", 3.0)
+        for i in range(30):
+            student_id = system.add_student(f"学生{i:02d}", 14 + i % 5, "高一" if i < 20 else "高二", f"{i % 2 + 1}班")
+            if i % 3 == 0:
+                system.enroll_student_in_course(student_id, math_id)
+                if i % 6 == 0:
+                    system.add_score(student_id, math_id, 60.0 + i)
+    
+    names = lambda rows: [row['name'] for row in rows]
+    query = system.query().filter(grade="高一", class_name="1班")
+    assert query.count() == 10
+    oldest = list(query.filter(min_age=16).order_by("age", descending=True).limit(3))
+    assert [row['age'] for row in oldest] == [18, 18, 17]
+    
+    # 成绩条件和按成绩排序，没有成绩的学生排在最后
+    math = system.query().filter(course_id=math_id)
+    assert math.count() == 10
+    assert names(math.filter(course_id=math_id, min_score=80)) == ["学生24"]
+    assert names(math.order_by("score", descending=True, course_id=math_id).limit(3)) == ["学生24", "学生18", "学生12"]
+    assert set(names(math.order_by("score", course_id=math_id))[-5:]) == {"学生03", "学生09", "学生15", "学生21", "学生27"}
+    
+    # offset/limit 与游标分页得到相同的结果
+    ordered = system.query().order_by("name")
+    assert names(ordered.offset(10).limit(5)) == [f"学生{i:02d}" for i in range(10, 15)]
+    rows, cursor = ordered.page(12)
+    pages = names(rows)
+    while cursor is not None:
+        rows, cursor = ordered.page(12, cursor)
+        pages += names(rows)
+    assert pages == [f"学生{i:02d}" for i in range(30)]
+    
+    # 未排序时按候选顺序分页，按需加载时只读取本页的学生；上一页最后一名学生被删除后仍能继续
+    system.save_data()
+    lazy = StudentManagementSystem(test_data_file, lazy=True)
+    expected = list(lazy.students)
+    rows, cursor = lazy.query().page(12)
+    assert lazy.students.resident() == 12
+    lazy.remove_student(rows[-1]['student_id'])
+    pages = [row['student_id'] for row in rows]
+    while cursor is not None:
+        rows, cursor = lazy.query().page(12, cursor)
+        pages += [row['student_id'] for row in rows]
+    assert pages == expected
+    grade_query = lazy.query().filter(grade="高一")
+    rows, cursor = grade_query.page(5)
+    assert [row['student_id'] for row in grade_query.after(cursor)] == [row['student_id'] for row in grade_query][5:]
+    lazy.close()
+    
+    remove_data_file(test_data_file)
+    print("查询测试完成！")
+
+
+def test_rankings():
+    """测试成绩排名"""
+    print("开始测试排名...")
+    
+    test_data_file = "test_rank_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        math_id = system.add_course("高等数学", "张老师", 4.0)
+        english_id = system.add_course("英语", "李老师", 2.0)
+        ids = {}
+        for name, class_name, math, english in [("甲", "1班", 95, 70), ("乙", "1班", 88, 90), ("丙", "2班", 95, 60),
+                                                ("丁", "2班", 70, 80), ("戊", "1班", None, 85)]:
+            ids[name] = student_id = system.add_student(name, 16, "高一", class_name)
+            for course_id, score in ((math_id, math), (english_id, english)):
+                system.enroll_student_in_course(student_id, course_id)
+                if score is not None:
+                    system.add_score(student_id, course_id, score)
+    
+    top = system.get_top_students(math_id, k=3)
+    assert [(row['rank'], row['score']) for row in top] == [(1, 95), (1, 95), (3, 88)]
+    assert [row['name'] for row in system.get_top_students(math_id, grade="高一", class_name="2班")] == ["丙", "丁"]
+    assert system.get_student_rank(ids["乙"], math_id, scope='all') == {'rank': 3, 'total': 4, 'score': 88}
+    assert system.get_student_rank(ids["乙"], math_id) == {'rank': 2, 'total': 2, 'score': 88}
+    assert system.get_student_rank(ids["戊"], math_id) is None
+    # 不指定课程时按平均分排名
+    assert system.get_top_students(k=1)[0]['name'] == "乙"
+    
+    # 录入成绩、退课和删除学生后排名随之更新
+    system.add_score(ids["丁"], math_id, 99)
+    system.drop_course(ids["甲"], math_id)
+    system.remove_student(ids["丙"])
+    assert [row['name'] for row in system.get_top_students(math_id)] == ["丁", "乙"]
+    assert system.get_student_rank(ids["乙"], math_id, scope='grade') == {'rank': 2, 'total': 2, 'score': 88}
+    
+    remove_data_file(test_data_file)
+    print("排名测试完成！")
+
+
+def test_summaries():
+    """测试课程和班级的汇总统计"""
+    print("开始测试汇总统计...")
+    
+    test_data_file = "test_summary_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        math_id = system.add_course("高等数学", "张老师", 4.0)
+        english_id = system.add_course("英语", "李老师", 2.0)
+        ids = {}
+        for name, class_name, math, english in [("甲", "1班", 90, 70), ("乙", "1班", 80, 90), ("丙", "2班", 60, None)]:
+            ids[name] = student_id = system.add_student(name, 16, "高一", class_name)
+            for course_id, score in ((math_id, math), (english_id, english)):
+                system.enroll_student_in_course(student_id, course_id)
+                if score is not None:
+                    system.add_score(student_id, course_id, score)
+    
+    summary = system.get_course_summary(math_id)
+    assert (summary['enrolled'], summary['scored'], summary['min'], summary['max']) == (3, 3, 60, 90)
+    assert abs(summary['average'] - 230 / 3) < 1e-9
+    assert abs(summary['std'] - (sum((x - 230 / 3) ** 2 for x in (90, 80, 60)) / 3) ** 0.5) < 1e-9
+    summary = system.get_class_summary("高一", "1班")
+    assert (summary['total_students'], summary['enrollments'], summary['scored']) == (2, 4, 4)
+    assert (summary['average'], summary['min'], summary['max']) == (82.5, 70, 90)
+    assert system.get_class_statistics("高一", "1班")['course_enrollment'] == {math_id: 2, english_id: 2}
+    
+    # 录入成绩、退课、选课和删除学生后汇总随之更新
+    system.add_score(ids["乙"], math_id, 100)
+    system.drop_course(ids["甲"], math_id)
+    system.remove_student(ids["丙"])
+    summary = system.get_course_summary(math_id)
+    assert (summary['enrolled'], summary['average'], summary['min'], summary['max']) == (1, 100, 100, 100)
+    new_id = system.add_student("丁", 17, "高一", "1班")
+    system.enroll_student_in_course(new_id, english_id)
+    summary = system.get_class_summary("高一", "1班")
+    assert (summary['total_students'], summary['enrollments'], summary['scored']) == (3, 4, 3)
+    assert system.get_class_statistics("高一", "1班")['age_distribution'] == {16: 2, 17: 1}
+    
+    # 空班级和没有成绩的课程
+    assert system.get_class_summary("高一", "2班")['average'] is None
+    assert system.get_class_statistics("高一", "2班") == {}
+    assert system.get_course_summary("不存在") is None
+    
+    remove_data_file(test_data_file)
+    print("汇总统计测试完成！")
+
+
+def test_analytics():
+    """测试成绩分析"""
+    print("开始测试成绩分析...")
+    
+    test_data_file = "test_analytics_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        math_id = system.add_course("高等数学", "张老师", 4.0)
+        english_id = system.add_course("英语", "李老师", 2.0)
+        ids = {}
+        for name, class_name, math, english in [("甲", "1班", 90, 70), ("乙", "1班", 80, 90),
+                                                ("丙", "2班", 60, None), ("丁", "2班", 100, 50)]:
+            ids[name] = student_id = system.add_student(name, 16, "高一", class_name)
+            for course_id, score in ((math_id, math), (english_id, english)):
+                system.enroll_student_in_course(student_id, course_id)
+                if score is not None:
+                    system.add_score(student_id, course_id, score)
+    
+    # 纯Python实现与NumPy实现（如已安装）的结果应一致
+    backends = [False, True] if analytics.HAS_NUMPY else [False]
+    for use_numpy in backends:
+        matrix = analytics.ScoreMatrix.from_system(system, use_numpy=use_numpy)
+        assert len(matrix) == 7
+        
+        stats = matrix.describe(percentiles=(10, 90))[math_id]
+        assert (stats['count'], stats['average'], stats['median'], stats['min'], stats['max']) == (4, 82.5, 85, 60, 100)
+        assert abs(stats['std'] - 218.75 ** 0.5) < 1e-9
+        assert abs(stats['percentiles'][10] - 66) < 1e-9 and abs(stats['percentiles'][90] - 97) < 1e-9
+        assert matrix.describe(by='class')[("高一", "2班")]['count'] == 3
+        
+        assert matrix.histogram(bins=5)[english_id] == [0, 0, 1, 1, 1]
+        assert matrix.histogram(by='class', bins=2, value_range=(60, 100))[("高一", "2班")] == [1, 1]
+        
+        z_scores = matrix.z_scores()
+        assert abs(z_scores[(ids["丁"], math_id)] - 17.5 / 218.75 ** 0.5) < 1e-9
+        assert (ids["丙"], english_id) not in z_scores
+        
+        dense, mask = matrix.to_dense()
+        row, col = matrix.student_ids.index(ids["丙"]), matrix.course_ids.index(english_id)
+        assert not mask[row][col] and mask[row][1 - col] and dense[row][1 - col] == 60
+    
+    class_matrix = analytics.ScoreMatrix.from_system(system, grade="高一", class_name="1班", use_numpy=False)
+    assert sorted(class_matrix.student_ids) == sorted([ids["甲"], ids["乙"]])
+    try:
+        matrix.describe(by='teacher')
+        assert False, "不支持的分组方式应报错"
+    except ValueError:
+        pass
+    
+    remove_data_file(test_data_file)
+    print("成绩分析测试完成！")
+
+
+def test_detail_cache():
+    """测试详细信息缓存"""
+    print("开始测试详细信息缓存...")
+    
+    test_data_file = "test_detail_cache_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file, detail_cache_size=3)
+    with system.batch():
+        math_id = system.add_course("高等数学", "张老师", 4.0)
+        english_id = system.add_course("英语", "李老师", 2.0)
+        first_id = system.add_student("甲", 16, "高一", "1班")
+        second_id = system.add_student("乙", 16, "高一", "2班")
+        system.enroll_student_in_course(first_id, math_id)
+        system.enroll_student_in_course(second_id, english_id)
+    
+    first_info = system.get_student_info(first_id)
+    assert system.get_student_info(first_id) is first_info
+    system.get_course_info(math_id)
+    system.get_course_info(english_id)
+    assert system.detail_cache_info() == {'hits': 1, 'misses': 3, 'size': 3, 'capacity': 3}
+    
+    # 只有依赖被修改记录的缓存项失效
+    system.add_score(first_id, math_id, 90)
+    assert system.get_course_info(english_id)['student_details'][0]['name'] == "乙"
+    assert system.get_student_info(first_id)['course_details'][0]['score'] == 90
+    assert system.get_course_info(math_id)['student_details'][0]['score'] == 90
+    assert system.detail_cache_info()['hits'] == 2
+    
+    system.enroll_student_in_course(second_id, math_id)
+    assert [row['name'] for row in system.get_course_info(math_id)['student_details']] == ["甲", "乙"]
+    system.update_student(second_id, name="丙")
+    assert system.get_course_info(english_id)['student_details'][0]['name'] == "丙"
+    system.remove_course(math_id)
+    assert system.get_student_info(first_id)['course_details'] == []
+    assert system.get_course_info(math_id) is None
+    
+    # 超出容量时淘汰最久未使用的项
+    system.get_student_info(second_id)
+    system.get_course_info(english_id)
+    assert system.detail_cache_info()['size'] == 3
+    
+    remove_data_file(test_data_file)
+    print("详细信息缓存测试完成！")
+
+
+def test_compact_records():
+    """测试紧凑的学生和课程记录"""
+    print("开始测试紧凑记录...")
+    
+    test_data_file = "test_compact_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        course_id = system.add_course("高等数学", "张老师", 4.0)
+        for name in ("甲", "乙"):
+            student_id = system.add_student(name, 16, "高三", "1班")
+            system.enroll_student_in_course(student_id, course_id)
+            system.add_score(student_id, course_id, 90)
+    
+    # 重新加载后，重复的年级、班级和课程ID共用同一个字符串对象
+    reloaded = StudentManagementSystem(test_data_file)
+    first, second = reloaded.students.values()
+    assert not hasattr(first, '__dict__') and not hasattr(reloaded.courses[course_id], '__dict__')
+    assert first.grade is second.grade and first.class_name is second.class_name
+    assert next(iter(first.courses)) is next(iter(second.courses)) is next(iter(second.scores))
+    assert next(iter(reloaded.courses[course_id].students)) is first.student_id
+    assert reloaded.get_student_info(first.student_id)['scores'] == {course_id: 90}
+    
+    results = benchmark.benchmark_memory(1000)
+    assert results[1]['bytes_per_student'] < results[0]['bytes_per_student']
+    
+    remove_data_file(test_data_file)
+    print("紧凑记录测试完成！")
+
+
+def test_columnar_store():
+    """测试列式学生存储"""
+    print("开始测试列式存储...")
+    
+    test_data_file = "test_columnar_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    with system.batch():
+        course_ids = [system.add_course(name, "张老师", 2.0) for name in ("数学", "语文")]
+        for i, name in enumerate(["张三", "李四", "王五", "Tom"]):
+            student_id = system.add_student(name, 15 + i, "高一", f"{i % 2 + 1}班")
+            system.enroll_student_in_course(student_id, course_ids[i % 2])
+            system.add_score(student_id, course_ids[i % 2], 80 + i)
+    student_ids = list(system.students)
+    
+    # 加载到列式存储后，公开方法的结果与字典存储一致
+    columnar = StudentManagementSystem(test_data_file, columnar=True)
+    assert isinstance(columnar.students, ColumnarStudentStore)
+    for other in (system, columnar):
+        other.update_student(student_ids[0], name="张三丰", grade="高二")
+        other.remove_student(student_ids[1])
+        other.add_student("赵六", 16, "高一", "2班")
+        try:
+            with other.batch():
+                other.update_student(student_ids[2], name="王")
+                other.drop_course(student_ids[2], course_ids[0])
+                raise RuntimeError("回滚")
+        except RuntimeError:
+            pass
+    assert columnar.get_all_students()[:-1] == system.get_all_students()[:-1]
+    for student_id in student_ids:
+        assert columnar.get_student_info(student_id) == system.get_student_info(student_id)
+    assert columnar.search_students("张") == system.search_students("张")
+    # 新添加学生的学号不同，比较其余字段
+    without_ids = lambda rows: [{key: value for key, value in row.items() if key != 'student_id'} for row in rows]
+    assert without_ids(columnar.search_students("高一")) == without_ids(system.search_students("高一"))
+    for class_name in ("1班", "2班"):
+        assert columnar.get_class_statistics("高一", class_name) == system.get_class_statistics("高一", class_name)
+    assert columnar.students[student_ids[2]].name == "王五"
+    
+    # 选课和成绩以课程句柄数组保存，对外仍表现为字典
+    student = columnar.students[student_ids[0]]
+    assert list(student.courses) == [course_ids[0]] and dict(student.scores) == {course_ids[0]: 80}
+    columnar.drop_course(student_ids[0], course_ids[0])
+    columnar.enroll_student_in_course(student_ids[0], course_ids[0])
+    assert course_ids[0] in student.courses and course_ids[0] not in student.scores
+    columnar.add_score(student_ids[0], course_ids[0], 95.5)
+    roster = columnar.get_course_info(course_ids[0])['student_details']
+    assert [(row['student_id'], row['score']) for row in roster] == [(student_ids[2], 82), (student_ids[0], 95.5)]
+    assert columnar.get_student_info(student_ids[0])['course_details'][0]['score'] == 95.5
+    # 整数成绩保持为整数，与字典存储一致
+    columnar.add_score(student_ids[0], course_ids[0], 95)
+    score = columnar.get_student_info(student_ids[0])['scores'][course_ids[0]]
+    assert score == 95 and type(score) is int
+    assert type(columnar.students[student_ids[0]].to_dict()['scores'][course_ids[0]]) is int
+    columnar.add_score(student_ids[0], course_ids[0], 95.5)
+    # 旧数据中未选课程的成绩原样保留
+    legacy = {'student_id': 'S0', 'name': '旧', 'age': 18, 'grade': '高三', 'class_name': '1班',
+              'courses': [course_ids[1]], 'scores': {course_ids[0]: 60, course_ids[1]: None}}
+    columnar.students['S0'] = Student.from_dict(legacy)
+    assert columnar.students['S0'].to_dict() == legacy
+    del columnar.students['S0']
+    # 不是整数的年龄、不是字符串的姓名另行保存，与字典存储一样原样保留
+    for age in ("19", None, 17.5, 1 << 40):
+        odd = dict(legacy, student_id='S1', age=age, name=None if age is None else '旧', courses=[], scores={})
+        columnar.students['S1'] = Student.from_dict(odd)
+        assert columnar.students['S1'].to_dict() == odd
+        del columnar.students['S1']
+    for other in (system, columnar):
+        other.update_student(student_ids[3], age="19")
+    assert columnar.get_student_info(student_ids[3]) == system.get_student_info(student_ids[3])
+    columnar.update_student(student_ids[3], age=18)
+    assert columnar.students[student_ids[3]].age == 18
+    
+    # 删除的行被新学生复用，保存后可以正常重新加载
+    assert len(columnar.students._ids) == 5
+    columnar.save_data()
+    reloaded = StudentManagementSystem(test_data_file)
+    assert reloaded.get_all_students() == columnar.get_all_students()
+    
+    try:
+        StudentManagementSystem(test_data_file, lazy=True, columnar=True)
+        assert False, "按需加载与列式存储同时使用应报错"
+    except ValueError:
+        pass
+    
+    remove_data_file(test_data_file)
+    print("列式存储测试完成！")
+
+
+def test_id_generator():
+    """测试ID生成"""
+    print("开始测试ID生成...")
+    
+    # 用可控的时钟检验：同一秒内递增、计数器用完时借用下一秒、时钟回拨时仍然递增
+    now = [calendar.timegm((2025, 9, 5, 11, 12, 6, 0, 0, 0))]
+    generator = ids.IdGenerator('C', clock=lambda: now[0])
+    first = generator.next_id()
+    assert len(first) == 19 and first.startswith("C20250905111206")
+    generator.skip_existing(["C20250905111206zzzx"])
+    block = generator.reserve(3)
+    assert block == ["C20250905111206zzzy", "C20250905111206zzzz", "C202509051112070000"]
+    now[0] -= 60
+    later = generator.next_id()
+    all_ids = [first] + block + [later]
+    assert all_ids == sorted(all_ids) and len(set(all_ids)) == len(all_ids)
+    
+    # 接续已有数据中的ID（包括旧格式的16进制后缀）
+    generator = ids.IdGenerator('S', clock=lambda: now[0])
+    generator.skip_existing(["S20250905111206ffff", "S0", "C20991231235959zzzz"])
+    assert generator.next_id() > "S20250905111206ffff"
+    
+    # 时间戳使用UTC，夏令时结束（当地时钟拨回一小时）前后生成的ID仍然递增
+    if hasattr(time, 'tzset'):
+        original_tz = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+        try:
+            now = [calendar.timegm((2025, 11, 2, 5, 59, 59, 0, 0, 0))]
+            generator = ids.IdGenerator('S', clock=lambda: now[0])
+            before = generator.next_id()
+            now[0] += 1
+            assert generator.next_id() > before
+        finally:
+            if original_tz is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = original_tz
+            time.tzset()
+    
+    test_data_file = "test_ids_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    reserved = system.reserve_student_ids(100)
+    assert len(set(reserved)) == 100 and reserved == sorted(reserved)
+    with system.batch():
+        for i, student_id in enumerate(reserved):
+            assert system.add_student(f"学生{i}", 16, "高一", "1班", student_id=student_id) == student_id
+    assert system.generate_student_id() > reserved[-1]
+    try:
+        system.add_student("重复", 16, "高一", "1班", student_id=reserved[0])
+        assert False, "使用已存在的学号应报错"
+    except ValueError:
+        pass
+    
+    # 重新加载后生成的ID大于已有的ID
+    reloaded = StudentManagementSystem(test_data_file)
+    assert reloaded.add_student("新同学", 16, "高一", "1班") > max(reserved)
+    
+    results = benchmark.benchmark_ids(1000)
+    assert all(result['duplicates'] == 0 and result['sorted'] for result in results[1:])
+    
+    remove_data_file(test_data_file)
+    print("ID生成测试完成！")
+
+
+def test_record_views():
+    """测试只读记录视图"""
+    print("开始测试只读视图...")
+    
+    test_data_file = "test_views_data.json"
+    remove_data_file(test_data_file)
+    system = StudentManagementSystem(test_data_file)
+    course_id = system.add_course("数学", "张老师", 3.0)
+    student_id = system.add_student("张三", 18, "高三", "1班")
+    system.enroll_student_in_course(student_id, course_id)
+    
+    student = system.get_all_students()[0]
+    course = system.search_courses("数学")[0]
+    assert student == system.students[student_id].to_dict() and course == system.courses[course_id].to_dict()
+    assert student['courses'] == [course_id] and course_id in student['courses']
+    
+    # 视图直接读取记录，不能通过视图修改记录；snapshot() 得到脱离记录的副本
+    copy = student.snapshot()
+    state = system.snapshot()
+    system.add_score(student_id, course_id, 90)
+    system.update_student(student_id, name="张三丰")
+    assert student['name'] == "张三丰" and student['scores'] == {course_id: 90}
+    assert copy['name'] == "张三" and copy['scores'] == {}
+    assert state['students'] == [copy] and state['courses'] == [course.snapshot()]
+    for mapping, key in ((student, 'name'), (student['scores'], course_id)):
+        try:
+            mapping[key] = 0
+            assert False, "视图应为只读"
+        except TypeError:
+            pass
+    
+    # 选课学生列表支持按下标、切片和反向访问
+    other_ids = [system.add_student(f"学生{i}", 17, "高三", "2班") for i in range(3)]
+    for other_id in other_ids:
+        system.enroll_student_in_course(other_id, course_id)
+    roster = system.get_all_courses()[0]['students']
+    expected = [student_id] + other_ids
+    assert [roster[i] for i in range(len(roster))] == expected and roster[-1] == expected[-1]
+    assert roster[1:3] == expected[1:3] and list(reversed(roster)) == expected[::-1]
+    assert roster.index(other_ids[1]) == 2
+    try:
+        roster[len(expected)]
+        assert False, "下标越界应报错"
+    except IndexError:
+        pass
+    
+    remove_data_file(test_data_file)
+    print("只读视图测试完成！")
+
+
 def demo_usage():
     """演示系统使用"""
     print("\n" + "="*50)
@@ -110,73 +1353,74 @@ def demo_usage():
     demo_file = "demo_data.json"
     
     # 清理旧文件
-    if os.path.exists(demo_file):
-        os.remove(demo_file)
+    remove_data_file(demo_file)
     
     system = StudentManagementSystem(demo_file)
     
-    print("\n1. 创建示例数据...")
-    
-    # 添加学生
-    students = [
-        ("小明", 18, "高三", "1班"),
-        ("小红", 17, "高三", "1班"),
-        ("小刚", 18, "高三", "2班"),
-        ("小丽", 17, "高二", "1班")
-    ]
-    
-    student_ids = []
-    for name, age, grade, class_name in students:
-        sid = system.add_student(name, age, grade, class_name)
-        student_ids.append(sid)
-        print(f"   添加学生: {name} ({sid})")
-    
-    # 添加课程
-    courses = [
-        ("高等数学", "张教授", 4.0),
-        ("大学英语", "李老师", 3.0),
-        ("大学物理", "王教授", 4.0),
-        ("程序设计", "赵老师", 3.5)
-    ]
-    
-    course_ids = []
-    for name, teacher, credit in courses:
-        cid = system.add_course(name, teacher, credit)
-        course_ids.append(cid)
-        print(f"   添加课程: {name} ({cid})")
-    
-    print("\n2. 学生选课...")
-    # 小明选数学和英语
-    system.enroll_student_in_course(student_ids[0], course_ids[0])
-    system.enroll_student_in_course(student_ids[0], course_ids[1])
-    
-    # 小红选数学和物理
-    system.enroll_student_in_course(student_ids[1], course_ids[0])
-    system.enroll_student_in_course(student_ids[1], course_ids[2])
-    
-    # 小刚选所有课程
-    for cid in course_ids:
-        system.enroll_student_in_course(student_ids[2], cid)
-    
-    print("   选课完成")
-    
-    print("\n3. 录入成绩...")
-    # 录入成绩
-    grades = [
-        (student_ids[0], course_ids[0], 95.0),  # 小明数学
-        (student_ids[0], course_ids[1], 88.5),  # 小明英语
-        (student_ids[1], course_ids[0], 92.0),  # 小红数学
-        (student_ids[1], course_ids[2], 89.0),  # 小红物理
-        (student_ids[2], course_ids[0], 78.0),   # 小刚数学
-        (student_ids[2], course_ids[1], 85.5),   # 小刚英语
-        (student_ids[2], course_ids[2], 91.0), # 小刚物理
-        (student_ids[2], course_ids[3], 96.0)  # 小刚程序设计
-    ]
-    
-    for sid, cid, score in grades:
-        system.add_score(sid, cid, score)
-    
-    print("   成绩录入完成")
+    # 批量创建示例数据，只在结束时保存一次
+    with system.batch():
+        print("\n1. 创建示例数据...")
+        
+        # 添加学生
+        students = [
+            ("小明", 18, "高三", "1班"),
+            ("小红", 17, "高三", "1班"),
+            ("小刚", 18, "高三", "2班"),
+            ("小丽", 17, "高二", "1班")
+        ]
+        
+        student_ids = []
+        for name, age, grade, class_name in students:
+            sid = system.add_student(name, age, grade, class_name)
+            student_ids.append(sid)
+            print(f"   添加学生: {name} ({sid})")
+        
+        # 添加课程
+        courses = [
+            ("高等数学", "张教授", 4.0),
+            ("大学英语", "李老师", 3.0),
+            ("大学物理", "王教授", 4.0),
+            ("程序设计", "赵老师", 3.5)
+        ]
+        
+        course_ids = []
+        for name, teacher, credit in courses:
+            cid = system.add_course(name, teacher, credit)
+            course_ids.append(cid)
+            print(f"   添加课程: {name} ({cid})")
+        
+        print("\n2. 学生选课...")
+        # 小明选数学和英语
+        system.enroll_student_in_course(student_ids[0], course_ids[0])
+        system.enroll_student_in_course(student_ids[0], course_ids[1])
+        
+        # 小红选数学和物理
+        system.enroll_student_in_course(student_ids[1], course_ids[0])
+        system.enroll_student_in_course(student_ids[1], course_ids[2])
+        
+        # 小刚选所有课程
+        for cid in course_ids:
+            system.enroll_student_in_course(student_ids[2], cid)
+        
+        print("   选课完成")
+        
+        print("\n3. 录入成绩...")
+        # 录入成绩
+        grades = [
+            (student_ids[0], course_ids[0], 95.0),  # 小明数学
+            (student_ids[0], course_ids[1], 88.5),  # 小明英语
+            (student_ids[1], course_ids[0], 92.0),  # 小红数学
+            (student_ids[1], course_ids[2], 89.0),  # 小红物理
+            (student_ids[2], course_ids[0], 78.0),   # 小刚数学
+            (student_ids[2], course_ids[1], 85.5),   # 小刚英语
+            (student_ids[2], course_ids[2], 91.0), # 小刚物理
+            (student_ids[2], course_ids[3], 96.0)  # 小刚程序设计
+        ]
+        
+        for sid, cid, score in grades:
+            system.add_score(sid, cid, score)
+        
+        print("   成绩录入完成")
     
     print("\n4. 查看统计信息...")
     
@@ -208,4 +1452,29 @@ if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "demo":
         demo_usage()
     else:
-        test_system()
\ No newline at end of file
+        test_system()
+        test_journal()
+        test_journal_torn_tail()
+        test_batch()
+        test_sqlite_storage()
+        test_streaming_load()
+        test_binary_snapshot()
+        test_background_save()
+        test_delta_save()
+        test_sharded_storage()
+        test_lazy_loading()
+        test_compressed_snapshot()
+        test_class_index()
+        test_search_index()
+        test_complete_students()
+        test_enrollment_sets()
+        test_reverse_deletion()
+        test_query()
+        test_rankings()
+        test_summaries()
+        test_analytics()
+        test_detail_cache()
+        test_compact_records()
+        test_columnar_store()
+        test_id_generator()
+        test_record_views()